@@ -1,34 +1,132 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from core.classes import Cog_Extension
 import asyncio
-import yt_dlp # 您已經安裝了
 import re
 import os
-import json
-import random
+import io
+from datetime import datetime
+import time
 import logging
 from discord import app_commands # ✅ 1. 引入 app_commands
-
-# --- yt-dlp 和 FFmpeg 設定 ---
-YDL_OPTS = {
-    'format': 'bestaudio[ext=m4a]/bestaudio[ext=aac]/bestaudio[ext=opus]/bestaudio/best',
-    'noplaylist': True, 
-    'quiet': True,
-    'default_search': 'ytsearch', 
-    'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
-    'restrictfilenames': True,
-    'extract_flat': True 
+from core.media_extractor import get_extractor
+from core.media_cache import get_media_cache
+from core.audio_cache import get_audio_cache
+from core.music_queue import (
+    QueuedSong, PlaylistCursor, PLAYLIST_PAGE_SIZE,
+    is_playlist_url, fetch_playlist_page, songs_from_entries,
+)
+from core.guild_player import GuildPlayer, PlayerStatus, MAX_QUEUE_SIZE
+from core.music_telemetry import get_telemetry
+from core.search_cache import get_search_cache, is_keyword_query
+from core.music_library import get_music_library
+from core.queue_snapshot import (
+    QueueSnapshotStore, QUEUE_SNAPSHOT_INTERVAL, snapshot_player, restore_items, resume_position,
+)
+
+# 播放流程 (解析、FFmpeg、重試...) 在 core/guild_player.py；這裡只處理指令與顯示
+
+QUEUE_PAGE_SIZE = 10 # /queue 每頁顯示的項目數
+
+# 閒置自動離開 (秒)：語音頻道沒有其他人、佇列播完、暫停 (含連續失敗) 各自的等待時間
+IDLE_EMPTY_CHANNEL_TIMEOUT = int(os.getenv('MUSIC_IDLE_EMPTY_CHANNEL_SECONDS', '120'))
+IDLE_QUEUE_TIMEOUT = int(os.getenv('MUSIC_IDLE_QUEUE_SECONDS', '300'))
+IDLE_PAUSED_TIMEOUT = int(os.getenv('MUSIC_IDLE_PAUSED_SECONDS', '900'))
+IDLE_CHECK_INTERVAL = 30
+IDLE_REASONS = {
+    'empty_channel': ("語音頻道沒有其他人", IDLE_EMPTY_CHANNEL_TIMEOUT),
+    'empty_queue': ("佇列已播完", IDLE_QUEUE_TIMEOUT),
+    'paused': ("播放已暫停", IDLE_PAUSED_TIMEOUT),
 }
 
-# FFmpeg 選項
-FFMPEG_OPTS = {
-    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-    'options': '-vn',
-}
+def _requester_name(guild, item) -> str:
+    """佇列只存點歌者 ID，顯示時再查名稱 (已離開伺服器則顯示提及)"""
+    member = guild.get_member(item.requester_id)
+    return member.display_name if member else f"<@{item.requester_id}>"
+
 
-# 從 musiclist.py 引用相同的檔案路徑
-MUSIC_FILE = './data/music_list.json'
+def _create_queue_embed(guild, player: GuildPlayer, page: int, total_pages: int) -> discord.Embed:
+    """佇列的一頁：正在播放 + 第 page 頁的項目 (只取出該頁，不複製整個佇列)"""
+    current_song = player.now_playing
+    song_queue = player.queue
+    start = (page - 1) * QUEUE_PAGE_SIZE
+
+    embed = discord.Embed(title="🎶 播放佇列", color=0x1DB954)
+
+    # 1. 顯示目前播放的歌曲
+    if current_song:
+        embed.add_field(
+            name=f"▶️ **正在播放**",
+            value=f"**{current_song.title}**\n(請求者: {_requester_name(guild, current_song)})",
+            inline=False
+        )
+        if song_queue: # 如果佇列還有歌，加上分隔
+            embed.add_field(name="-"*40, value="**接下來：**", inline=False)
+
+    # 2. 顯示這一頁的佇列
+    for i, item in enumerate(song_queue.page(start, QUEUE_PAGE_SIZE), start=start + 1):
+        if isinstance(item, PlaylistCursor):
+            embed.add_field(
+                name=f"**{i}. 📃 {item.title}**",
+                value=f"播放清單其餘歌曲 (播放到這裡時載入) | 請求者: {_requester_name(guild, item)}",
+                inline=False
+            )
+        else:
+            embed.add_field(
+                name=f"**{i}. {item.title}**",
+                value=f"請求者: {_requester_name(guild, item)}",
+                inline=False
+            )
+
+    # 3. 顯示佇列總數
+    if song_queue:
+        embed.set_footer(text=f"第 {page} / {total_pages} 頁 | 佇列共 {len(song_queue)} 個項目")
+    elif current_song:
+        embed.set_footer(text="佇列中沒有其他歌曲了。")
+    return embed
+
+
+class QueueView(discord.ui.View):
+    """播放佇列的翻頁按鈕 (每次翻頁都讀取當下的佇列)"""
+
+    def __init__(self, player: GuildPlayer, ctx: commands.Context, page: int = 1):
+        super().__init__(timeout=180) # 3分鐘無操作後按鈕失效
+        self.player = player
+        self.ctx = ctx
+        self.current_page = page
+        self.update_buttons()
+
+    @property
+    def total_pages(self) -> int:
+        return max(1, -(-len(self.player.queue) // QUEUE_PAGE_SIZE))
+
+    def update_buttons(self):
+        """根據當前頁碼啟用/禁用按鈕"""
+        self.current_page = max(1, min(self.current_page, self.total_pages))
+        self.children[0].disabled = self.current_page <= 1
+        self.children[1].disabled = self.current_page >= self.total_pages
+
+    def current_embed(self) -> discord.Embed:
+        return _create_queue_embed(self.ctx.guild, self.player, self.current_page, self.total_pages)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """只允許最初發起指令的使用者操作"""
+        if interaction.user != self.ctx.author:
+            await interaction.response.send_message("只有發起指令的人可以翻頁。", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="上一頁", style=discord.ButtonStyle.blurple, emoji="◀️")
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page -= 1
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.current_embed(), view=self)
+
+    @discord.ui.button(label="下一頁", style=discord.ButtonStyle.blurple, emoji="▶️")
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.current_page += 1
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.current_embed(), view=self)
 
 
 # --- 音樂播放的主 Cog ---
@@ -37,101 +135,214 @@ class MusicPlay(Cog_Extension):
     
     def __init__(self, bot):
         super().__init__(bot)
-        # 為每個伺服器(guild)建立獨立的佇列
-        self.guild_states = {}
-
-    def get_guild_state(self, ctx):
-        """獲取或建立此伺服器的狀態"""
-        if ctx.guild.id not in self.guild_states:
-            self.guild_states[ctx.guild.id] = {
-                'song_queue': [],
-                'is_playing': False,
-                'now_playing': None  # <-- ✅ 變更 1: 儲存正在播放的歌曲
-            }
-        return self.guild_states[ctx.guild.id]
-
-    async def song_finished(self, ctx, error=None):
-        """歌曲播放完畢時的回調函式"""
-        if error:
-            logging.error(f"播放時發生錯誤 (Guild: {ctx.guild.id}): {error}")
-            
-        state = self.get_guild_state(ctx)
-        
-        # 標記為未播放，並嘗試播放下一首
-        state['is_playing'] = False
-        await self.play_next_song(ctx)
+        # 每個伺服器(guild)各自的播放器 (佇列 + 播放協程)
+        self.players = {}
+        # 閒置追蹤：{guild_id: (閒置原因, 開始閒置的 monotonic 時間)}
+        self.idle_since = {}
+        # 佇列快照 (恢復完成前不寫入，避免蓋掉還沒恢復的快照)
+        self.snapshots = QueueSnapshotStore()
+        self._restored = False
+        self._restore_task = None
+
+    def get_player(self, ctx) -> GuildPlayer:
+        """獲取或建立此伺服器的播放器 (通知訊息送到最近一次下指令的頻道)"""
+        player = self.players.get(ctx.guild.id)
+        if player is None:
+            player = self.players[ctx.guild.id] = GuildPlayer(ctx.guild, ctx.channel)
+        else:
+            player.channel = ctx.channel
+        return player
+
+    async def cog_load(self):
+        # 快取檔案先在執行緒中讀入，之後播放、搜尋與自動完成都只讀記憶體
+        await get_search_cache().preload()
+        await get_audio_cache().preload()
+        await get_media_cache().preload()
+        # bot.py 在臨時的事件迴圈中載入擴展 (登入前)，背景工作要等 on_ready 才開始；#reload 時 Bot 已就緒，直接開始
+        if self.bot.is_ready():
+            self._start_background()
 
-    async def play_next_song(self, ctx):
-        """
-        播放佇列中的下一首歌。
-        """
-        state = self.get_guild_state(ctx)
-        
-        if state['is_playing']:
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self._start_background()
+
+    def _start_background(self):
+        """開始閒置檢查並恢復佇列快照 (恢復完成後才開始定期快照)；重新連線觸發的 on_ready 不會重複執行"""
+        if not self.idle_reaper.is_running():
+            self.idle_reaper.start()
+        if self._restore_task is None:
+            self._restore_task = asyncio.create_task(self._restore_queues())
+
+    async def cog_unload(self):
+        """重新載入 Cog 時先保存佇列快照，再停止所有播放協程 (新的 Cog 載入後會接續播放)"""
+        self.idle_reaper.cancel()
+        self.snapshot_queues.cancel()
+        if self._restore_task and not self._restore_task.done():
+            self._restore_task.cancel()
+            try:
+                await self._restore_task
+            except asyncio.CancelledError:
+                pass
+        if self._restored:
+            self.snapshots.save(self._collect_snapshots())
+        for player in self.players.values():
+            await player.shutdown()
+        self.players.clear()
+        self.idle_since.clear()
+        # 關機或重新載入時結束 yt-dlp 工作行程 (不然會留下孤兒行程)；之後的請求會自動重新啟動
+        await get_extractor().close()
+        await get_search_cache().flush()
+        await get_audio_cache().flush()
+        await get_media_cache().flush()
+
+    async def _teardown(self, guild: discord.Guild):
+        """停止播放器 (清空佇列、取消解析、結束 FFmpeg)、離開語音頻道並移除此伺服器的狀態"""
+        self.idle_since.pop(guild.id, None)
+        player = self.players.pop(guild.id, None)
+        if player:
+            await player.shutdown()
+        vc = guild.voice_client
+        if vc:
+            if vc.is_playing() or vc.is_paused():
+                vc.stop()
+            await vc.disconnect(force=True)
+        await self._save_queue_snapshots()
+        return player
+
+    # =========================================================
+    # 佇列快照 / 恢復
+    # =========================================================
+    def _collect_snapshots(self):
+        snapshots = {}
+        for guild_id, player in self.players.items():
+            snapshot = snapshot_player(player)
+            if snapshot:
+                snapshots[guild_id] = snapshot
+        return snapshots
+
+    async def _save_queue_snapshots(self):
+        if self._restored:
+            await asyncio.to_thread(self.snapshots.save, self._collect_snapshots())
+
+    @tasks.loop(seconds=QUEUE_SNAPSHOT_INTERVAL)
+    async def snapshot_queues(self):
+        await self._save_queue_snapshots()
+
+    @snapshot_queues.error
+    async def snapshot_queues_error(self, error):
+        logging.error(f"保存播放佇列快照時發生錯誤: {error}")
+
+    async def _restore_queues(self):
+        """Bot 就緒後依快照重新加入語音頻道並接續播放 (串流網址輪到該首時才解析)"""
+        await self.bot.wait_until_ready()
+        snapshots = await asyncio.to_thread(self.snapshots.load)
+        for guild_id, snapshot in snapshots.items():
+            try:
+                await self._restore_queue(guild_id, snapshot)
+            except Exception as e:
+                logging.error(f"恢復播放佇列失敗 (Guild: {guild_id}): {e}")
+        # 只在正常完成時開始定期快照；被 cog_unload 取消時不可啟動，否則已卸載的 Cog 會一直用空的快照覆寫檔案
+        self._restored = True
+        self.snapshot_queues.start()
+
+    async def _restore_queue(self, guild_id: int, snapshot):
+        guild = self.bot.get_guild(guild_id)
+        if guild is None or guild_id in self.players:
             return
-            
-        if not state['song_queue']:
-            # 佇列已空
-            state['is_playing'] = False
-            state['now_playing'] = None # <-- ✅ 變更 2: 佇列為空時，清除 "正在播放"
-            
-            #
-            # --- 自動離開邏輯 (已註解) ---
-            # 未來若要啟用，請將以下 5 行的 '#' 移除
-            #
-            # await asyncio.sleep(180) # 等待 3 分鐘
-            # if not state['is_playing'] and ctx.voice_client:
-            #     # 如果 3 分鐘後還是沒歌，自動離開
-            #     await ctx.send("播放佇列已空，3 分鐘後將自動離開...")
-            #     await ctx.voice_client.disconnect()
-            #
-            
-            # 佇列已空，停止播放，但留在頻道中 (若上面註解保持不動)
+        voice = guild.get_channel(snapshot.get('voice_channel'))
+        if not isinstance(voice, discord.VoiceChannel) or not any(not m.bot for m in voice.members):
+            logging.info(f"語音頻道已不存在或沒有人，不恢復播放佇列 (Guild: {guild_id})")
             return
-
-        state['is_playing'] = True
-        
-        # 從佇列取出下一首歌
-        song = state['song_queue'].pop(0)
-        state['now_playing'] = song # <-- ✅ 變更 3: 設定 "正在播放"
-        vc = ctx.voice_client
-
-        if not vc:
-            state['is_playing'] = False
+        items = restore_items(snapshot)
+        if not items:
             return
 
-        # --- 即時獲取串流 ---
-        loop = self.bot.loop or asyncio.get_event_loop()
-        
-        single_ydl_opts = YDL_OPTS.copy()
-        single_ydl_opts['noplaylist'] = True
-        
-        with yt_dlp.YoutubeDL(single_ydl_opts) as ydl:
+        if guild.voice_client is None:
+            await voice.connect()
+        text_channel = guild.get_channel(snapshot.get('text_channel')) or voice
+        player = self.players[guild_id] = GuildPlayer(guild, text_channel)
+        offset = resume_position(snapshot, items[0])
+        if offset:
+            player.resume_offset = (items[0], offset)
+        added = player.add(items)
+
+        resumed = f"，從 **{items[0].title}** 的 {int(offset) // 60}:{int(offset) % 60:02d} 繼續" if offset else ""
+        logging.info(f"已恢復播放佇列 (Guild: {guild_id}, {added} 個項目)")
+        try:
+            await text_channel.send(f"🔁 已恢復先前的播放佇列 ({added} 個項目){resumed}。")
+        except discord.HTTPException:
+            pass
+
+    # =========================================================
+    # 閒置自動離開
+    # =========================================================
+    def _idle_reason(self, guild: discord.Guild):
+        """此伺服器目前為何閒置 (不閒置時回傳 None)"""
+        vc = guild.voice_client
+        player = self.players.get(guild.id)
+        if vc and vc.channel and not any(not m.bot for m in vc.channel.members):
+            return 'empty_channel'
+        if (vc and vc.is_paused()) or (player and player.status == PlayerStatus.STALLED):
+            return 'paused'
+        if player is None or (player.status == PlayerStatus.IDLE and not player.queue):
+            return 'empty_queue'
+        return None
+
+    @tasks.loop(seconds=IDLE_CHECK_INTERVAL)
+    async def idle_reaper(self):
+        await self.bot.wait_until_ready()
+        now = time.monotonic()
+        # 有播放器或有語音連線的伺服器 (Cog 重新載入後殘留的連線也會被處理)
+        guild_ids = set(self.players) | {vc.guild.id for vc in self.bot.voice_clients}
+        for guild_id in guild_ids:
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                player = self.players.pop(guild_id, None)
+                self.idle_since.pop(guild_id, None)
+                if player:
+                    await player.shutdown()
+                continue
+
+            reason = self._idle_reason(guild)
+            if reason is None:
+                self.idle_since.pop(guild_id, None)
+                continue
+            previous = self.idle_since.get(guild_id)
+            if previous is None or previous[0] != reason:
+                self.idle_since[guild_id] = (reason, now)
+                continue
+
+            label, timeout = IDLE_REASONS[reason]
+            if now - previous[1] < timeout:
+                continue
+            logging.info(f"閒置自動離開 (Guild: {guild_id}, 原因: {reason}, {now - previous[1]:.0f} 秒)")
             try:
-                info = await loop.run_in_executor(None, lambda: ydl.extract_info(song['webpage_url'], download=False))
-                stream_url = info.get('url')
-                if not stream_url:
-                    info = await loop.run_in_executor(None, lambda: ydl.extract_info(song['webpage_url'], download=True))
-                    stream_url = info.get('url')
-
-                if not stream_url:
-                    raise Exception("無法獲取 stream_url")
-                    
+                player = await self._teardown(guild)
             except Exception as e:
-                await ctx.send(f"❌ 播放 **{song['title']}** 失敗 (可能是地區限制或影片已移除)。\n{e}")
-                # 播放失敗，自動跳到下一首
-                await self.song_finished(ctx, e) 
-                return
-        # --- 結束即時獲取 ---
-
-        # 開始播放
-        vc.play(
-            discord.FFmpegPCMAudio(stream_url, **FFMPEG_OPTS),
-            after=lambda e: self.bot.loop.create_task(self.song_finished(ctx, e))
-        )
-        
-        # ✅ 播放通知：已註解，避免洗頻
-        # await ctx.send(f"🎶 正在播放: **{song['title']}** (請求者: {song['requester'].display_name})") # <-- ✅ 變更 4: 註解此行
+                logging.error(f"閒置自動離開失敗 (Guild: {guild_id}): {e}")
+                continue
+            if player:
+                duration = f"{timeout // 60} 分鐘" if timeout >= 60 else f"{timeout} 秒"
+                try:
+                    await player.channel.send(f"👋 {label}超過 {duration}，已自動離開語音頻道。")
+                except discord.HTTPException:
+                    pass
+
+    @idle_reaper.error
+    async def idle_reaper_error(self, error):
+        logging.error(f"閒置檢查任務發生錯誤: {error}")
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        """Bot 被踢出或斷線時立即移除該伺服器的播放器，不等閒置檢查"""
+        if member.id != self.bot.user.id or after.channel is not None or before.channel is None:
+            return
+        self.idle_since.pop(member.guild.id, None)
+        player = self.players.pop(member.guild.id, None)
+        if player:
+            await player.shutdown()
+            await self._save_queue_snapshots()
+
     # =========================================================
     # ✅ 指令：播放音樂 (Hybrid)
     # =========================================================
@@ -143,11 +354,11 @@ class MusicPlay(Cog_Extension):
         指令格式: #play <URL 或 搜尋關鍵字>
         """
         is_private = ctx.interaction is not None
-        state = self.get_guild_state(ctx)
 
-        # 1. 檢查使用者是否在語音頻道
+        # 1. 檢查使用者是否在語音頻道 (通過後才建立播放器)
         if not ctx.author.voice:
             return await ctx.send("您必須先加入一個語音頻道！", ephemeral=True) # 錯誤一律私人
+        player = self.get_player(ctx)
 
         # 2. 獲取/加入語音頻道
         channel = ctx.author.voice.channel
@@ -165,16 +376,25 @@ class MusicPlay(Cog_Extension):
         # / 指令會用 "思考中"，# 指令會發送公開訊息
         msg = await ctx.send(f"🔎 正在搜尋: `{search}`...", ephemeral=is_private)
         
-        loop = self.bot.loop or asyncio.get_event_loop()
-        
-        playlist_ydl_opts = YDL_OPTS.copy()
-        playlist_ydl_opts['noplaylist'] = False
-        
         info = None
         error_msg = None
+        search_cache = get_search_cache()
+        cached = search_cache.get(search) if is_keyword_query(search) else None
         try:
-            with yt_dlp.YoutubeDL(playlist_ydl_opts) as ydl:
-                info = await loop.run_in_executor(None, lambda: ydl.extract_info(search, download=False))
+            if cached:
+                # 相同關鍵字最近搜尋過：直接使用上次的結果，不必再搜尋
+                info = {'title': cached['title'], 'webpage_url': cached['url']}
+            elif is_playlist_url(search):
+                # 大型播放清單 / 合輯只先展開第一頁，其餘播放到附近時再載入
+                with get_telemetry().timer('search'):
+                    playlist_title, entries = await fetch_playlist_page(search, 1)
+                info = {'title': playlist_title, 'entries': entries}
+            else:
+                with get_telemetry().timer('search'):
+                    info = await get_extractor().extract(search, 'search', timeout=60)
+                entries = [e for e in info.get('entries') or [] if e and e.get('url')]
+                if is_keyword_query(search) and len(entries) == 1:
+                    search_cache.put(search, entries[0].get('title') or 'N/A', entries[0]['url'], entries[0].get('duration'))
         except Exception as e:
             logging.error(f"yt-dlp 搜尋失敗 (Guild: {ctx.guild.id}, Search: {search}): {e}")
             error_msg = f"❌ 搜尋失敗或找不到影片: {e}"
@@ -186,60 +406,69 @@ class MusicPlay(Cog_Extension):
         # 4. 準備歌曲資訊
         songs_to_add = []
         playlist_title = None
+        cursor = None
         
         if 'entries' in info:
             playlist_title = info.get('title', 'N/A')
-            for entry in info['entries']:
-                if entry:
-                    songs_to_add.append({
-                        'title': entry.get('title', 'N/A'),
-                        'webpage_url': entry.get('url'), # 'extract_flat' 會將 url 設為 webpage_url
-                        'requester': ctx.author
-                    })
+            # 'extract_flat' 會將 url 設為 webpage_url
+            songs_to_add = songs_from_entries([e for e in info['entries'] if e and e.get('url')], ctx.author.id)
+            if is_playlist_url(search) and len(info['entries']) >= PLAYLIST_PAGE_SIZE:
+                cursor = PlaylistCursor(search, playlist_title, ctx.author.id, PLAYLIST_PAGE_SIZE + 1)
         elif info: # 確保 info 不是 None
-            songs_to_add.append({
-                'title': info.get('title', 'N/A'),
-                'webpage_url': info.get('webpage_url', info.get('url')), # 獲取頁面 URL
-                'requester': ctx.author
-            })
+            get_media_cache().remember(info.get('webpage_url', ''), info)
+            webpage_url = info.get('webpage_url', info.get('url')) # 獲取頁面 URL
+            if webpage_url:
+                songs_to_add.append(QueuedSong(info.get('title', 'N/A'), webpage_url, ctx.author.id))
 
         if not songs_to_add:
              error_msg = "❌ 抱歉，無法從您的搜尋中獲取任何歌曲。"
              if is_private: return await ctx.followup.send(error_msg, ephemeral=True)
              else: return await msg.edit(content=error_msg)
 
-        # 5. 加入佇列
-        for song in songs_to_add:
-             if song['webpage_url']:
-                 state['song_queue'].append(song)
-                 
-        if len(songs_to_add) == 1:
-            reply_content = f"✅ 已加入佇列: **{songs_to_add[0]['title']}**"
+        # 5. 加入佇列並喚醒播放器 (播放清單其餘部分以 cursor 佔位，播放到附近時才載入)
+        added = player.add(songs_to_add, cursor)
+        if added == 0:
+            error_msg = f"⚠️ 佇列已滿 (上限 {MAX_QUEUE_SIZE} 首)，請等目前的歌曲播完或使用 `/queue clear`。"
+            if is_private: return await ctx.followup.send(error_msg, ephemeral=True)
+            else: return await msg.edit(content=error_msg)
+
+        if added < len(songs_to_add):
+            reply_content = f"⚠️ 佇列已滿 (上限 {MAX_QUEUE_SIZE} 首)，只加入了前 **{added}** 首。"
+        elif cursor:
+            reply_content = f"✅ 已將播放清單 **{playlist_title}** 加入佇列 (先載入 {len(songs_to_add)} 首，其餘播放時陸續載入)！"
+        elif len(songs_to_add) == 1:
+            reply_content = f"✅ 已加入佇列: **{songs_to_add[0].title}**"
         else:
             reply_content = f"✅ 已將 **{len(songs_to_add)}** 首歌從播放清單 **{playlist_title}** 加入佇列！"
 
         if is_private: await ctx.followup.send(reply_content, ephemeral=True)
         else: await msg.edit(content=reply_content)
 
-        # 6. 如果目前沒在播放，就開始播放
-        if not state['is_playing']:
-            await self.play_next_song(ctx)
+    @play.autocomplete('search')
+    async def play_search_autocomplete(self, interaction: discord.Interaction, current: str):
+        """以搜尋快取提供建議 (只讀記憶體，不會觸發搜尋)"""
+        choices = []
+        for entry in get_search_cache().suggest(current):
+            name = f"{entry['query']} — {entry.get('title') or ''}"
+            choices.append(app_commands.Choice(name=name[:100], value=entry['query'][:100]))
+        return choices
 
     # =========================================================
-    # ✅ 指令：播放 data/music_list.json (Hybrid)
+    # ✅ 指令：播放音樂分享清單 (Hybrid)
     # =========================================================
-    @commands.hybrid_command(name="playlist", aliases=['播放清單音樂', 'pl'], description="播放 data/music_list.json 中的所有音樂 (隨機排序)")
+    @commands.hybrid_command(name="playlist", aliases=['播放清單音樂', 'pl'], description="播放音樂分享清單中的所有音樂 (隨機排序)")
     async def playlist(self, ctx: commands.Context):
         """
-        播放 data/music_list.json 中的所有音樂 (隨機排序)。
+        播放音樂分享清單 (#musiclist) 中的所有音樂 (隨機排序)。
+        清單超過佇列剩餘空間時，隨機挑選放得下的數量。
         指令格式: #playlist
         """
         is_private = ctx.interaction is not None
-        state = self.get_guild_state(ctx)
 
-        # 1. 檢查
+        # 1. 檢查 (通過後才建立播放器)
         if not ctx.author.voice:
             return await ctx.send("您必須先加入一個語音頻道！", ephemeral=True)
+        player = self.get_player(ctx)
         
         # 2. 加入頻道
         channel = ctx.author.voice.channel
@@ -252,41 +481,26 @@ class MusicPlay(Cog_Extension):
             except discord.errors.Forbidden:
                 return await ctx.send(f"❌ 權限不足：我無法加入頻道 `{channel.name}`。", ephemeral=True)
 
-        # 3. 載入 music_list.json
-        if not os.path.exists(MUSIC_FILE):
-            return await ctx.send(f"❌ 錯誤：找不到您的音樂清單檔案 (`{MUSIC_FILE}`)。", ephemeral=is_private)
-        
+        # 3. 從資料庫隨機取出佇列放得下的數量 (由 SQLite 排序，不載入整份清單)
+        free_slots = MAX_QUEUE_SIZE - len(player.queue)
+        if free_slots <= 0:
+            return await ctx.send(f"⚠️ 佇列已滿 (上限 {MAX_QUEUE_SIZE} 首)，請等目前的歌曲播完或使用 `/queue clear`。", ephemeral=is_private)
+        library = get_music_library()
         try:
-            with open(MUSIC_FILE, 'r', encoding='utf8') as f:
-                music_list = json.load(f)
+            total = await asyncio.to_thread(library.count)
+            music_list = await asyncio.to_thread(library.shuffled, free_slots)
         except Exception as e:
             return await ctx.send(f"❌ 讀取音樂清單失敗: {e}", ephemeral=is_private)
 
         if not music_list:
             return await ctx.send("❌ 您的音樂清單是空的！", ephemeral=is_private)
 
-        # 4. 隨機排序並加入佇列
-        random.shuffle(music_list)
-        
-        added_count = 0
-        for entry in music_list:
-            song = {
-                'title': entry.get('title', 'N/A'),
-                'webpage_url': entry.get('url'),
-                'requester': ctx.author 
-            }
-            if song['webpage_url']:
-                state['song_queue'].append(song)
-                added_count += 1
-        
-        if added_count == 0:
-            return await ctx.send("❌ 您的清單中沒有有效的歌曲連結。", ephemeral=is_private)
-
-        await ctx.send(f"✅ 已將 **{added_count}** 首歌 (來自 `music_list.json`) 加入隨機播放佇列！", ephemeral=is_private)
-
-        # 5. 開始播放
-        if not state['is_playing']:
-            await self.play_next_song(ctx)
+        # 4. 加入佇列 (播放器會自動開始播放)
+        songs = [QueuedSong(entry.get('title', 'N/A'), entry['url'], ctx.author.id) for entry in music_list]
+        added_count = player.add(songs)
+        if added_count < total:
+            return await ctx.send(f"⚠️ 佇列上限 {MAX_QUEUE_SIZE} 首，從清單的 {total} 首中隨機加入了 **{added_count}** 首。", ephemeral=is_private)
+        await ctx.send(f"✅ 已將 **{added_count}** 首歌 (來自音樂分享清單) 加入隨機播放佇列！", ephemeral=is_private)
 
     # =========================================================
     # ✅ 指令：離開頻道 (Hybrid)
@@ -302,19 +516,9 @@ class MusicPlay(Cog_Extension):
         if not ctx.voice_client:
             return await ctx.send("Bot 目前不在任何語音頻道中。", ephemeral=is_private)
 
-        state = self.get_guild_state(ctx)
-        
-        state['song_queue'] = []
-        state['is_playing'] = False
-        state['now_playing'] = None # <-- ✅ 變更 5: 停止時清除 "正在播放"
-        if ctx.voice_client.is_playing():
-            ctx.voice_client.stop()
-            
-        await ctx.voice_client.disconnect()
+        # 先停止播放協程 (清空佇列、取消解析)，再離開頻道
+        await self._teardown(ctx.guild)
         await ctx.send("👋 已停止播放並離開頻道。", ephemeral=is_private)
-        
-        if ctx.guild.id in self.guild_states:
-            del self.guild_states[ctx.guild.id]
 
     # =========================================================
     # ✅ 指令：跳過歌曲 (Hybrid)
@@ -330,66 +534,194 @@ class MusicPlay(Cog_Extension):
         if not ctx.voice_client:
             return await ctx.send("Bot 目前不在任何語音頻道中。", ephemeral=is_private)
         
-        state = self.get_guild_state(ctx)
+        player = self.players.get(ctx.guild.id)
 
-        if not state['is_playing']:
-            if state['song_queue']:
+        # 播放中則停止目前歌曲；還在解析串流網址則直接中止解析，不必等它完成
+        if player is None or not player.skip():
+            if player and player.queue:
                 await ctx.send("...佇列卡住，正在啟動下一首。", ephemeral=is_private)
-                await self.play_next_song(ctx)
+                player.notify()
             else:
                 await ctx.send("目前沒有歌曲正在播放。", ephemeral=is_private)
             return
 
-        ctx.voice_client.stop()
         await ctx.send("⏭️ 已跳過目前歌曲。", ephemeral=is_private)
 
 
     # =--------------------------------------------------------
-    # ✅ 指令：查看佇列 (已升級：顯示 "正在播放" + "佇列")
-    # ✅ 變更 6: 完整替換此函式
+    # ✅ 指令：查看 / 管理佇列 (分頁顯示；移除、移動、隨機、去重、清空)
     # =========================================================
-    @commands.hybrid_command(name="queue", aliases=['q', 'np', 'nowplaying'], description="顯示目前播放的歌曲與佇列")
-    async def queue(self, ctx: commands.Context):
+    @commands.hybrid_group(name="queue", aliases=['q', 'np', 'nowplaying'], fallback="show", invoke_without_command=True, description="顯示目前播放的歌曲與佇列")
+    @app_commands.describe(page="要顯示的頁碼 (預設 1)")
+    async def queue(self, ctx: commands.Context, page: int = 1):
         """
-        顯示目前播放的歌曲與佇列。
-        指令格式: #queue (或 #np)
+        顯示目前播放的歌曲與佇列 (使用按鈕分頁)。
+        指令格式: #queue [頁碼] (或 #np)
         """
         is_private = ctx.interaction is not None
-        state = self.get_guild_state(ctx)
-        
-        current_song = state.get('now_playing')
-        song_queue = state.get('song_queue', [])
+        player = self.players.get(ctx.guild.id) # 查看 / 管理佇列不需要建立播放器
 
-        if not current_song and not song_queue:
+        if player is None or (not player.now_playing and not player.queue):
             return await ctx.send("目前沒有歌曲正在播放，佇列也是空的。", ephemeral=is_private)
 
-        embed = discord.Embed(title="🎶 播放佇列", color=0x1DB954)
+        view = QueueView(player, ctx, page)
+        await ctx.send(embed=view.current_embed(), view=view, ephemeral=is_private)
 
-        # 1. 顯示目前播放的歌曲
-        if current_song:
+    @queue.command(name="remove", aliases=['rm', '移除'], description="從佇列移除指定編號的歌曲")
+    @app_commands.describe(position="佇列中的編號 (見 /queue)")
+    async def queue_remove(self, ctx: commands.Context, position: int):
+        is_private = ctx.interaction is not None
+        player = self.players.get(ctx.guild.id)
+        if player is None:
+            return await ctx.send("⚠️ 佇列是空的。", ephemeral=True)
+        try:
+            item = player.queue.remove_at(position - 1)
+        except IndexError as e:
+            return await ctx.send(f"⚠️ {e}。", ephemeral=True)
+        player.notify()
+        await ctx.send(f"🗑️ 已從佇列移除: **{item.title}**", ephemeral=is_private)
+
+    @queue.command(name="move", aliases=['mv', '移動'], description="移動佇列中歌曲的位置")
+    @app_commands.describe(source="要移動的歌曲編號", target="移動到的編號")
+    async def queue_move(self, ctx: commands.Context, source: int, target: int):
+        is_private = ctx.interaction is not None
+        player = self.players.get(ctx.guild.id)
+        if player is None:
+            return await ctx.send("⚠️ 佇列是空的。", ephemeral=True)
+        try:
+            item = player.queue.move(source - 1, target - 1)
+        except IndexError as e:
+            return await ctx.send(f"⚠️ {e}。", ephemeral=True)
+        player.notify()
+        await ctx.send(f"↕️ 已將 **{item.title}** 移到第 {target} 首。", ephemeral=is_private)
+
+    @queue.command(name="shuffle", aliases=['隨機'], description="隨機打亂佇列順序")
+    async def queue_shuffle(self, ctx: commands.Context):
+        is_private = ctx.interaction is not None
+        player = self.players.get(ctx.guild.id)
+        if player is None or len(player.queue) < 2:
+            return await ctx.send("佇列中的歌曲不足兩首，不需要打亂。", ephemeral=is_private)
+        player.queue.shuffle()
+        player.notify()
+        await ctx.send(f"🔀 已打亂佇列中的 {len(player.queue)} 個項目。", ephemeral=is_private)
+
+    @queue.command(name="dedupe", aliases=['去重'], description="移除佇列中重複的歌曲")
+    async def queue_dedupe(self, ctx: commands.Context):
+        is_private = ctx.interaction is not None
+        player = self.players.get(ctx.guild.id)
+        if player is None:
+            return await ctx.send("佇列是空的。", ephemeral=is_private)
+        removed = player.queue.dedupe()
+        player.notify()
+        await ctx.send(f"🧹 已移除 {removed} 首重複的歌曲。", ephemeral=is_private)
+
+    @queue.command(name="clear", aliases=['清空'], description="清空佇列 (不影響正在播放的歌曲)")
+    async def queue_clear(self, ctx: commands.Context):
+        is_private = ctx.interaction is not None
+        player = self.players.get(ctx.guild.id)
+        if player is None:
+            return await ctx.send("佇列是空的。", ephemeral=is_private)
+        count = len(player.queue)
+        player.clear()
+        await ctx.send(f"🗑️ 已清空佇列 ({count} 個項目)。", ephemeral=is_private)
+
+    # =========================================================
+    # ✅ 指令：串流 CPU 用量 (僅限擁有者)
+    # =========================================================
+    @commands.hybrid_command(name="streams", description="[僅限擁有者] 顯示各伺服器播放器的狀態、串流模式與資源用量")
+    @commands.is_owner()
+    async def streams(self, ctx: commands.Context):
+        """
+        顯示所有伺服器的播放器：狀態、佇列長度、播放 / 失敗 / 重試次數、累計解析時間與 CPU 時間；
+        播放中的串流另外顯示模式 passthrough (Opus 直接轉封裝) / transcode (FFmpeg 轉碼) / local (本地快取)
+        以及 FFmpeg 行程與播放執行緒目前的 CPU 使用率。
+        指令格式: #streams
+        """
+        is_private = ctx.interaction is not None
+        if not self.players:
+            return await ctx.send("目前沒有任何伺服器在使用播放器。", ephemeral=is_private)
+
+        def fmt(value):
+            return "N/A" if value is None else f"{value:.1f}%"
+
+        embed = discord.Embed(title="📊 播放器狀態", color=0x1DB954)
+        total = 0.0
+        snapshots = [(guild_id, player.snapshot()) for guild_id, player in self.players.items()]
+        for guild_id, snap in snapshots[:25]:
+            guild = self.bot.get_guild(guild_id)
+            lines = [
+                f"佇列 {snap['queue']} | 已播放 {snap['played']} | 失敗 {snap['failed']} | 重試 {snap['retries']} | 跳過 {snap['skipped']}",
+                f"解析累計 {snap['resolve_seconds']:.1f} 秒 | CPU 累計 {snap['cpu_seconds']:.1f} 秒",
+            ]
+            usage = snap['usage']
+            if snap['now_playing']:
+                lines.insert(0, f"**{snap['now_playing']}**")
+            if usage:
+                total += sum(usage[k] or 0.0 for k in ('ffmpeg', 'player'))
+                lines.append(
+                    f"FFmpeg: {fmt(usage['ffmpeg'])} (平均 {fmt(usage['ffmpeg_avg'])}) | "
+                    f"播放執行緒: {fmt(usage['player'])} (平均 {fmt(usage['player_avg'])})"
+                )
+            mode = f" | {snap['mode']}" if snap['mode'] else ""
             embed.add_field(
-                name=f"▶️ **正在播放**",
-                value=f"**{current_song['title']}**\n(請求者: {current_song['requester'].display_name})",
+                name=f"{guild.name if guild else guild_id} | {snap['status'].value}{mode}",
+                value="\n".join(lines),
                 inline=False
             )
-            if song_queue: # 如果佇列還有歌，加上分隔
-                embed.add_field(name="-"*40, value="**接下來：**", inline=False)
-        
-        # 2. 顯示佇列
-        for i, song in enumerate(song_queue[:10]):
+        playing = sum(1 for _, snap in snapshots if snap['status'] == PlayerStatus.PLAYING)
+        embed.set_footer(text=f"共 {len(snapshots)} 個播放器 ({playing} 個播放中)，目前串流合計約 {total:.1f}% CPU (單核心 = 100%)")
+        await ctx.send(embed=embed, ephemeral=is_private)
+
+    # =========================================================
+    # ✅ 指令：播放延遲統計 (僅限擁有者)
+    # =========================================================
+    @commands.hybrid_command(name="musicstats", description="[僅限擁有者] 顯示各階段的播放延遲與失敗原因")
+    @commands.is_owner()
+    @app_commands.describe(export="附上完整的 JSON 統計 (含直方圖)", reset="顯示後將統計歸零")
+    async def musicstats(self, ctx: commands.Context, export: bool = False, reset: bool = False):
+        """
+        顯示搜尋、解析串流、FFmpeg 啟動到第一個封包、換歌間隔等階段的延遲 (平均 / p50 / p95 / 最大)，
+        以及依原因分類的失敗次數。
+        指令格式: #musicstats [export] [reset]
+        """
+        is_private = ctx.interaction is not None
+        telemetry = get_telemetry()
+        data = telemetry.export()
+
+        def fmt(value):
+            return "-" if value is None else f"{value:.2f}s"
+
+        embed = discord.Embed(title="⏱️ 播放延遲統計", color=0x1DB954)
+        for stage, summary in data['latency'].items():
             embed.add_field(
-                name=f"**{i+1}. {song['title']}**", 
-                value=f"請求者: {song['requester'].display_name}", 
+                name=f"{stage} ({summary['count']} 次)",
+                value=f"平均 {fmt(summary['avg'])} | p50 {fmt(summary['p50'])} | p95 {fmt(summary['p95'])} | 最大 {fmt(summary['max'])}",
                 inline=False
             )
-        
-        # 3. 顯示佇列總數
-        if len(song_queue) > 10:
-            embed.set_footer(text=f"...還有 {len(song_queue) - 10} 首歌在佇列中")
-        elif not song_queue and current_song:
-            embed.set_footer(text="佇列中沒有其他歌曲了。")
+        if data['failures']:
+            embed.add_field(
+                name="❌ 失敗原因",
+                value="\n".join(
+                    f"**{stage}**: " + ", ".join(f"{cause} {count}" for cause, count in counter.most_common())
+                    for stage, counter in sorted(telemetry.failures.items())
+                )[:1024],
+                inline=False
+            )
+        if not data['latency'] and not data['failures']:
+            embed.description = "尚無資料。"
+        started = datetime.fromtimestamp(data['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+        embed.set_footer(text=f"自 {started} 起統計")
+
+        file = None
+        if export:
+            file = discord.File(io.BytesIO(telemetry.export_json().encode('utf8')), filename="music_telemetry.json")
+        if reset:
+            telemetry.reset()
+        if file:
+            await ctx.send(embed=embed, file=file, ephemeral=is_private)
+        else:
+            await ctx.send(embed=embed, ephemeral=is_private)
 
-        await ctx.send(embed=embed, ephemeral=is_private)
     # =========================================================
     # ✅ 指令錯誤處理函式 (已修正)
     # =========================================================
@@ -409,7 +741,9 @@ class MusicPlay(Cog_Extension):
             'playlist', '播放清單音樂', 'pl',
             'stop', 'leave', 'dc',
             'skip', 's',
-            'queue', 'q', 'np', 'nowplaying' # <-- ✅ 變更 7: 加入新別名
+            'queue', 'q', 'np', 'nowplaying', # <-- ✅ 變更 7: 加入新別名
+            'show', 'remove', 'move', 'shuffle', 'dedupe', 'clear', # /queue 的子指令
+            'streams', 'musicstats'
         ]
 
         if ctx.command and ctx.command.name in MUSIC_PLAY_COMMANDS:
@@ -1,15 +1,19 @@
 import discord
 from discord.ext import commands
 from core.classes import Cog_Extension
-import json
 import os
 import re
 import asyncio
-import random 
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Awaitable, Callable
 import logging 
 from discord import app_commands # ✅ 引入 app_commands
+from core.media_extractor import ExtractionError
+from core.media_cache import get_media_cache
+from core.music_telemetry import get_telemetry
+from core.music_library import get_music_library
+from core.media_urls import canonical_url
 
 # --- 引入用於獲取影片/歌曲標題的函式庫 ---
 try:
@@ -20,51 +24,79 @@ except ImportError:
     yt_dlp = None
 # -----------------------------------------------
 
-# 定義常量
-MUSIC_FILE = './data/music_list.json'
+# 定義常量 (清單存在 core/music_library.py 的 SQLite 資料庫)
 MUSIC_CHANNEL_ID = os.getenv('MUSIC_CHANNEL_ID')
 ITEMS_PER_PAGE = 10 
+IMPORT_CONCURRENCY = int(os.getenv('MUSIC_IMPORT_CONCURRENCY', '4')) # /importmusic 同時解析標題的數量
+IMPORT_BATCH_SIZE = 50 # 每解析幾筆寫入資料庫一次
+IMPORT_PROGRESS_INTERVAL = 5 # 更新匯入進度訊息的間隔 (秒)
+URL_REGEX = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
 
 # --- 輔助函式：獲取標題 ---
-def _get_video_title(url: str) -> str:
-    """嘗試使用 yt-dlp 獲取影片或網頁的標題 (在獨立線程中執行)"""
+def _get_page_title(url: str) -> str:
+    """降級方案：用 requests 讀取 HTML <title> (在獨立線程中執行)"""
+    try:
+        import requests
+        r = requests.get(url, timeout=5)
+        title_match = re.search(r'<title>(.*?)</title>', r.text, re.IGNORECASE)
+        if title_match:
+            return title_match.group(1).strip()
+        return f"(非標準連結或標題獲取失敗)"
+    except Exception:
+        return f"(標題獲取失敗)"
+
+
+async def _get_video_title(url: str) -> str:
+    """獲取影片或網頁的標題：已知的影片讀快取，否則交給 yt-dlp 解析服務 (獨立工作行程)"""
     if not yt_dlp:
         return "(yt-dlp未安裝，無法獲取標題)"
 
-    ydl_opts = {
-        'quiet': True, 'no_warnings': True, 'forcetitle': True, 
-        'skip_download': True, 'simulate': True, 'format': 'best', 
-        'extract_flat': 'in_playlist', 'retries': 3
-    }
-    
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False, process=False, timeout=5)
-            return info.get('title', '無法獲取標題')
-    except Exception as e:
-        # 降級嘗試：嘗試用 requests 獲取 HTML <title>
-        try:
-            import requests
-            r = requests.get(url, timeout=5)
-            title_match = re.search(r'<title>(.*?)</title>', r.text, re.IGNORECASE)
-            if title_match:
-                return title_match.group(1).strip()
-            return f"(非標準連結或標題獲取失敗)"
-        except Exception:
-            return f"(標題獲取失敗)"
+        with get_telemetry().timer('title'):
+            info = await get_media_cache().metadata(url)
+        return info.get('title') or '無法獲取標題'
+    except ExtractionError:
+        return await asyncio.to_thread(_get_page_title, url)
+
+
+class ImportProgress:
+    """
+    /importmusic 的匯入進度：已讀取的訊息依序排隊，記錄每則訊息還有幾個網址沒寫入資料庫。
+    只有 "之前的訊息都已寫入" 時才推進 cursor；解析失敗的網址計數不歸零，進度停在那則訊息之前，下次匯入會重試。
+    """
+
+    def __init__(self, cursor: Optional[str] = None):
+        self.cursor = cursor # 已完整處理的最後一則訊息 ID
+        self._scanned = deque() # 已讀取、進度尚未推進的訊息 ID (由舊到新)
+        self._remaining: Dict[int, int] = {} # 訊息 ID -> 還沒寫入資料庫的網址數
+
+    def scanned(self, message_id: int):
+        self._scanned.append(message_id)
+        self._remaining[message_id] = 0
+
+    def add_pending(self, message_id: int):
+        self._remaining[message_id] += 1
+
+    def written(self, message_ids: List[int]) -> Optional[str]:
+        """這些網址已寫入 (每個網址一個訊息 ID)；回傳推進後的 cursor"""
+        for message_id in message_ids:
+            self._remaining[message_id] -= 1
+        while self._scanned and self._remaining[self._scanned[0]] == 0:
+            self.cursor = str(self._scanned.popleft())
+            del self._remaining[int(self.cursor)]
+        return self.cursor
+
 
 # --- 輔助函式：建立分頁 Embed ---
 def _create_music_list_embed(
-    music_list: List[Dict[str, Any]], 
+    current_page_items: List[Dict[str, Any]], 
     page: int, 
     total_pages: int, 
     total_items: int,
     start_index: int,
     title: str = "🎶 頻道音樂分享清單" 
 ) -> discord.Embed:
-    """根據分頁資料建立 Embed"""
-    
-    current_page_items = music_list[start_index : start_index + ITEMS_PER_PAGE]
+    """根據分頁資料建立 Embed (current_page_items 只有這一頁的資料)"""
     
     embed = discord.Embed(
         title=title, 
@@ -104,11 +136,16 @@ def _create_music_list_embed(
 
 
 # --- View：處理按鈕互動 ---
+# 每次翻頁只向資料庫取該頁 (fetch_page(offset) -> 該頁資料)，不把整份清單放在記憶體裡
+PageFetcher = Callable[[int], Awaitable[List[Dict[str, Any]]]]
+
+
 class MusicListView(discord.ui.View):
-    def __init__(self, music_list: List[Dict[str, Any]], ctx: commands.Context, total_pages: int, initial_page: int, embed_title: str = "🎶 頻道音樂分享清單"):
+    def __init__(self, fetch_page: PageFetcher, ctx: commands.Context, total_items: int, total_pages: int, initial_page: int, embed_title: str = "🎶 頻道音樂分享清單"):
         super().__init__(timeout=180) # 3分鐘無操作後按鈕失效
-        self.music_list = music_list
+        self.fetch_page = fetch_page
         self.ctx = ctx
+        self.total_items = total_items
         self.total_pages = total_pages
         self.current_page = initial_page
         self.embed_title = embed_title 
@@ -135,31 +172,29 @@ class MusicListView(discord.ui.View):
         start_index = (self.current_page - 1) * ITEMS_PER_PAGE
         return start_index
 
+    async def _show_current_page(self, interaction: discord.Interaction):
+        self.update_buttons()
+        start_index = self._get_page_params()
+        page_items = await self.fetch_page(start_index)
+        embed = _create_music_list_embed(
+            page_items, self.current_page, self.total_pages, self.total_items, start_index,
+            title=self.embed_title
+        )
+        await interaction.response.edit_message(embed=embed, view=self)
+
     # --- 按鈕定義：上一頁 ---
     @discord.ui.button(label="上一頁", style=discord.ButtonStyle.blurple, emoji="◀️")
     async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.current_page > 1:
             self.current_page -= 1
-            self.update_buttons()
-            start_index = self._get_page_params()
-            embed = _create_music_list_embed(
-                self.music_list, self.current_page, self.total_pages, len(self.music_list), start_index,
-                title=self.embed_title
-            )
-            await interaction.response.edit_message(embed=embed, view=self)
+            await self._show_current_page(interaction)
 
     # --- 按鈕定義：下一頁 ---
     @discord.ui.button(label="下一頁", style=discord.ButtonStyle.blurple, emoji="▶️")
     async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.current_page < self.total_pages:
             self.current_page += 1
-            self.update_buttons()
-            start_index = self._get_page_params()
-            embed = _create_music_list_embed(
-                self.music_list, self.current_page, self.total_pages, len(self.music_list), start_index,
-                title=self.embed_title
-            )
-            await interaction.response.edit_message(embed=embed, view=self)
+            await self._show_current_page(interaction)
 
 
 # --- Cog 核心邏輯 ---
@@ -173,25 +208,20 @@ class Music(Cog_Extension):
             self.music_channel_id = None
             logging.warning("警告：MUSIC_CHANNEL_ID 環境變數設定錯誤，請確保它是頻道 ID 的數字。")
 
-        if not os.path.exists(MUSIC_FILE):
-            self._save_music_list([])
-            
-    def _load_music_list(self):
-        """從檔案載入音樂清單"""
-        try:
-            with open(MUSIC_FILE, 'r', encoding='utf8') as f:
-                return json.load(f)
-        except Exception as e:
-            logging.error(f"載入音樂清單失敗: {e}")
-            return []
-
-    def _save_music_list(self, music_list):
-        """將音樂清單存入檔案"""
-        try:
-            with open(MUSIC_FILE, 'w', encoding='utf8') as f:
-                json.dump(music_list, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            logging.error(f"儲存音樂清單失敗: {e}")
+        # 資料庫操作都在執行緒中進行 (第一次開啟時會自動匯入舊的 music_list.json)
+        self.library = get_music_library()
+        self._import_lock = asyncio.Lock() # 同一時間只執行一個 /importmusic
+
+    async def cog_load(self):
+        # 先開啟資料庫並載入查重索引，之後查重只查記憶體
+        await asyncio.to_thread(self.library.open)
+
+    async def cog_unload(self):
+        await get_media_cache().flush() # 匯入時解析到的標題
+
+    async def _db(self, method, *args):
+        """在執行緒中呼叫 MusicLibrary 的方法，不阻塞事件迴圈"""
+        return await asyncio.to_thread(method, *args)
             
     # =========================================================
     # ✅ 指令錯誤處理函式 (已修正重複報錯)
@@ -251,27 +281,25 @@ class Music(Cog_Extension):
             return
         
         if self.music_channel_id and msg.channel.id == self.music_channel_id:
-            url_regex = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-            urls = re.findall(url_regex, msg.content)
+            urls = re.findall(URL_REGEX, msg.content)
 
             if urls:
-                music_list = self._load_music_list()
-                
                 for url in urls:
-                    if any(entry['url'] == url for entry in music_list):
-                        await msg.channel.send(f"⚠️ 這個連結已在清單中：`{url}`", delete_after=5)
+                    # 以正規化網址查重 (O(1))：youtu.be、?t=30、YouTube Music 等寫法都視為同一首
+                    if self.library.contains(url):
+                        existing = await self._db(self.library.find, url)
+                        shared = f" (由 {existing.get('posted_by', '匿名')} 分享過)" if existing else ""
+                        await msg.channel.send(f"⚠️ 這個連結已在清單中：`{url}`{shared}", delete_after=5)
                         continue
                         
-                    title = await asyncio.to_thread(_get_video_title, url) 
+                    title = await _get_video_title(url) 
                         
-                    music_entry = {
-                        "title": title, 
-                        "url": url,
-                        "posted_by": msg.author.display_name,
-                        "timestamp": msg.created_at.isoformat()
-                    }
-                    music_list.insert(0, music_entry) 
-                    self._save_music_list(music_list)
+                    added = await self._db(
+                        self.library.add, url, title, msg.author.display_name, msg.created_at.isoformat()
+                    )
+                    if not added: # 取得標題期間被其他訊息搶先加入
+                        await msg.channel.send(f"⚠️ 這個連結已在清單中：`{url}`", delete_after=5)
+                        continue
                     
                     await msg.channel.send(f"✅ 已將音樂 `{title}` (分享者: {msg.author.display_name}) 儲存。", delete_after=8)
                     
@@ -286,37 +314,42 @@ class Music(Cog_Extension):
         """
         is_private = ctx.interaction is not None
         
-        music_list = self._load_music_list()
+        total_items = await self._db(self.library.count)
 
-        if not music_list:
+        if total_items == 0:
             return await ctx.send("目前音樂清單中沒有任何紀錄。", ephemeral=is_private)
         
-        total_items = len(music_list)
         total_pages = (total_items + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
         
         if page < 1: page = 1
         if page > total_pages: page = total_pages
 
         start_index = (page - 1) * ITEMS_PER_PAGE
+
+        async def fetch_page(offset: int):
+            return await self._db(self.library.page, offset, ITEMS_PER_PAGE)
         
         embed = _create_music_list_embed(
-            music_list, page, total_pages, total_items, start_index
+            await fetch_page(start_index), page, total_pages, total_items, start_index
         )
         
-        view = MusicListView(music_list, ctx, total_pages, page)
+        view = MusicListView(fetch_page, ctx, total_items, total_pages, page)
         
         await ctx.send(embed=embed, view=view, ephemeral=is_private)
 
 
     # =========================================================
-    # ✅ 修正後的 import_previous_records 函式
+    # /importmusic：兩段式匯入管線
+    # 1. 讀取頻道歷史訊息，找出清單中還沒有的網址，放進有上限的佇列
+    # 2. 多個 worker 同時解析標題 (已知影片讀快取)，每 IMPORT_BATCH_SIZE 筆寫入一次
+    # 匯入進度 (已完整處理的最後一則訊息 ID) 與資料在同一個交易中寫入，中斷後可以接續。
     # =========================================================
     @commands.hybrid_command(name='importmusic', aliases=['匯入音樂', '抓取紀錄'], description="匯入音樂頻道中尚未紀錄的歷史連結")
-    @app_commands.describe(limit="要檢查的訊息數量 (預設 500)")
-    async def import_previous_records(self, ctx: commands.Context, limit: int = 500):
+    @app_commands.describe(limit="要檢查的訊息數量 (預設 500)", restart="忽略上次的進度，從頻道最舊的訊息重新檢查")
+    async def import_previous_records(self, ctx: commands.Context, limit: int = 500, restart: bool = False):
         """
         匯入音樂頻道中尚未紀錄的歷史連結。
-        指令格式: #importmusic [要檢查的訊息數量] (預設 500 筆)
+        指令格式: #importmusic [要檢查的訊息數量] [restart] (預設 500 筆，從上次匯入的進度接續)
         """
         is_private = ctx.interaction is not None
         
@@ -327,76 +360,116 @@ class Music(Cog_Extension):
         if not target_channel:
             return await ctx.send("❌ 錯誤：找不到指定的音樂分享頻道。", ephemeral=True)
 
-        # --- 修正點 1：(使用 defer 和 send 來處理 "思考中") ---
-        original_message = None # 用於 # 指令
-        if is_private:
-            # / 指令：顯示 "Bot 正在思考..." (私人)
-            await ctx.defer(ephemeral=True)
-        else:
-            # # 指令：發送 "正在檢查..." (公開)
-            try:
-                original_message = await ctx.send(f"⏳ 正在檢查最近 **{limit}** 筆歷史訊息，請稍候...", ephemeral=False)
-            except discord.errors.Forbidden:
-                return # 無法在 # 頻道發言
-
-        music_list = self._load_music_list()
-        existing_urls = {entry['url'] for entry in music_list}
-        
-        imported_count = 0
-        checked_count = 0 
-        
-        edit_content = "" # 準備回覆的內容
-        
-        try:
-            async for message in target_channel.history(limit=limit, oldest_first=True):
-                checked_count += 1 
-                if message.author == self.bot.user:
-                    continue
-
-                url_regex = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-                urls = re.findall(url_regex, message.content)
-                
-                for url in urls:
-                    if url not in existing_urls:
-                        title = await asyncio.to_thread(_get_video_title, url)
-                        
-                        music_entry = {
-                            "title": title, 
-                            "url": url,
-                            "posted_by": message.author.display_name,
-                            "timestamp": message.created_at.isoformat() 
-                        }
-                        
-                        music_list.append(music_entry) 
-                        existing_urls.add(url)
-                        imported_count += 1
-                        
-                        if imported_count % 20 == 0:
-                            self._save_music_list(music_list)
+        if self._import_lock.locked():
+            return await ctx.send("⏳ 已有匯入正在進行中，請等它完成後再試。", ephemeral=True)
 
-        except discord.errors.Forbidden:
-            edit_content = f"❌ **權限錯誤：** 機器人沒有權限讀取此頻道的**訊息歷史 (Read Message History)**！"
-        except Exception as e:
-            edit_content = f"❌ 發生未知錯誤: {e}"
+        async with self._import_lock:
+            cursor_key = f"import_cursor:{target_channel.id}"
+            resume_from = None if restart else await self._db(self.library.get_meta, cursor_key)
+            where = f"上次進度 (訊息 {resume_from}) 之後的" if resume_from else "最舊的"
 
-        # 最終儲存
-        self._save_music_list(music_list)
-        
-        if imported_count > 0:
-             music_list.sort(key=lambda x: datetime.fromisoformat(x['timestamp']), reverse=True)
-             self._save_music_list(music_list)
+            original_message = None # 用於 # 指令
+            if is_private:
+                # / 指令：顯示 "Bot 正在思考..." (私人)，之後的進度編輯這則回應
+                await ctx.defer(ephemeral=True)
+            else:
+                try:
+                    original_message = await ctx.send(f"⏳ 正在檢查{where} **{limit}** 筆歷史訊息，請稍候...", ephemeral=False)
+                except discord.errors.Forbidden:
+                    return # 無法在 # 頻道發言
+
+            async def report(content: str):
+                try:
+                    if is_private:
+                        await ctx.interaction.edit_original_response(content=content)
+                    elif original_message:
+                        await original_message.edit(content=content)
+                except discord.HTTPException as e:
+                    logging.warning(f"更新匯入進度訊息失敗: {e}")
+
+            stats = {'checked': 0, 'found': 0, 'imported': 0}
+            candidates: asyncio.Queue = asyncio.Queue(maxsize=IMPORT_CONCURRENCY * 4) # 解析跟不上時暫停讀取歷史
+            seen_keys = set() # 本次已排入的正規化網址
+            progress = ImportProgress(resume_from)
+            resolved = [] # 已解析標題、等待寫入的 (訊息 ID, 資料列)
+            flush_lock = asyncio.Lock()
+
+            async def flush():
+                """寫入已解析的資料列，並把進度推進到 "之前的訊息都已寫入" 的最後一則"""
+                nonlocal resolved
+                async with flush_lock:
+                    batch, resolved = resolved, []
+                    cursor = progress.written([message_id for message_id, _ in batch])
+                    meta = {cursor_key: cursor} if cursor else None
+                    stats['imported'] += await self._db(self.library.add_many, [row for _, row in batch], meta)
+
+            async def read_history():
+                after = discord.Object(id=int(resume_from)) if resume_from else None
+                async for message in target_channel.history(limit=limit, after=after, oldest_first=True):
+                    stats['checked'] += 1
+                    progress.scanned(message.id)
+                    if message.author == self.bot.user:
+                        continue
+                    for url in re.findall(URL_REGEX, message.content):
+                        key = canonical_url(url)
+                        if key in seen_keys or self.library.contains(url):
+                            continue
+                        seen_keys.add(key)
+                        progress.add_pending(message.id)
+                        stats['found'] += 1
+                        await candidates.put((message, url))
+
+            async def resolve_titles():
+                while True:
+                    message, url = await candidates.get()
+                    try:
+                        title = await _get_video_title(url)
+                        resolved.append((message.id, (url, title, message.author.display_name, message.created_at.isoformat())))
+                        if len(resolved) >= IMPORT_BATCH_SIZE:
+                            await flush()
+                    except Exception as e:
+                        # 這筆不寫入；計數不歸零，進度停在這則訊息之前，下次匯入會重試
+                        logging.error(f"匯入 {url} 失敗: {e}")
+                    finally:
+                        candidates.task_done()
+
+            async def show_progress():
+                while True:
+                    await asyncio.sleep(IMPORT_PROGRESS_INTERVAL)
+                    await report(
+                        f"⏳ 匯入中... 已檢查 **{stats['checked']} / {limit}** 筆訊息，"
+                        f"找到 **{stats['found']}** 個新連結，已匯入 **{stats['imported']}** 個。"
+                    )
+
+            workers = [asyncio.create_task(resolve_titles()) for _ in range(IMPORT_CONCURRENCY)]
+            progress_task = asyncio.create_task(show_progress())
+            edit_content = "" # 準備回覆的內容
+            try:
+                await read_history()
+                await candidates.join()
+            except discord.errors.Forbidden:
+                edit_content = f"❌ **權限錯誤：** 機器人沒有權限讀取此頻道的**訊息歷史 (Read Message History)**！"
+            except Exception as e:
+                edit_content = f"❌ 發生未知錯誤: {e}"
+            finally:
+                progress_task.cancel()
+                for worker in workers:
+                    worker.cancel()
+
+            # 最終儲存 (出錯時也保存已解析的部分與進度)
+            await flush()
+
+            if not edit_content: # 如果沒出錯
+                edit_content = (
+                    f"✅ 歷史紀錄匯入完成！已檢查{where} **{stats['checked']} / {limit}** 筆訊息，"
+                    f"並成功匯入 **{stats['imported']}** 個新的音樂連結。"
+                )
+                if stats['checked'] == limit:
+                    edit_content += "\n再次執行 `/importmusic` 會從這次的進度繼續檢查較新的訊息。"
+            else:
+                edit_content += f"\n已匯入 **{stats['imported']}** 個連結，進度已保存，再次執行 `/importmusic` 會從中斷處繼續。"
 
-        if not edit_content: # 如果沒出錯
-            edit_content = f"✅ 歷史紀錄匯入完成！已檢查 **{checked_count} / {limit}** 筆訊息，並成功匯入 **{imported_count}** 個新的音樂連結。"
-        
-        # --- 修正點 2：(使用 followup 和 edit 來回覆最終結果) ---
-        if is_private:
-            # / 指令：用 followup 回覆 "思考中"
-            await ctx.followup.send(edit_content, ephemeral=True)
-        else:
-            # # 指令：編輯原始訊息
-            if original_message: # 確保 # 指令的訊息有成功發送
-                await original_message.edit(content=edit_content)
+            await report(edit_content)
     # =========================================================
     
     # --- ✅ 指令：搜尋音樂 (轉換為 Hybrid) ---
@@ -408,36 +481,37 @@ class Music(Cog_Extension):
         指令格式: #searchmusic <關鍵字>
         """
         is_private = ctx.interaction is not None
-        music_list = self._load_music_list()
-        if not music_list:
+        library_size = await self._db(self.library.count)
+        if library_size == 0:
             return await ctx.send("目前音樂清單中沒有任何紀錄。", ephemeral=is_private)
 
-        search_results = [
-            entry for entry in music_list 
-            if keyword.lower() in entry.get('title', '').lower()
-        ]
+        # 標題全文索引 (FTS5 trigram)，每次只取一頁
+        total_items, first_page = await self._db(self.library.search, keyword, 0, ITEMS_PER_PAGE)
         
         custom_title = f"🔎 搜尋 '{keyword}' 的結果"
 
-        if not search_results:
+        if total_items == 0:
             embed = discord.Embed(
                 title=custom_title,
-                description=f"在 **{len(music_list)}** 筆紀錄中，找不到標題包含 `{keyword}` 的歌曲。",
+                description=f"在 **{library_size}** 筆紀錄中，找不到標題包含 `{keyword}` 的歌曲。",
                 color=0xFF0000 
             )
             return await ctx.send(embed=embed, ephemeral=is_private)
         
-        total_items = len(search_results)
         total_pages = (total_items + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
         page = 1 
         start_index = 0
 
+        async def fetch_page(offset: int):
+            _, rows = await self._db(self.library.search, keyword, offset, ITEMS_PER_PAGE)
+            return rows
+
         embed = _create_music_list_embed(
-            search_results, page, total_pages, total_items, start_index,
+            first_page, page, total_pages, total_items, start_index,
             title=custom_title
         )
         
-        view = MusicListView(search_results, ctx, total_pages, page, embed_title=custom_title) 
+        view = MusicListView(fetch_page, ctx, total_items, total_pages, page, embed_title=custom_title) 
         
         await ctx.send(embed=embed, view=view, ephemeral=is_private)
 
@@ -452,17 +526,11 @@ class Music(Cog_Extension):
         指令格式: #removesong <編號>
         """
         is_private = ctx.interaction is not None
-        music_list = self._load_music_list()
-        
-        # 將 1-based 編號轉為 0-based 索引
-        index = number - 1
+
+        # 編號與 #musiclist 相同 (從 1 開始，最新的在前)
+        removed_song = await self._db(self.library.remove_at, number)
         
-        if 0 <= index < len(music_list):
-            # 彈出該歌曲
-            removed_song = music_list.pop(index)
-            # 儲存變更
-            self._save_music_list(music_list)
-            
+        if removed_song:
             await ctx.send(
                 f"✅ **已刪除歌曲：**\n"
                 f"編號 **{number}**: `{removed_song.get('title', 'N/A')}`\n"
@@ -472,7 +540,7 @@ class Music(Cog_Extension):
         else:
             await ctx.send(
                 f"❌ **刪除失敗：** 編號 `{number}` 無效。\n"
-                f"請使用 `#musiclist` 查詢編號，目前清單總共有 **{len(music_list)}** 首歌。",
+                f"請使用 `#musiclist` 查詢編號，目前清單總共有 **{await self._db(self.library.count)}** 首歌。",
                 ephemeral=True # 錯誤一律私人
             )
 
@@ -484,11 +552,9 @@ class Music(Cog_Extension):
         指令格式: #randomsong
         """
         is_private = ctx.interaction is not None
-        music_list = self._load_music_list()
-        if not music_list:
+        song = await self._db(self.library.random)
+        if not song:
             return await ctx.send("目前音樂清單中沒有任何紀錄。", ephemeral=is_private)
-
-        song = random.choice(music_list)
         
         embed = discord.Embed(
             title=f"🎶 隨機點播",
@@ -5,35 +5,63 @@ import json
 import os
 import asyncio
 import logging
-from datetime import time, datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple, Set
 
 # (修正點 1：引入 Python 內建的時區函式庫)
 from zoneinfo import ZoneInfo
 
 # --- 引入股票所需的核心函式庫 ---
 import requests
-import pandas as pd
-import numpy as np # 新增 numpy 用於計算指標
+import numpy as np # 新增 numpy 用於計算指標 (取代 pandas)
+from core.stock_indicators import IncrementalIndicators
+from core.stock_history import Bars, HISTORY_RANGE, TIMEFRAME_LABELS, bars_from_chart, load_history, save_history, merge_bars, normalize_daily, resample
+from core.stock_backtest import run_backtest, FORWARD_HORIZONS
+from core.stock_rules import RuleSet, RuleResult, load_rules
+from core.price_alerts import PriceAlertIndex, ABOVE
+from core.twse_snapshot import fetch_snapshot, ingest_snapshot, is_twse_symbol, twse_code
+from core.exchange_calendar import EXCHANGES, Exchange, exchange_for, session, is_open, is_trading_day, next_trading_day, local_date, add_closure
+from core.market_panel import load_panel, update_panel, screen
 # --------------------------------
 
 # --- 設定常量 ---
 STOCK_LIST_FILE = './data/stock_list.json' # 儲存股票代碼的檔案
-PROXIMITY_THRESHOLD = 0.01 # 接近 MA20 的閾值 (1%)
-
-# --- 新增指標參數 ---
-RSI_PERIOD = 14            # RSI 計算週期
-RSI_OVERBOUGHT = 70        # RSI 超買界線
-RSI_OVERSOLD = 30          # RSI 超賣界線
-VOLUME_ANOMALY_MULTIPLIER = 2.5 # 爆量判定倍數 (大於 5日均量 的 2.5 倍)
+REPORT_STATE_FILE = './data/stock_report_state.json' # 各市場最後一次發送每日報告的交易日 (重新載入後不重複發送)
+# 訊號規則與參數 (MA20 接近閾值、RSI 界線、爆量倍數等) 定義於 data/stock_rules.json
 
 # (修正點 2：建立一個明確的 "Asia/Taipei" 時區物件)
 TAIWAN_TZ = ZoneInfo("Asia/Taipei")
 
-# (修正點 3：將 "天真" 時間改為 "帶有時區" 的時間)
-# (修正點 6：將時間改為 13:45，確保台股已收盤)
-# Note: 依照您的要求保留原始設定 12:00
-CHECK_TIME_TW = time(12,00, 0, tzinfo=TAIWAN_TZ) # 每天台灣時間 13:45 執行
+# 每日報告改為依交易所行事曆排程：各市場在自己的收盤時間 (含提早收盤) 之後執行，休市日不抓取
+# 休市日、提早收盤日定義於 data/exchange_calendar.json
+REPORT_DELAY = timedelta(minutes=15) # 收盤後等待多久再發送報告 (確保收盤資料已定案)
+REPORT_WINDOW = timedelta(hours=2)   # 超過這段時間仍未發送 (例如 Bot 離線) 就放棄當日報告
+# 兩階段報告：發送前先預抓資料暖機快取，發送時只需補抓最後一根
+PREFETCH_LEAD = timedelta(minutes=10)   # 在報告時間前多久開始預抓
+PREFETCH_WAIT_SECONDS = 60              # 發送時若預抓尚未完成，最多再等多久
+REPORT_CONCURRENCY = 4                  # 預抓 / 補抓時同時進行的請求數上限
+
+# Discord 限制：每個 Embed 最多 25 個欄位、總字數 6000
+EMBED_MAX_FIELDS = 25
+EMBED_MAX_CHARS = 5500
+
+# --- 盤中監測模式 ---
+# STOCK_INTRADAY_INTERVAL 設為 1m 或 5m 即啟用 (留空則只做每日檢查)
+STOCK_INTRADAY_INTERVAL = os.getenv('STOCK_INTRADAY_INTERVAL', '').strip().lower()
+INTRADAY_INTERVAL_SECONDS = {'1m': 60, '5m': 300}
+INTRADAY_SEED_RANGE = '5d' # 首次輪詢時用來建立指標狀態的歷史區間
+INTRADAY_CONCURRENCY = 8   # 同時進行的請求數上限
+
+# 指令中使用的市場簡稱 -> 交易所代碼
+MARKET_ALIASES = {'TW': 'TWSE', 'US': 'NYSE'}
+
+# /stock price 查詢不在快取中的股票時抓取的區間 (需涵蓋 20 個月才能計算月線 MA20)
+PRICE_HISTORY_RANGE = '2y'
+
+# --- 全市場選股 ---
+SCREEN_PAGE_SIZE = 10      # 每頁顯示的股票數
+SCREEN_MIN_DAYS = 21       # 全市場矩陣至少需要的交易日數 (MA20 + 前一日)
+BACKFILL_REQUEST_DELAY = 3 # 回補快照時每次請求的間隔 (秒)，避免被證交所封鎖
 
 # 讀取通知頻道 ID 和身分組 ID
 STOCK_MONITOR_CHANNEL_ID_STR = os.getenv('STOCK_MONITOR_CHANNEL_ID') 
@@ -77,13 +105,40 @@ def _save_stock_list(stock_list: List[str]):
         logging.error(f"儲存 {STOCK_LIST_FILE} 失敗: {e}")
 
 
-def _fetch_stock_data(stock_id: str, range_='3mo', interval_='1d') -> Tuple[Optional[pd.DataFrame], str]:
+def _load_report_state() -> Dict[str, date]:
+    """讀取各市場最後一次已發送報告的交易日 {交易所代碼: 'YYYY-MM-DD'}"""
+    if not os.path.exists(REPORT_STATE_FILE):
+        return {}
+    try:
+        with open(REPORT_STATE_FILE, 'r', encoding='utf-8') as f:
+            return {code: date.fromisoformat(day) for code, day in json.load(f).items()}
+    except Exception as e:
+        logging.error(f"讀取 {REPORT_STATE_FILE} 失敗: {e}")
+        return {}
+
+def _save_report_state(reported: Dict[str, date]):
+    tmp_path = REPORT_STATE_FILE + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(REPORT_STATE_FILE) or '.', exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({code: day.isoformat() for code, day in reported.items()}, f, indent=2)
+        os.replace(tmp_path, REPORT_STATE_FILE)
+    except Exception as e:
+        logging.error(f"儲存 {REPORT_STATE_FILE} 失敗: {e}")
+
+
+def _fetch_stock_data(stock_id: str, range_='3mo', interval_='1d', period1: Optional[int] = None) -> Tuple[Optional[Bars], str]:
     """
     從 Yahoo Finance 抓取股票數據 (在獨立線程中執行)。
-    更新：回傳 (DataFrame, StockName)
+    更新：回傳 (Bars, StockName)，直接解碼為 NumPy 欄式陣列，不經過 pandas。
+    若提供 period1 (Unix 秒)，則只抓取該時間點之後的 K 棒 (盤中增量更新用)。
     """
     url = f"https://query1.finance.yahoo.com/v8/finance/chart/{stock_id}"
     params = {'range': range_, 'interval': interval_, 'region': 'TW', 'lang': 'zh-Hant-TW'}
+    if period1 is not None:
+        del params['range']
+        params['period1'] = int(period1)
+        params['period2'] = int(datetime.now(timezone.utc).timestamp())
     headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36'}
     try:
         response = requests.get(url, params=params, headers=headers, timeout=10)
@@ -95,154 +150,224 @@ def _fetch_stock_data(stock_id: str, range_='3mo', interval_='1d') -> Tuple[Opti
         meta = result.get('meta', {})
         stock_name = meta.get('shortName', stock_id) # 若抓不到名稱則用代碼代替
         
-        timestamps = result['timestamp']
-        quote = result['indicators']['quote'][0]
-        if not timestamps:
+        if not result.get('timestamp'):
             logging.warning(f"[{stock_id}] 找不到資料。")
             return None, stock_name
-            
-        dates = [datetime.fromtimestamp(ts) for ts in timestamps]
-        clean_quote = {}
-        for key in ['open', 'high', 'low', 'close', 'volume']:
-            clean_quote[key] = [val if val is not None else float('nan') for val in quote.get(key, [])]
-            
-        df = pd.DataFrame({
-            'Open': clean_quote['open'],
-            'High': clean_quote['high'],
-            'Low': clean_quote['low'],
-            'Close': clean_quote['close'],
-            'Volume': clean_quote['volume']
-        }, index=pd.to_datetime(dates))
-        df.dropna(inplace=True) 
-        
-        return df, stock_name
+
+        return bars_from_chart(result), stock_name
     except Exception as e:
         logging.error(f"[錯誤] 抓取 {stock_id} 時發生錯誤: {e}")
         return None, stock_id
 
-def _calculate_rsi(series, period=14):
-    """計算 RSI 指標"""
-    delta = series.diff()
-    gain = (delta.where(delta > 0, 0)).fillna(0)
-    loss = (-delta.where(delta < 0, 0)).fillna(0)
+def _rule_color(name: str) -> discord.Color:
+    """將規則檔中的顏色名稱 (例如 gold、dark_red) 轉為 discord.Color"""
+    factory = getattr(discord.Color, name, None)
+    return factory() if callable(factory) else discord.Color.blue()
 
-    avg_gain = gain.ewm(alpha=1/period, adjust=False).mean()
-    avg_loss = loss.ewm(alpha=1/period, adjust=False).mean()
-
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+def _signals_from_result(stock_id: str, stock_name: str, result: RuleResult, index: int = -1, timeframe: Optional[str] = '1d') -> List[Dict[str, Any]]:
+    """
+    將規則引擎在指定位置 (預設最新一根) 觸發的規則轉為通知格式。
+    timeframe 只保留適用該週期的規則 (None 表示不篩選，盤中 K 棒使用)；週線 / 月線訊號的標題會加上週期標籤。
+    """
+    label = f"[{TIMEFRAME_LABELS[timeframe]}] " if timeframe not in (None, '1d') else ""
+    return [
+        {
+            'type': rule.type,
+            'title': f'{stock_id} ({stock_name}): {label}{rule.title}',
+            'detail': result.format_detail(rule, index),
+            'color': _rule_color(rule.color),
+        }
+        for rule in result.fired(index)
+        if timeframe is None or timeframe in rule.timeframes
+    ]
 
-def _analyze_signals(stock_id: str, stock_name: str, df: pd.DataFrame, threshold_percent: float) -> List[Dict[str, Any]]:
+def _analyze_signals(stock_id: str, stock_name: str, bars: Bars, rules: RuleSet, timeframes: Tuple[str, ...] = ('1d',)) -> List[Dict[str, Any]]:
     """
     分析股票訊號並返回通知列表。
-    更新：加入 RSI 與 成交量分析
+    更新：規則改由 data/stock_rules.json 定義，整段資料一次向量化評估。
+    週線 / 月線由同一份日線在本地重新取樣，不需要額外下載。
     """
+    if len(bars.ts) < 2:
+        logging.warning(f"[{stock_id}] 資料量不足 2 天，無法比較。")
+        return []
+
     signals = []
-    
-    if len(df) < 20:
-        logging.info(f"[{stock_id}] 資料量不足 20 天，跳過分析。")
-        return signals
-        
-    df['MA20'] = df['Close'].rolling(window=20).mean()
-    df['MA5_Vol'] = df['Volume'].rolling(window=5).mean()
-    df['RSI'] = _calculate_rsi(df['Close'], RSI_PERIOD)
-    
+    for timeframe in timeframes:
+        tf_bars = resample(bars, timeframe)
+        if len(tf_bars.ts) < 2:
+            continue
+        result = rules.evaluate(tf_bars.columns())
+        signals.extend(_signals_from_result(stock_id, stock_name, result, timeframe=timeframe))
+    return signals
+
+def _latest_value(result: RuleResult, name: str) -> float:
+    """取得規則結果中某個數值的最新一筆，規則檔未定義時回傳 NaN"""
     try:
-        latest = df.iloc[-1]
-        prev = df.iloc[-2]
-    except IndexError:
-        logging.warning(f"[{stock_id}] 資料量不足 2 天，無法比較。")
-        return signals
-        
-    ma20 = latest['MA20']
-    rsi = latest['RSI']
-    vol = latest['Volume']
-    ma5_vol = latest['MA5_Vol']
-    
-    if pd.isna(ma20):
-        logging.warning(f"[{stock_id}] MA20 數值為空，跳過。")
-        return signals
-
-    # 1. K棒「接觸」MA20
-    if latest['Low'] <= ma20 <= latest['High']:
-        signals.append({
-            'type': '接觸',
-            'title': f'{stock_id} ({stock_name}): K棒接觸 MA20',
-            'detail': f"K棒 (H:{latest['High']:.2f} L:{latest['Low']:.2f}) 已碰觸 MA20 ({ma20:.2f})。",
-            'color': discord.Color.gold()
-        })
-        
-    # 2. "快接觸到" 
+        values = np.asarray(result.value(name), dtype=np.float64)
+    except KeyError:
+        return float('nan')
+    return float(values) if values.ndim == 0 else float(values[-1])
+
+
+def _bar_date(ts: int) -> date:
+    """
+    日 K 的交易日。台股與美股的交易時段換算成 UTC 都落在同一天，
+    因此原始的 Yahoo 時間戳與快取中對齊到 00:00 UTC 的時間戳都可直接取 UTC 日期。
+    """
+    return datetime.fromtimestamp(int(ts), timezone.utc).date()
+
+def _closing_timeframes(exchange: Exchange, session_day: date) -> Tuple[str, ...]:
+    """
+    該交易日收盤後已完成的週期：日線一定完成；若下一個交易日落在下一週 / 下個月，
+    代表本週 / 本月的 K 棒也已收完，報告才加入週線 / 月線訊號 (避免未完成的 K 棒每天重複通知)。
+    """
+    following = next_trading_day(exchange, session_day)
+    if following is None:
+        return ('1d',)
+    timeframes = ['1d']
+    if following.isocalendar()[:2] != session_day.isocalendar()[:2]:
+        timeframes.append('1wk')
+    if (following.year, following.month) != (session_day.year, session_day.month):
+        timeframes.append('1mo')
+    return tuple(timeframes)
+
+def _report_time(exchange: Exchange, day: date) -> Optional[datetime]:
+    """該交易日的每日報告時間 (收盤 + REPORT_DELAY)；休市日回傳 None"""
+    hours = session(exchange, day)
+    return hours[1] + REPORT_DELAY if hours else None
+
+def _refresh_history(stock_id: str) -> Tuple[Optional[Bars], str]:
+    """
+    更新並回傳單一股票的日線歷史快取與名稱 (在獨立線程中執行)。
+    已有快取時只抓取最後一個交易日之後的資料；抓取失敗時回傳舊快取。
+    """
+    cached = load_history(stock_id)
+    if cached is None or len(cached.ts) == 0:
+        bars, stock_name = _fetch_stock_data(stock_id, range_=HISTORY_RANGE)
     else:
-        # 快要漲碰到
-        lower_bound = ma20 * (1.0 - threshold_percent)
-        if (latest['High'] < ma20) and (latest['High'] >= lower_bound):
-            distance = ma20 - latest['High']
-            signals.append({
-                'type': '接近',
-                'title': f'{stock_id} ({stock_name}): 快要漲碰到 MA20',
-                'detail': f"K棒高點 ({latest['High']:.2f}) 接近 MA20 ({ma20:.2f}), 僅差 {distance:.2f}。",
-                'color': discord.Color.orange()
-            })
-            
-        # 快要跌碰到
-        upper_bound = ma20 * (1.0 + threshold_percent)
-        if (latest['Low'] > ma20) and (latest['Low'] <= upper_bound):
-            distance = latest['Low'] - ma20
-            signals.append({
-                'type': '接近',
-                'title': f'{stock_id} ({stock_name}): 快要跌碰到 MA20',
-                'detail': f"K棒低點 ({latest['Low']:.2f}) 接近 MA20 ({ma20:.2f}), 僅差 {distance:.2f}。",
-                'color': discord.Color.orange()
-            })
-
-    # 3. K棒「穿越」MA20
-    if not pd.isna(prev['MA20']):
-        if latest['Close'] > ma20 and prev['Close'] < prev['MA20']:
-            signals.append({
-                'type': '穿越',
-                'title': f'{stock_id} ({stock_name}): 🟡 黃金交叉 (站上 MA20)',
-                'detail': f"收盤價 ({latest['Close']:.2f}) 站上 MA20 ({ma20:.2f})。",
-                'color': discord.Color.green()
-            })
-        elif latest['Close'] < ma20 and prev['Close'] > prev['MA20']:
-            signals.append({
-                'type': '穿越',
-                'title': f'{stock_id} ({stock_name}): ⚫ 死亡交叉 (跌破 MA20)',
-                'detail': f"收盤價 ({latest['Close']:.2f}) 跌破 MA20 ({ma20:.2f})。",
-                'color': discord.Color.red()
-            })
-
-    # 4. RSI 強弱指標
-    if not pd.isna(rsi):
-        if rsi > RSI_OVERBOUGHT:
-            signals.append({
-                'type': 'RSI',
-                'title': f'{stock_id} ({stock_name}): 🔥 RSI 過熱 (超買)',
-                'detail': f"RSI 目前為 **{rsi:.1f}** (>70)，注意回檔風險。",
-                'color': discord.Color.dark_red()
-            })
-        elif rsi < RSI_OVERSOLD:
-            signals.append({
-                'type': 'RSI',
-                'title': f'{stock_id} ({stock_name}): ❄️ RSI 過冷 (超賣)',
-                'detail': f"RSI 目前為 **{rsi:.1f}** (<30)，可能醞釀反彈。",
-                'color': discord.Color.dark_blue()
-            })
-
-    # 5. 成交量異常 (爆量)
-    if ma5_vol > 0:
-        vol_ratio = vol / ma5_vol
-        if vol_ratio >= VOLUME_ANOMALY_MULTIPLIER:
-            signals.append({
-                'type': '量能',
-                'title': f'{stock_id} ({stock_name}): 🌋 成交量異常 (爆量)',
-                'detail': f"今日成交量 ({int(vol):,}) 為 5日均量 的 **{vol_ratio:.1f} 倍**。",
-                'color': discord.Color.purple()
-            })
-            
-    return signals
+        # 從最後一根重新抓起，順便修正盤中抓到的未收盤資料
+        bars, stock_name = _fetch_stock_data(stock_id, period1=int(cached.ts[-1]))
+
+    if bars is None or len(bars.ts) == 0:
+        return cached, stock_name
+
+    bars = normalize_daily(bars)
+    merged = merge_bars(cached, bars) if cached is not None else bars
+    save_history(stock_id, merged)
+    return merged, stock_name
+
+def _load_twse_histories(stock_list: List[str], session_day: date) -> Dict[str, Tuple[Bars, str]]:
+    """
+    以證交所全市場收盤行情更新清單中 .TW 股票的日線快取 (在獨立線程中執行)。
+    一次請求取代每支股票各一次的 Yahoo 請求；尚未建立快取的股票會先由 Yahoo 回補一次歷史。
+    同一份快照也會併入全市場矩陣，供 /stock screen 使用。
+    回傳 {代碼: (Bars, 名稱)}，快照下載失敗時回傳空字典 (改由 Yahoo 逐支抓取)。
+    """
+    snapshot = fetch_snapshot(session_day)
+    if snapshot is None:
+        return {}
+    update_panel('TWSE', snapshot)
+
+    targets = [s for s in stock_list if is_twse_symbol(s)]
+
+    for stock_id in targets:
+        cached = load_history(stock_id)
+        if (cached is None or len(cached.ts) == 0) and twse_code(stock_id) in snapshot.rows:
+            _refresh_history(stock_id)
+
+    histories = ingest_snapshot(snapshot, targets)
+    return {s: (bars, snapshot.rows[twse_code(s)].name) for s, bars in histories.items()}
+
+
+def _split_signal_embeds(
+    title: str,
+    description: str,
+    signals: List[Dict[str, Any]],
+    footer: Optional[str] = None,
+    color: Optional[discord.Color] = None
+) -> List[discord.Embed]:
+    """
+    將訊號列表拆成多個 Embed，每個不超過 25 個欄位與字數上限。
+    第一個 Embed 帶標題與說明，之後的標題加上頁碼。
+    """
+    color = color or discord.Color.blue()
+    embeds: List[discord.Embed] = []
+    embed = None
+    for signal in signals:
+        field_chars = len(signal['title']) + len(signal['detail'])
+        if embed is None or len(embed.fields) >= EMBED_MAX_FIELDS or len(embed) + field_chars > EMBED_MAX_CHARS:
+            if embed is None:
+                embed = discord.Embed(title=title, description=description, color=color)
+            else:
+                embed = discord.Embed(title=f"{title} (續 {len(embeds) + 1})", color=color)
+            embeds.append(embed)
+        embed.add_field(name=signal['title'], value=signal['detail'], inline=False) # 標題已包含名稱
+
+    if not embeds:
+        embeds.append(discord.Embed(title=title, description=description, color=color))
+    if footer:
+        embeds[-1].set_footer(text=footer)
+    return embeds
+
+def _create_screen_embed(matches: List[Dict[str, Any]], page: int, total_pages: int, title: str, footer: str) -> discord.Embed:
+    """根據分頁資料建立選股結果 Embed"""
+    start_index = (page - 1) * SCREEN_PAGE_SIZE
+    embed = discord.Embed(
+        title=title,
+        description=f"共 **{len(matches)}** 檔符合條件 (依成交金額排序)。顯示第 **{page} / {total_pages}** 頁。",
+        color=discord.Color.blue()
+    )
+    for i, m in enumerate(matches[start_index:start_index + SCREEN_PAGE_SIZE]):
+        embed.add_field(
+            name=f"{start_index + i + 1}. {m['symbol']} ({m['name']})",
+            value=f"收盤 **{m['close']:.2f}** ({m['change_pct']:+.2f}%) · 成交金額 {m['turnover'] / 1e8:,.2f} 億\n" + "、".join(m['rules']),
+            inline=False
+        )
+    embed.set_footer(text=footer)
+    return embed
+
+
+class ScreenView(discord.ui.View):
+    """全市場選股結果的翻頁按鈕"""
+
+    def __init__(self, matches: List[Dict[str, Any]], ctx: commands.Context, title: str, footer: str):
+        super().__init__(timeout=180) # 3分鐘無操作後按鈕失效
+        self.matches = matches
+        self.ctx = ctx
+        self.title = title
+        self.footer = footer
+        self.total_pages = max(1, -(-len(matches) // SCREEN_PAGE_SIZE))
+        self.current_page = 1
+        self.update_buttons()
+
+    def update_buttons(self):
+        """根據當前頁碼啟用/禁用按鈕"""
+        self.children[0].disabled = self.current_page <= 1
+        self.children[1].disabled = self.current_page >= self.total_pages
+
+    def current_embed(self) -> discord.Embed:
+        return _create_screen_embed(self.matches, self.current_page, self.total_pages, self.title, self.footer)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """只允許最初發起指令的使用者操作"""
+        if interaction.user != self.ctx.author:
+            await interaction.response.send_message("只有發起指令的人可以翻頁。", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="上一頁", style=discord.ButtonStyle.blurple, emoji="◀️")
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.current_page > 1:
+            self.current_page -= 1
+            self.update_buttons()
+            await interaction.response.edit_message(embed=self.current_embed(), view=self)
+
+    @discord.ui.button(label="下一頁", style=discord.ButtonStyle.blurple, emoji="▶️")
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.current_page < self.total_pages:
+            self.current_page += 1
+            self.update_buttons()
+            await interaction.response.edit_message(embed=self.current_embed(), view=self)
 
 
 # =========================================================
@@ -268,6 +393,21 @@ class StockMonitor(Cog_Extension):
         else:
             logging.warning("STOCK_MONITOR_ROLE_ID 未設定或格式錯誤，通知將不會 @身分組。")
 
+        # --- 盤中監測狀態 ---
+        self.intraday_interval = STOCK_INTRADAY_INTERVAL if STOCK_INTRADAY_INTERVAL in INTRADAY_INTERVAL_SECONDS else None
+        self._intraday_states: Dict[str, IncrementalIndicators] = {} # 每支股票的增量指標狀態
+        self._intraday_names: Dict[str, str] = {}
+        self._intraday_sent: Dict[str, Tuple[str, Set[str]]] = {} # 股票 -> (交易日, 已通知的訊號標題)
+
+        # --- 價格到價提醒 ---
+        self.price_alerts = PriceAlertIndex()
+
+        # --- 每日報告排程：交易所代碼 -> 最後一次已報告 / 已預抓的交易日 (已報告的存檔，重新載入後不重複發送) ---
+        self._reported: Dict[str, date] = _load_report_state()
+        self._prefetched: Dict[str, date] = {}
+        self._prefetch_tasks: Dict[str, asyncio.Task] = {}
+        self._stock_names: Dict[str, str] = {} # 預抓時記下的股票名稱 (補抓失敗時沿用)
+
         # 
         # ✅ 修正 1：移除 __init__ 中的 .start()
         #
@@ -287,83 +427,316 @@ class StockMonitor(Cog_Extension):
         if not self.daily_stock_check.is_running():
             if self.notification_channel_id:
                 self.daily_stock_check.start()
-                logging.info(f"股票監測任務已在 on_ready 中啟動，預計每天 {CHECK_TIME_TW.isoformat()} (時區: {CHECK_TIME_TW.tzinfo}) 執行。")
+                logging.info(f"股票監測任務已在 on_ready 中啟動，各市場於收盤 {int(REPORT_DELAY.total_seconds() // 60)} 分鐘後執行 (休市日跳過)。")
+
+        if self.intraday_interval and self.notification_channel_id and not self.intraday_poll.is_running():
+            self._start_intraday(self.intraday_interval)
 
     def cog_unload(self):
         self.daily_stock_check.cancel()
+        self.intraday_poll.cancel()
+        for task in self._prefetch_tasks.values():
+            task.cancel()
+
+    async def _send_embeds(self, channel, content: str, embeds: List[discord.Embed]):
+        """逐則發送拆分後的 Embed (Discord 單則訊息所有 Embed 合計也不能超過 6000 字)，只有第一則帶提及"""
+        for i, embed in enumerate(embeds):
+            await channel.send(content=content if i == 0 else None, embed=embed)
+
+    # =========================================================
+    # 盤中監測模式：交易時段內每分鐘 (或每 5 分鐘) 增量更新
+    # =========================================================
+
+    def _start_intraday(self, interval: str):
+        """以指定的 K 棒週期啟動 (或重新啟動) 盤中輪詢"""
+        if self.intraday_interval != interval:
+            # 週期改變時，舊的指標狀態已不適用
+            self._intraday_states.clear()
+        self.intraday_interval = interval
+        self.intraday_poll.change_interval(seconds=INTRADAY_INTERVAL_SECONDS[interval])
+        if self.intraday_poll.is_running():
+            self.intraday_poll.restart()
+        else:
+            self.intraday_poll.start()
+        logging.info(f"盤中監測模式已啟動 (K 棒週期: {interval})。")
+
+    def _intraday_update(self, stock_id: str, now_ts: int, analyze: bool = True) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+        """
+        抓取單一股票自上次以來的新 K 棒並逐根更新指標 (在獨立線程中執行)。
+        只處理已收完的 K 棒，回傳 (最新一根觸發的訊號, 最新收盤價)。
+        analyze=False 時只更新價格 (供價格提醒使用，不評估訊號規則)。
+        """
+        interval = self.intraday_interval
+        bar_seconds = INTRADAY_INTERVAL_SECONDS[interval]
+        rules = load_rules()
+        specs = rules.indicators()
+        state = self._intraday_states.get(stock_id)
+
+        depth = rules.lookback + 1
+
+        # 第一次輪詢，或規則檔新增了狀態中沒有的指標 / 需要更多前幾根 K 棒時，重新建立狀態
+        if state is None or not specs <= state.specs() or state.depth < depth:
+            bars, stock_name = _fetch_stock_data(stock_id, range_=INTRADAY_SEED_RANGE, interval_=interval)
+            state = IncrementalIndicators(specs, depth=depth)
+        else:
+            bars, stock_name = _fetch_stock_data(stock_id, interval_=interval, period1=state.last_ts + 1)
+
+        if bars is None or len(bars.ts) == 0:
+            return [], None
+        self._intraday_names[stock_id] = stock_name
+
+        updated = False
+        for ts, o, h, l, c, v in zip(*(col.tolist() for col in bars)):
+            if state.last_ts is not None and ts <= state.last_ts:
+                continue
+            if ts + bar_seconds > now_ts:
+                break # 尚未收完的 K 棒，留待下次輪詢
+            state.update(ts, o, h, l, c, v)
+            updated = True
+
+        self._intraday_states[stock_id] = state
+        if not updated:
+            return [], None
+        columns = state.columns()
+        price = float(columns['close'][-1])
+        if not analyze:
+            return [], price
+        result = rules.evaluate(columns, cache=state.indicators())
+        return _signals_from_result(stock_id, stock_name, result, timeframe=None), price
+
+    def _dedupe_intraday(self, stock_id: str, signals: List[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+        """同一交易日內，同一股票的同一種訊號只通知一次"""
+        session_day = local_date(exchange_for(stock_id), now).isoformat()
+        day, sent = self._intraday_sent.get(stock_id, (session_day, set()))
+        if day != session_day:
+            sent = set()
+
+        fresh = [sig for sig in signals if sig['title'] not in sent]
+        sent.update(sig['title'] for sig in fresh)
+        self._intraday_sent[stock_id] = (session_day, sent)
+        return fresh
+
+    async def _dispatch_price_alerts(self, prices: Dict[str, float], channel):
+        """評估價格提醒，並為每位使用者彙整成一則訊息發送"""
+        fired = self.price_alerts.evaluate_many(prices)
+        for user_id, items in fired.items():
+            lines = [
+                f"• `{alert['symbol']}` {'向上突破' if alert['direction'] == ABOVE else '向下跌破'} "
+                f"**{alert['threshold']:g}** (現價 {price:.2f})"
+                for alert, price in items
+            ]
+            shown = lines[:30] # 避免超過 Discord 單則訊息 2000 字的限制
+            if len(lines) > len(shown):
+                shown.append(f"...還有 {len(lines) - len(shown)} 則提醒")
+            try:
+                await channel.send(f"🔔 <@{user_id}> 價格提醒觸發 **{len(items)}** 則：\n" + "\n".join(shown))
+            except Exception as e:
+                logging.error(f"發送價格提醒給使用者 {user_id} 失敗: {e}")
+        if fired:
+            logging.info(f"已發送 {sum(len(v) for v in fired.values())} 則價格提醒給 {len(fired)} 位使用者。")
+
+    @tasks.loop(seconds=60)
+    async def intraday_poll(self):
+        now = datetime.now(timezone.utc)
+        watchlist = set(_load_stock_list())
+        # 有價格提醒的股票即使不在清單中也一併輪詢 (只更新價格，不分析訊號)
+        stock_list = [s for s in sorted(watchlist | set(self.price_alerts.symbols())) if is_open(exchange_for(s), now)]
+        if not stock_list:
+            return
+
+        target_channel = self.bot.get_channel(self.notification_channel_id)
+        if not target_channel:
+            return
+
+        now_ts = int(now.timestamp())
+        semaphore = asyncio.Semaphore(INTRADAY_CONCURRENCY)
+
+        prices: Dict[str, float] = {}
+
+        async def poll(stock_id: str):
+            async with semaphore:
+                try:
+                    signals, price = await asyncio.to_thread(self._intraday_update, stock_id, now_ts, stock_id in watchlist)
+                except Exception as e:
+                    logging.error(f"[盤中] 更新 {stock_id} 失敗: {e}")
+                    return []
+                if price is not None:
+                    prices[stock_id] = price
+                return self._dedupe_intraday(stock_id, signals, now)
+
+        results = await asyncio.gather(*(poll(s) for s in stock_list))
+        await self._dispatch_price_alerts(prices, target_channel)
+
+        new_signals = [sig for signals in results for sig in signals]
+        if not new_signals:
+            return
+
+        embeds = _split_signal_embeds(
+            f"⏱️ 盤中訊號 ({now.astimezone(TAIWAN_TZ).strftime('%H:%M')})",
+            f"K 棒週期 **{self.intraday_interval}**，新發現 **{len(new_signals)}** 個訊號。",
+            new_signals
+        )
+        embeds[-1].timestamp = now
+
+        content = f"⏱️ {self.role_mention_tag} 盤中發現 **{len(new_signals)}** 個股票訊號！" if self.role_mention_tag else "⏱️ 盤中發現股票訊號！"
+        await self._send_embeds(target_channel, content, embeds)
+        logging.info(f"[盤中] 發送 {len(new_signals)} 個新訊號。")
         
-    # --- 定時任務：每天 13:45 檢查 ---
-    @tasks.loop(time=CHECK_TIME_TW)
+    # --- 定時任務：各市場收盤後檢查 (依交易所行事曆) ---
+    @tasks.loop(minutes=1)
     async def daily_stock_check(self):
         #
         # ✅ 修正 3：移除 wait_until_ready()
         #
-        
-        # (修正點 5：使用帶有時區的 "now" 來檢查星期)
-        now_in_taiwan = datetime.now(TAIWAN_TZ)
-        today = now_in_taiwan.weekday()
-        
-        if today >= 5: # 5: 星期六, 6: 星期日
-            logging.info(f"本日 ({now_in_taiwan.strftime('%A')}) 為週末，跳過股票定時檢查任務。")
+        now = datetime.now(timezone.utc)
+        for exchange in EXCHANGES.values():
+            day = local_date(exchange, now)
+            due = _report_time(exchange, day)
+            if due is None:
+                continue # 休市日
+
+            # 第一階段：報告時間前在背景預抓資料，不阻塞排程
+            if due - PREFETCH_LEAD <= now < due and self._prefetched.get(exchange.code) != day:
+                self._prefetched[exchange.code] = day
+                task = asyncio.create_task(self._prefetch_group(exchange, day))
+                task.add_done_callback(lambda t, name=exchange.name: self._log_prefetch_result(name, t))
+                self._prefetch_tasks[exchange.code] = task
+
+            # 第二階段：報告時間到，補抓最後一根後發送
+            if self._reported.get(exchange.code) == day or not (due <= now < due + REPORT_WINDOW):
+                continue
+            # 先標記再發送，避免報告執行超過一輪排程時重複進入
+            self._reported[exchange.code] = day
+            await asyncio.to_thread(_save_report_state, dict(self._reported))
+            try:
+                await self._run_daily_report(exchange, day)
+            except Exception as e:
+                # 單一市場失敗不應讓排程任務停止；清除標記，讓下一輪在報告時段內重試
+                logging.error(f"{exchange.name}每日檢查失敗: {e}")
+                if self._reported.get(exchange.code) == day:
+                    del self._reported[exchange.code]
+                    await asyncio.to_thread(_save_report_state, dict(self._reported))
+
+    @staticmethod
+    def _log_prefetch_result(exchange_name: str, task: asyncio.Task):
+        """預抓在背景執行，失敗時在這裡取出例外並記錄 (發送階段可能不會等待它)"""
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"{exchange_name}預抓失敗: {task.exception()}")
+
+    def _report_symbols(self, exchange: Exchange) -> Tuple[List[str], List[str]]:
+        """該市場的 (觀察清單, 只有價格提醒的股票)"""
+        stock_list = [s for s in _load_stock_list() if exchange_for(s) is exchange]
+        alert_symbols = [s for s in self.price_alerts.symbols() if exchange_for(s) is exchange and s not in stock_list]
+        return stock_list, alert_symbols
+
+    async def _refresh_many(self, symbols: List[str]) -> Dict[str, Tuple[Optional[Bars], str]]:
+        """以有限的並行數更新多支股票的日線快取"""
+        semaphore = asyncio.Semaphore(REPORT_CONCURRENCY)
+
+        async def refresh(stock_id: str):
+            async with semaphore:
+                try:
+                    bars, stock_name = await asyncio.to_thread(_refresh_history, stock_id)
+                except Exception as e:
+                    logging.error(f"更新 {stock_id} 歷史資料失敗: {e}")
+                    return stock_id, (None, stock_id)
+                if stock_name != stock_id:
+                    self._stock_names[stock_id] = stock_name
+                return stock_id, (bars, self._stock_names.get(stock_id, stock_name))
+
+        return dict(await asyncio.gather(*(refresh(s) for s in symbols)))
+
+    async def _prefetch_group(self, exchange: Exchange, session_day: date):
+        """
+        預抓階段：在報告時間前把各股的日線快取更新到最新 (新股票會回補完整歷史)，
+        讓發送階段只需要補抓收盤後的最後一根。台股上市股票已有快取者交給證交所快照，不需預抓。
+        """
+        stock_list, alert_symbols = self._report_symbols(exchange)
+        symbols = []
+        for stock_id in stock_list + alert_symbols:
+            if exchange.code == 'TWSE' and is_twse_symbol(stock_id):
+                cached = await asyncio.to_thread(load_history, stock_id)
+                if cached is not None and len(cached.ts):
+                    continue
+            symbols.append(stock_id)
+        if not symbols:
             return
-        
-        stock_list = _load_stock_list()
+
+        started = datetime.now()
+        await self._refresh_many(symbols)
+        logging.info(f"{exchange.name}預抓完成：{len(symbols)} 支股票，耗時 {(datetime.now() - started).total_seconds():.1f} 秒。")
+
+    async def _run_daily_report(self, exchange: Exchange, session_day: date):
+        """
+        發送階段：檢查單一市場的觀察清單並發送報告 (只會在該市場的交易日收盤後呼叫)。
+        日線快取已由預抓階段暖機，這裡只補抓最後一根並評估規則。
+        """
+        pending = self._prefetch_tasks.pop(exchange.code, None)
+        if pending is not None and not pending.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(pending), timeout=PREFETCH_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                logging.warning(f"{exchange.name}預抓尚未完成，直接進入發送階段。")
+            except Exception:
+                pass # 已由 _log_prefetch_result 記錄
+
+        stock_list, alert_symbols = self._report_symbols(exchange)
         target_channel = self.bot.get_channel(self.notification_channel_id)
 
-        if not stock_list or not target_channel:
-             logging.warning("股票清單為空或頻道不存在，定時檢查任務跳過。")
+        # 0. 台股先以證交所全市場快照一次更新 (.TW 與全市場矩陣)，Yahoo 只用於其他代碼
+        data: Dict[str, Tuple[Optional[Bars], str]] = {}
+        if exchange.code == 'TWSE':
+            data.update(await asyncio.to_thread(_load_twse_histories, stock_list + alert_symbols, session_day))
+            logging.info(f"證交所快照提供 {len(data)} / {len(stock_list) + len(alert_symbols)} 支股票的資料。")
+
+        if (not stock_list and not alert_symbols) or not target_channel:
+             logging.info(f"{exchange.name}沒有需要檢查的股票或頻道不存在，定時檢查任務跳過。")
              return
 
-        # 這裡的日誌現在一定會在 13:45 (台灣時間) 觸發
-        logging.info(f"開始執行 {len(stock_list)} 支股票的定時檢查...")
+        logging.info(f"開始執行{exchange.name} {len(stock_list)} 支股票的定時檢查 (交易日 {session_day})...")
         
+        # 1. 其餘股票只補抓快取最後一根之後的資料 (增量)
+        data.update(await self._refresh_many([s for s in stock_list + alert_symbols if s not in data]))
+
         all_signals = [] # 儲存所有股票的訊號
-        
-        # 1. 批次抓取並分析
-        for stock_id in stock_list:
-            # 在獨立線程中執行耗時的 I/O 操作 (網路請求和 Pandas 計算)
-            # 更新：同時接收 stock_name
-            df, stock_name = await asyncio.to_thread(_fetch_stock_data, stock_id)
-            
-            if df is not None:
-                # 更新：傳入 stock_name
-                signals = await asyncio.to_thread(_analyze_signals, stock_id, stock_name, df, PROXIMITY_THRESHOLD)
-                
-                if signals:
-                    all_signals.extend(signals) # 直接 extend signals 列表
-            
-            # 暫停 1 秒，避免 API 頻率限制
-            await asyncio.sleep(1) 
+        prices: Dict[str, float] = {} # 最新收盤價 (供價格提醒使用)
+        rules = load_rules()
+        timeframes = _closing_timeframes(exchange, session_day)
+
+        # 2. 分析 (指標在快取陣列上向量化計算，每支股票只需數毫秒)
+        for stock_id in stock_list + alert_symbols:
+            bars, stock_name = data.get(stock_id, (None, stock_id))
+            if bars is None or len(bars.ts) == 0:
+                continue
+            # 最新一根不是本交易日 (例如行事曆未列入的臨時休市)，不要拿舊資料發出訊號
+            if _bar_date(bars.ts[-1]) != session_day:
+                logging.warning(f"[{stock_id}] 最新資料日期不是 {session_day}，跳過分析。")
+                continue
+            prices[stock_id] = float(bars.close[-1])
+            if stock_id in stock_list:
+                signals = await asyncio.to_thread(_analyze_signals, stock_id, stock_name, bars, rules, timeframes)
+                all_signals.extend(signals) # 直接 extend signals 列表
+
+        await self._dispatch_price_alerts(prices, target_channel)
 
-        # 2. 統整並發送通知
+        # 3. 統整並發送通知 (超過 25 個訊號時拆成多個 Embed)
         if all_signals:
-            
-            embed_title = f"📢 每日股票訊號報告 ({now_in_taiwan.strftime('%Y-%m-%d')})"
-            embed = discord.Embed(
-                title=embed_title,
-                description=f"總共發現 **{len(all_signals)}** 個技術訊號。",
-                color=discord.Color.blue()
+            embeds = _split_signal_embeds(
+                f"📢 {exchange.name}每日股票訊號報告 ({session_day.isoformat()})",
+                f"總共發現 **{len(all_signals)}** 個技術訊號。",
+                all_signals,
+                footer=f"分析基準: {' / '.join(dict.fromkeys(r.type for r in rules.rules))} · 週期: {' / '.join(TIMEFRAME_LABELS[tf] for tf in timeframes)}"
             )
-            
-            for signal in all_signals:
-                embed.add_field(
-                    name=signal['title'], # 標題已包含名稱
-                    value=signal['detail'],
-                    inline=False
-                )
-            
-            # 設置底部資訊和時間戳
-            embed.set_footer(text=f"分析基準: MA20 / RSI(14) / 爆量(>2.5倍)")
-            embed.timestamp = now_in_taiwan
+            embeds[-1].timestamp = datetime.now(TAIWAN_TZ)
             
             content = f"📢 {self.role_mention_tag} 發現 **{len(all_signals)}** 個股票訊號！" if self.role_mention_tag else "📢 發現股票訊號！"
-            await target_channel.send(content=content, embed=embed)
-            logging.info(f"成功發送 {len(all_signals)} 個股票訊號通知。")
+            await self._send_embeds(target_channel, content, embeds)
+            logging.info(f"成功發送 {len(all_signals)} 個股票訊號通知 ({len(embeds)} 則)。")
             
         else:
-            logging.info("所有監測股票均未發現新訊號。")
+            logging.info(f"{exchange.name}所有監測股票均未發現新訊號。")
             
-        logging.info("股票定時檢查任務結束。")
+        logging.info(f"{exchange.name}定時檢查任務結束。")
 
     # =========================================================
     # 指令群組：管理股票清單 (保持不變)
@@ -379,6 +752,11 @@ class StockMonitor(Cog_Extension):
             embed.add_field(name=f"3. 查看清單", value=f"`{ctx.prefix}stock list`", inline=False)
             embed.add_field(name=f"4. 手動檢查", value=f"`{ctx.prefix}stock check [代碼(選填)]`", inline=False)
             embed.add_field(name=f"5. 即時報價", value=f"`{ctx.prefix}stock price <代碼>`", inline=False)
+            embed.add_field(name=f"6. 盤中監測", value=f"`{ctx.prefix}stock intraday [1m|5m|off]`", inline=False)
+            embed.add_field(name=f"7. 訊號回測", value=f"`{ctx.prefix}stock backtest [前瞻天數]`", inline=False)
+            embed.add_field(name=f"8. 價格提醒", value=f"`{ctx.prefix}stock alert <代碼> <價格>` / `{ctx.prefix}stock alerts` / `{ctx.prefix}stock unalert <編號>`", inline=False)
+            embed.add_field(name=f"9. 臨時休市", value=f"`{ctx.prefix}stock closed <TW|US> [YYYY-MM-DD]` (颱風假等)", inline=False)
+            embed.add_field(name=f"10. 全市場選股", value=f"`{ctx.prefix}stock screen [規則代碼]` / `{ctx.prefix}stock backfill [天數]`", inline=False)
             await ctx.send(embed=embed, ephemeral=is_private)
     
     @stock.command(name='add', aliases=['新增'], description="新增股票代碼到監測清單")
@@ -392,9 +770,9 @@ class StockMonitor(Cog_Extension):
             
         # 檢查代碼是否有效 (嘗試抓取一筆數據)
         msg = await ctx.send(f"🔎 正在驗證 `{stock_id}` 代碼...", ephemeral=is_private)
-        df, stock_name = await asyncio.to_thread(_fetch_stock_data, stock_id, range_='5d')
+        bars, stock_name = await asyncio.to_thread(_fetch_stock_data, stock_id, range_='5d')
         
-        if df is None or df.empty:
+        if bars is None or len(bars.ts) == 0:
             error_msg = f"❌ 股票代碼 `{stock_id}` 無效或找不到資料。"
             if is_private: await ctx.followup.send(error_msg, ephemeral=True)
             else: await msg.edit(content=error_msg)
@@ -431,10 +809,14 @@ class StockMonitor(Cog_Extension):
             return await ctx.send("目前監測清單為空。", ephemeral=is_private)
 
         stock_str = "\n".join([f"• `{s}`" for s in stock_list])
+        schedule = "、".join(
+            f"{ex.name} **{(datetime.combine(date.today(), ex.close) + REPORT_DELAY).strftime('%H:%M')}** ({ex.tz.key})"
+            for ex in EXCHANGES.values()
+        )
         
         embed = discord.Embed(
             title="📋 當前股票監測清單",
-            description=f"總計 **{len(stock_list)}** 支股票。定時檢查時間：台灣時間 **{CHECK_TIME_TW.strftime('%H:%M')}**。",
+            description=f"總計 **{len(stock_list)}** 支股票。定時檢查時間 (收盤後，休市日跳過)：{schedule}。",
             color=discord.Color.blue()
         )
         embed.add_field(name="監測代碼列表", value=stock_str, inline=False)
@@ -470,14 +852,15 @@ class StockMonitor(Cog_Extension):
         msg = await ctx.send(f"🔎 正在手動檢查 **{len(target_list)}** 支股票的最新訊號...", ephemeral=is_private)
         
         all_signals = [] 
+        rules = load_rules()
         
         for s_id in target_list:
             # 更新：解包名稱
-            df, stock_name = await asyncio.to_thread(_fetch_stock_data, s_id)
+            bars, stock_name = await asyncio.to_thread(_fetch_stock_data, s_id)
             
-            if df is not None:
+            if bars is not None:
                 # 更新：傳入名稱
-                signals = await asyncio.to_thread(_analyze_signals, s_id, stock_name, df, PROXIMITY_THRESHOLD)
+                signals = await asyncio.to_thread(_analyze_signals, s_id, stock_name, bars, rules)
                 
                 if signals:
                     all_signals.extend(signals)
@@ -490,23 +873,17 @@ class StockMonitor(Cog_Extension):
         
         if all_signals:
             embed_title = f"🔔 手動檢查報告：發現 {len(all_signals)} 個訊號"
-            embed = discord.Embed(
-                title=embed_title,
-                description=f"檢查時間：{now_in_taiwan.strftime('%Y-%m-%d %H:%M:%S')}",
+            embeds = _split_signal_embeds(
+                embed_title,
+                f"檢查時間：{now_in_taiwan.strftime('%Y-%m-%d %H:%M:%S')}",
+                all_signals,
                 color=discord.Color.red() if any(s['type'] == '穿越' for s in all_signals) else discord.Color.blue()
             )
             
-            for signal in all_signals:
-                embed.add_field(
-                    name=signal['title'],
-                    value=signal['detail'],
-                    inline=False
-                )
-            
             content = f"📢 {self.role_mention_tag} 發現 **{len(all_signals)}** 個股票訊號！" if self.role_mention_tag else "📢 發現股票訊號！"
             
             # 發送到通知頻道 (公開)
-            await target_channel.send(content=content, embed=embed)
+            await self._send_embeds(target_channel, content, embeds)
             reply_content = f"✅ 手動檢查完成，已將報告發送至通知頻道。"
             
         else:
@@ -515,6 +892,234 @@ class StockMonitor(Cog_Extension):
         if is_private: await ctx.followup.send(reply_content, ephemeral=True)
         else: await msg.edit(content=reply_content)
 
+    @stock.command(name='intraday', aliases=['盤中'], description="[僅限管理員] 開啟/關閉盤中監測模式 (1m / 5m / off)")
+    @commands.has_permissions(administrator=True)
+    async def stock_intraday(self, ctx: commands.Context, mode: Optional[str] = None):
+        is_private = ctx.interaction is not None
+
+        if mode is None:
+            status = f"運行中 (K 棒週期 **{self.intraday_interval}**)" if self.intraday_poll.is_running() else "未啟用"
+            return await ctx.send(f"⏱️ 盤中監測模式：{status}，追蹤中 **{len(self._intraday_states)}** 支股票。", ephemeral=is_private)
+
+        mode = mode.lower()
+        if mode == 'off':
+            self.intraday_poll.cancel()
+            self._intraday_states.clear()
+            return await ctx.send("✅ 已關閉盤中監測模式。", ephemeral=is_private)
+
+        if mode not in INTRADAY_INTERVAL_SECONDS:
+            return await ctx.send("⚠️ 模式必須是 `1m`、`5m` 或 `off`。", ephemeral=True)
+        if not self.notification_channel_id:
+            return await ctx.send("❌ 錯誤：通知頻道未設定或無效。", ephemeral=True)
+
+        self._start_intraday(mode)
+        await ctx.send(f"✅ 已啟動盤中監測模式 (K 棒週期 **{mode}**)。", ephemeral=is_private)
+
+    @stock.command(name='closed', aliases=['休市'], description="[僅限管理員] 登記臨時休市日 (例如颱風假)，當天不抓取也不發報告")
+    @commands.has_permissions(administrator=True)
+    async def stock_closed(self, ctx: commands.Context, market: str, day: Optional[str] = None):
+        is_private = ctx.interaction is not None
+        code = MARKET_ALIASES.get(market.upper(), market.upper())
+        exchange = EXCHANGES.get(code)
+        if exchange is None:
+            return await ctx.send(f"⚠️ 市場必須是 {' / '.join(MARKET_ALIASES)}。", ephemeral=True)
+
+        try:
+            closed_day = date.fromisoformat(day) if day else local_date(exchange, datetime.now(timezone.utc))
+        except ValueError:
+            return await ctx.send("⚠️ 日期格式必須是 `YYYY-MM-DD`。", ephemeral=True)
+
+        if not add_closure(exchange.code, closed_day):
+            return await ctx.send(f"⚠️ {exchange.name} {closed_day} 已經是休市日。", ephemeral=is_private)
+        await ctx.send(f"✅ 已將 {closed_day} 登記為{exchange.name}休市日，當天不會執行檢查。", ephemeral=is_private)
+
+    @stock.command(name='screen', aliases=['選股'], description="以訊號規則掃描全部上市股票 (最新交易日)")
+    async def stock_screen(self, ctx: commands.Context, rule_id: Optional[str] = None):
+        is_private = ctx.interaction is not None
+        rules = load_rules()
+        rule_ids = None
+        if rule_id:
+            if rule_id not in {r.id for r in rules.rules}:
+                available = ", ".join(f"`{r.id}`" for r in rules.rules)
+                return await ctx.send(f"⚠️ 找不到規則 `{rule_id}`。可用的規則：{available}", ephemeral=True)
+            rule_ids = [rule_id]
+
+        panel = await asyncio.to_thread(load_panel, 'TWSE')
+        if len(panel.ts) < SCREEN_MIN_DAYS:
+            return await ctx.send(
+                f"⚠️ 全市場資料只有 **{len(panel.ts)}** 個交易日 (至少需要 {SCREEN_MIN_DAYS} 日)。"
+                f"請管理員先執行 `{ctx.prefix}stock backfill`。", ephemeral=is_private
+            )
+
+        started = datetime.now()
+        matches = await asyncio.to_thread(screen, panel, rules, rule_ids)
+        elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+
+        latest = datetime.fromtimestamp(int(panel.ts[-1]), timezone.utc).date()
+        title = f"🔍 全市場選股 ({latest.isoformat()})" + (f"：{rule_id}" if rule_id else "")
+        footer = f"掃描 {len(panel.symbols):,} 檔 x {len(panel.ts)} 日，耗時 {elapsed_ms:.0f} ms"
+        if not matches:
+            return await ctx.send(f"✅ {latest} 沒有任何上市股票符合條件。({footer})", ephemeral=is_private)
+
+        view = ScreenView(matches, ctx, title, footer)
+        await ctx.send(embed=view.current_embed(), view=view, ephemeral=is_private)
+
+    @stock.command(name='backfill', aliases=['回補'], description="[僅限管理員] 回補全市場收盤行情 (供全市場選股使用)")
+    @commands.has_permissions(administrator=True)
+    async def stock_backfill(self, ctx: commands.Context, days: int = 60):
+        is_private = ctx.interaction is not None
+        if not 1 <= days <= 250:
+            return await ctx.send("⚠️ 天數必須介於 1 到 250 之間。", ephemeral=True)
+
+        exchange = EXCHANGES['TWSE']
+        panel = await asyncio.to_thread(load_panel, 'TWSE')
+        have = set(panel.ts.tolist())
+
+        # 由今天往前找出最近 days 個交易日中尚未收錄的日期 (依交易所行事曆，不會對休市日發出請求)
+        now = datetime.now(timezone.utc)
+        day = local_date(exchange, now)
+        due = _report_time(exchange, day)
+        if due is None or now < due:
+            day -= timedelta(days=1) # 今天尚未收盤
+        missing = []
+        for _ in range(days * 2 + 30):
+            if days <= 0:
+                break
+            if is_trading_day(exchange, day):
+                days -= 1
+                day_ts = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+                if day_ts not in have:
+                    missing.append(day)
+            day -= timedelta(days=1)
+
+        if not missing:
+            return await ctx.send("✅ 全市場資料已包含指定區間內的所有交易日。", ephemeral=is_private)
+
+        msg = await ctx.send(f"⏳ 正在回補 **{len(missing)}** 個交易日的證交所收盤行情...", ephemeral=is_private)
+        done = 0
+        for i, target_day in enumerate(missing, 1):
+            snapshot = await asyncio.to_thread(fetch_snapshot, target_day)
+            if snapshot is not None:
+                await asyncio.to_thread(update_panel, 'TWSE', snapshot)
+                done += 1
+            if i % 10 == 0 and not is_private:
+                await msg.edit(content=f"⏳ 回補進度 {i} / {len(missing)}...")
+            await asyncio.sleep(BACKFILL_REQUEST_DELAY)
+
+        result_msg = f"✅ 回補完成：成功取得 {done} / {len(missing)} 個交易日的收盤行情。"
+        if is_private: await ctx.followup.send(result_msg, ephemeral=True)
+        else: await msg.edit(content=result_msg)
+
+    @stock.command(name='backtest', aliases=['回測'], description="以歷史日線回測監測清單的訊號規則")
+    async def stock_backtest(self, ctx: commands.Context, horizon: int = 5):
+        is_private = ctx.interaction is not None
+        stock_list = _load_stock_list()
+
+        if not stock_list:
+            return await ctx.send("目前監測清單為空。", ephemeral=is_private)
+        if horizon not in FORWARD_HORIZONS:
+            return await ctx.send(f"⚠️ 前瞻天數必須是 {', '.join(str(h) for h in FORWARD_HORIZONS)} 其中之一。", ephemeral=True)
+
+        msg = await ctx.send(f"🔎 正在更新 **{len(stock_list)}** 支股票的歷史資料並回測...", ephemeral=is_private)
+
+        histories = {}
+        for s_id in stock_list:
+            bars, _ = await asyncio.to_thread(_refresh_history, s_id)
+            if bars is not None and len(bars.ts) >= 20:
+                histories[s_id] = bars
+            await asyncio.sleep(1) # 暫停 1 秒，避免 API 頻率限制
+
+        if not histories:
+            error_msg = "❌ 沒有足夠的歷史資料可供回測。"
+            if is_private: return await ctx.followup.send(error_msg, ephemeral=True)
+            else: return await msg.edit(content=error_msg)
+
+        rules = load_rules()
+        stats = await asyncio.to_thread(run_backtest, histories, rules)
+
+        total_bars = sum(len(b.ts) for b in histories.values())
+        embed = discord.Embed(
+            title=f"🧪 訊號回測報告 (前瞻 {horizon} 日)",
+            description=f"回測 **{len(histories)}** 支股票，共 **{total_bars:,}** 根日 K。",
+            color=discord.Color.blue()
+        )
+        for entry in stats.values():
+            result = entry['horizons'][horizon]
+            if result['n'] == 0:
+                value = "無觸發紀錄"
+            else:
+                hit_label = "上漲機率" if entry['direction'] == 0 else "命中率"
+                value = (
+                    f"觸發 **{entry['count']:,}** 次\n"
+                    f"{hit_label}: **{result['hit_rate'] * 100:.1f}%**\n"
+                    f"平均報酬: {result['mean'] * 100:+.2f}% (中位數 {result['median'] * 100:+.2f}%)"
+                )
+            embed.add_field(name=entry['title'], value=value, inline=True)
+
+        embed.set_footer(text=f"規則參數: {', '.join(f'{k}={v:g}' for k, v in rules.params.items())}")
+        embed.timestamp = datetime.now(TAIWAN_TZ)
+
+        if is_private: await ctx.followup.send(embed=embed, ephemeral=True)
+        else: await msg.edit(content=None, embed=embed)
+
+    # --- 價格到價提醒 ---
+    @stock.command(name='alert', aliases=['提醒'], description="設定價格提醒 (突破或跌破指定價格時通知)")
+    async def stock_alert(self, ctx: commands.Context, stock_id: str, price: float):
+        is_private = ctx.interaction is not None
+        stock_id = stock_id.upper()
+
+        if price <= 0:
+            return await ctx.send("⚠️ 價格必須大於 0。", ephemeral=True)
+
+        msg = await ctx.send(f"🔎 正在查詢 `{stock_id}` 目前價格...", ephemeral=is_private)
+        bars, stock_name = await asyncio.to_thread(_fetch_stock_data, stock_id, range_='5d')
+
+        if bars is None or len(bars.ts) == 0:
+            error_msg = f"❌ 股票代碼 `{stock_id}` 無效或找不到資料。"
+            if is_private: return await ctx.followup.send(error_msg, ephemeral=True)
+            else: return await msg.edit(content=error_msg)
+
+        current = float(bars.close[-1])
+        # 先以現價評估既有提醒 (上一次輪詢之後可能已穿越門檻)，新提醒的方向才會與索引中的最後價格一致
+        target_channel = self.bot.get_channel(self.notification_channel_id) or ctx.channel
+        await self._dispatch_price_alerts({stock_id: current}, target_channel)
+        alert = self.price_alerts.add(ctx.author.id, stock_id, price, current_price=current)
+        direction = "向上突破" if alert['direction'] == ABOVE else "向下跌破"
+
+        success_msg = f"✅ 已設定提醒 #{alert['id']}：`{stock_id}` ({stock_name}) {direction} **{price:g}** 時通知您 (現價 {current:.2f})。"
+        if is_private: await ctx.followup.send(success_msg, ephemeral=True)
+        else: await msg.edit(content=success_msg)
+
+    @stock.command(name='alerts', aliases=['我的提醒'], description="查看自己設定的價格提醒")
+    async def stock_alerts(self, ctx: commands.Context):
+        is_private = ctx.interaction is not None
+        alerts = self.price_alerts.user_alerts(ctx.author.id)
+
+        if not alerts:
+            return await ctx.send("您目前沒有設定任何價格提醒。", ephemeral=is_private)
+
+        lines = [
+            f"`#{a['id']}` `{a['symbol']}` {'向上突破' if a['direction'] == ABOVE else '向下跌破'} **{a['threshold']:g}**"
+            for a in alerts
+        ]
+        embed = discord.Embed(
+            title="🔔 我的價格提醒",
+            description="\n".join(lines[:40]),
+            color=discord.Color.blue()
+        )
+        if len(lines) > 40:
+            embed.set_footer(text=f"...還有 {len(lines) - 40} 則提醒")
+        await ctx.send(embed=embed, ephemeral=is_private)
+
+    @stock.command(name='unalert', aliases=['取消提醒'], description="刪除指定編號的價格提醒")
+    async def stock_unalert(self, ctx: commands.Context, alert_id: int):
+        is_private = ctx.interaction is not None
+        alert = self.price_alerts.remove(alert_id, user_id=ctx.author.id)
+
+        if not alert:
+            return await ctx.send(f"⚠️ 找不到您的提醒 `#{alert_id}`。", ephemeral=True)
+        await ctx.send(f"✅ 已刪除提醒 #{alert_id} (`{alert['symbol']}` {alert['threshold']:g})。", ephemeral=is_private)
+
     # --- 新增功能：即時報價 ---
     @stock.command(name='price', aliases=['報價', '查詢'], description="查詢股票即時報價、MA20 與 RSI")
     async def stock_price(self, ctx: commands.Context, stock_id: str):
@@ -522,26 +1127,31 @@ class StockMonitor(Cog_Extension):
         is_private = ctx.interaction is not None
         stock_id = stock_id.upper()
         
-        # 抓取資料
-        df, stock_name = await asyncio.to_thread(_fetch_stock_data, stock_id)
+        # 抓取資料：已有日線快取 (觀察清單中的股票) 只補抓最新一段，否則抓取足以計算月線 MA20 的區間
+        if await asyncio.to_thread(load_history, stock_id) is not None:
+            bars, stock_name = await asyncio.to_thread(_refresh_history, stock_id)
+        else:
+            bars, stock_name = await asyncio.to_thread(_fetch_stock_data, stock_id, range_=PRICE_HISTORY_RANGE)
         
-        if df is None or df.empty:
+        if bars is None or len(bars.ts) < 2:
             return await ctx.send(f"❌ 找不到股票 `{stock_id}` 的資料。", ephemeral=is_private)
 
-        # 計算所有指標
-        df['MA20'] = df['Close'].rolling(window=20).mean()
-        df['RSI'] = _calculate_rsi(df['Close'], RSI_PERIOD)
-        df['MA5_Vol'] = df['Volume'].rolling(window=5).mean()
+        # 計算所有指標 (與訊號規則共用同一份規則檔)；週線與月線由日線重新取樣
+        rules = load_rules()
+        result = await asyncio.to_thread(rules.evaluate, bars.columns())
+        higher = {
+            tf: await asyncio.to_thread(rules.evaluate, resample(bars, tf).columns())
+            for tf in ('1wk', '1mo')
+        }
+        params = rules.params
         
-        latest = df.iloc[-1]
-        prev_close = df.iloc[-2]['Close']
-        
-        price = latest['Close']
+        prev_close = float(bars.close[-2])
+        price = float(bars.close[-1])
         change = price - prev_close
         pct_change = (change / prev_close) * 100
-        ma20 = latest['MA20']
-        rsi = latest['RSI']
-        vol_ratio = latest['Volume'] / latest['MA5_Vol'] if latest['MA5_Vol'] > 0 else 0
+        ma20 = _latest_value(result, 'ma20')
+        rsi = _latest_value(result, 'rsi')
+        vol_ratio = _latest_value(result, 'vol_ratio')
         
         # 設定顏色 (台股紅漲綠跌)
         color = discord.Color.red() if change > 0 else discord.Color.green()
@@ -557,13 +1167,24 @@ class StockMonitor(Cog_Extension):
         embed.add_field(name="📏 MA20", value=f"{ma20:.2f}\n({ma_status} {(price/ma20-1)*100:+.2f}%)", inline=True)
         
         # RSI 區塊
-        rsi_status = "🔥過熱" if rsi > 70 else "❄️過冷" if rsi < 30 else "中性"
-        embed.add_field(name="📈 RSI(14)", value=f"**{rsi:.1f}**\n({rsi_status})", inline=True)
+        rsi_status = "🔥過熱" if rsi > params.get('rsi_overbought', 70) else "❄️過冷" if rsi < params.get('rsi_oversold', 30) else "中性"
+        embed.add_field(name=f"📈 RSI({params.get('rsi_period', 14):g})", value=f"**{rsi:.1f}**\n({rsi_status})", inline=True)
         
         # 成交量區塊
-        vol_str = f"{int(latest['Volume']):,}"
-        vol_status = "🌋 **爆量**" if vol_ratio >= 2.5 else "正常"
+        vol_str = f"{int(bars.volume[-1]):,}"
+        vol_status = "🌋 **爆量**" if vol_ratio >= params.get('volume_multiplier', 2.5) else "正常"
         embed.add_field(name="📊 成交量", value=f"{vol_str}\n({vol_status})", inline=False)
+
+        # 週線 / 月線區塊 (最後一根為進行中的週期)
+        for tf, tf_result in higher.items():
+            tf_ma20 = _latest_value(tf_result, 'ma20')
+            tf_rsi = _latest_value(tf_result, 'rsi')
+            if tf_ma20 != tf_ma20: # NaN：歷史長度不足 20 個週期
+                value = "資料不足"
+            else:
+                tf_status = "✅站上" if price > tf_ma20 else "🔻跌破"
+                value = f"MA20 {tf_ma20:.2f} ({tf_status} {(price/tf_ma20-1)*100:+.2f}%)\nRSI **{tf_rsi:.1f}**"
+            embed.add_field(name=f"🗓️ {TIMEFRAME_LABELS[tf]}", value=value, inline=True)
         
         embed.set_footer(text=f"最後更新：{datetime.now(TAIWAN_TZ).strftime('%Y-%m-%d %H:%M:%S')}")
         
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, Optional
+
+from core.deferred_json import DeferredJsonWriter
+from core.media_cache import video_key
+from core.media_extractor import get_extractor
+
+# =========================================================
+# 本地音訊快取 (常播放的歌曲存成 Opus 檔)
+# 同一首歌播放到第 N 次時在背景下載；之後直接播放本地檔案，
+# 不需要解析也不需要連網。總大小超過上限時依「播放次數 x 時間衰減」淘汰。
+# =========================================================
+
+AUDIO_CACHE_DIR = './data/audio_cache'
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_MB', '2048')) * 1024 * 1024
+AUDIO_CACHE_MIN_PLAYS = int(os.getenv('AUDIO_CACHE_MIN_PLAYS', '3'))  # 第幾次播放時開始下載
+AUDIO_CACHE_HALF_LIFE = 14 * 86400  # 播放次數的半衰期 (秒)：很久沒播的熱門歌也會慢慢被淘汰
+AUDIO_DOWNLOAD_TIMEOUT = 300        # 單首下載 + 轉檔的逾時 (秒)
+AUDIO_INDEX_MAX_PLAYS = 5000        # 索引中最多記錄幾首「尚未下載」的歌曲 (超過時淘汰分數最低的)
+AUDIO_INDEX_MIN_SCORE = 0.05        # 尚未下載且衰減後的分數低於此值的紀錄直接移除
+AUDIO_INDEX_PRUNE_SLACK = 500       # 整理後索引再增加多少筆才再次整理 (避免每次播放都排序整個索引)
+
+
+class AudioCache:
+    """
+    index.json 格式：{影片鍵: {'plays', 'last_played', 'file', 'size'}}
+    未下載的歌曲也會記錄播放次數 (沒有 file 欄位)，數量有上限，分數最低的先移除。
+    索引的變動由 DeferredJsonWriter 合併後在執行緒中寫入。
+    """
+
+    def __init__(self, directory: str = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_MAX_BYTES,
+                 min_plays: int = AUDIO_CACHE_MIN_PLAYS):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._writer = DeferredJsonWriter(
+            self.index_path, lambda: {k: dict(v) for k, v in self._load().items()}, '音訊快取索引'
+        )
+        self._prune_at = AUDIO_INDEX_MAX_PLAYS # 索引筆數超過這個值時整理
+        self._downloading: Dict[str, asyncio.Task] = {}
+        self._download_lock = asyncio.Lock() # 一次只下載一首，保留解析服務給播放使用
+
+    # --- 索引 ---
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._index is None:
+            index = {}
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, 'r', encoding='utf8') as f:
+                        index = json.load(f)
+                except Exception as e:
+                    logging.error(f"讀取音訊快取索引失敗: {e}")
+            self._index = index
+        return self._index
+
+    async def preload(self):
+        """在執行緒中讀取索引 (Cog 載入時呼叫)"""
+        await asyncio.to_thread(self._load)
+
+    async def flush(self):
+        await self._writer.flush()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.get('size', 0) for entry in self._load().values() if entry.get('file'))
+
+    # --- 查詢 / 記錄 ---
+
+    def lookup(self, url: str) -> Optional[str]:
+        """已快取的本地檔案路徑 (檔案被手動刪除時視為未快取)"""
+        key = video_key(url)
+        entry = self._load().get(key) if key else None
+        if not entry or not entry.get('file'):
+            return None
+        path = os.path.join(self.directory, entry['file'])
+        if not os.path.exists(path):
+            entry.pop('file', None)
+            entry.pop('size', None)
+            self._writer.mark_dirty()
+            return None
+        return path
+
+    def record_play(self, url: str) -> bool:
+        """記錄一次播放；回傳是否該在背景下載這首歌"""
+        key = video_key(url)
+        if not key:
+            return False
+        index = self._load()
+        entry = index.setdefault(key, {'plays': 0})
+        entry['plays'] = entry.get('plays', 0) + 1
+        entry['last_played'] = time.time()
+        if len(index) > self._prune_at:
+            self._prune_plays(keep=key)
+        self._writer.mark_dirty()
+        return not entry.get('file') and entry['plays'] >= self.min_plays and key not in self._downloading
+
+    # --- 下載 / 淘汰 ---
+
+    def schedule_download(self, url: str):
+        """在背景下載 (同一首不會重複排程)"""
+        key = video_key(url)
+        if not key or key in self._downloading:
+            return
+        task = asyncio.ensure_future(self._download(key, url))
+        self._downloading[key] = task
+        task.add_done_callback(lambda _: self._downloading.pop(key, None))
+
+    async def _download(self, key: str, url: str):
+        async with self._download_lock:
+            try:
+                info = await get_extractor().extract(
+                    url, 'download', timeout=AUDIO_DOWNLOAD_TIMEOUT,
+                    options={'paths': {'home': os.path.abspath(self.directory)}}
+                )
+            except Exception as e:
+                logging.warning(f"下載音訊快取失敗 ({url}): {e}")
+                return
+
+        path = info.get('filepath')
+        if not path or not os.path.exists(path):
+            logging.warning(f"下載音訊快取後找不到檔案 ({url})")
+            return
+        entry = self._load().setdefault(key, {'plays': 0})
+        entry['file'] = os.path.basename(path)
+        entry['size'] = os.path.getsize(path)
+        entry['title'] = info.get('title')
+        logging.info(f"已快取音訊: {info.get('title')} ({entry['size'] / 1024 / 1024:.1f} MB)")
+        self._evict(keep=key)
+        self._writer.mark_dirty()
+
+    def _score(self, entry: Dict[str, Any], now: float) -> float:
+        """播放次數隨時間指數衰減 (LFU + LRU)，分數越低越先淘汰"""
+        age = max(0.0, now - entry.get('last_played', 0))
+        return entry.get('plays', 0) * math.pow(0.5, age / AUDIO_CACHE_HALF_LIFE)
+
+    def _evict(self, keep: Optional[str] = None):
+        index = self._load()
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        now = time.time()
+        candidates = sorted(
+            (key for key, entry in index.items() if entry.get('file') and key != keep),
+            key=lambda k: self._score(index[k], now)
+        )
+        for key in candidates:
+            if total <= self.max_bytes:
+                break
+            entry = index[key]
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"刪除音訊快取 {entry['file']} 失敗: {e}")
+                continue
+            total -= entry.pop('size', 0)
+            entry.pop('file', None)
+            logging.info(f"音訊快取已滿，淘汰: {entry.get('title') or key}")
+
+    def _prune_plays(self, keep: Optional[str] = None):
+        """
+        移除尚未下載的播放紀錄：衰減後分數低於 AUDIO_INDEX_MIN_SCORE 的全部移除，
+        其餘超過 AUDIO_INDEX_MAX_PLAYS 的依分數由低到高移除。
+        """
+        index = self._load()
+        now = time.time()
+        scores = {
+            key: self._score(entry, now) for key, entry in index.items()
+            if not entry.get('file') and key != keep and key not in self._downloading
+        }
+        ranked = sorted(scores, key=scores.get)
+        excess = max(0, len(ranked) - AUDIO_INDEX_MAX_PLAYS)
+        removed = [key for i, key in enumerate(ranked) if i < excess or scores[key] < AUDIO_INDEX_MIN_SCORE]
+        for key in removed:
+            del index[key]
+        self._prune_at = max(AUDIO_INDEX_MAX_PLAYS, len(index)) + AUDIO_INDEX_PRUNE_SLACK
+        if removed:
+            logging.info(f"音訊快取索引已移除 {len(removed)} 筆未下載的播放紀錄。")
+
+    def stats(self) -> Dict[str, Any]:
+        cached = [entry for entry in self._load().values() if entry.get('file')]
+        return {
+            'tracks': len(cached),
+            'bytes': sum(entry.get('size', 0) for entry in cached),
+            'max_bytes': self.max_bytes,
+            'downloading': len(self._downloading),
+        }
+
+
+_cache: Optional[AudioCache] = None
+
+
+def get_audio_cache() -> AudioCache:
+    global _cache
+    if _cache is None:
+        _cache = AudioCache()
+    return _cache
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Callable, Optional
+
+# =========================================================
+# 延後合併的 JSON 寫入
+# 快取在事件迴圈中頻繁變動 (每次播放、每次搜尋)，每次都同步重寫整個檔案會卡住語音與心跳。
+# 變動時只做標記，SAVE_DELAY 秒後在執行緒中寫入一次 (期間的變動合併成一次寫入)。
+# =========================================================
+
+SAVE_DELAY = 10.0
+
+
+class DeferredJsonWriter:
+    """
+    snapshot 在事件迴圈中呼叫，回傳要寫入的資料複本 (寫檔期間原資料可以繼續變動)；
+    寫入一律先寫 .tmp 再 os.replace。
+    """
+
+    def __init__(self, path: str, snapshot: Callable[[], Any], label: str, delay: float = SAVE_DELAY):
+        self.path = path
+        self.snapshot = snapshot
+        self.label = label
+        self.delay = delay
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def mark_dirty(self):
+        """記錄有變動，排程一次延後的寫入 (已排程時不重複排程)"""
+        self._dirty = True
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync() # 不在事件迴圈中 (例如同步的維護腳本)：直接寫入
+            return
+        self._task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        await self.flush()
+
+    async def flush(self):
+        """立即在執行緒中寫入尚未保存的變動 (關閉前呼叫，避免遺失最後幾秒的變動)"""
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            await asyncio.to_thread(self._write, self.snapshot())
+
+    def flush_sync(self):
+        if self._dirty:
+            self._dirty = False
+            self._write(self.snapshot())
+
+    def _write(self, data: Any):
+        tmp_path = self.path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"儲存{self.label} {self.path} 失敗: {e}")
@@ -0,0 +1,226 @@
+import json
+import os
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, NamedTuple, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+# =========================================================
+# 交易所行事曆：交易時段、休市日、提早收盤日
+# 休市資料放在 data/exchange_calendar.json，颱風假等臨時休市可用指令追加。
+# =========================================================
+
+CALENDAR_FILE = './data/exchange_calendar.json'
+
+
+class Exchange(NamedTuple):
+    code: str
+    name: str
+    tz: ZoneInfo
+    open: time
+    close: time
+    early_close: Optional[time] # 提早收盤日的收盤時間
+
+
+EXCHANGES: Dict[str, Exchange] = {
+    'TWSE': Exchange('TWSE', '台股', ZoneInfo('Asia/Taipei'), time(9, 0), time(13, 30), None),
+    'NYSE': Exchange('NYSE', '美股', ZoneInfo('America/New_York'), time(9, 30), time(16, 0), time(13, 0)),
+}
+
+# 代碼後綴 -> 交易所 (上櫃 .TWO 與上市的交易時段、休市日相同)；沒有後綴的代碼視為美股
+SUFFIX_EXCHANGES = {
+    '.TW': 'TWSE',
+    '.TWO': 'TWSE',
+}
+DEFAULT_EXCHANGE = 'NYSE'
+
+# 預設休市資料 (依各交易所公告整理，新年度公告後請更新 data/exchange_calendar.json)
+# 台股 2027 年尚未公告，依「紀念日及節日實施條例」的放假與補假規則推算，公告後請以公告為準。
+DEFAULT_CALENDAR: Dict[str, Dict[str, Any]] = {
+    "TWSE": {
+        "holidays": [
+            "2025-01-01", "2025-01-23", "2025-01-24", "2025-01-27", "2025-01-28", "2025-01-29",
+            "2025-01-30", "2025-01-31", "2025-02-28", "2025-04-03", "2025-04-04", "2025-05-01",
+            "2025-05-30", "2025-09-29", "2025-10-06", "2025-10-10", "2025-10-24", "2025-12-25",
+            "2026-01-01", "2026-02-12", "2026-02-13", "2026-02-16", "2026-02-17", "2026-02-18",
+            "2026-02-19", "2026-02-20", "2026-02-27", "2026-04-03", "2026-04-06", "2026-05-01",
+            "2026-06-19", "2026-09-25", "2026-09-28", "2026-10-09", "2026-10-26", "2026-12-25",
+            "2027-01-01", "2027-02-04", "2027-02-05", "2027-02-08", "2027-02-09", "2027-02-10",
+            "2027-03-01", "2027-04-05", "2027-04-06", "2027-04-30", "2027-06-09", "2027-09-15",
+            "2027-09-28", "2027-10-11", "2027-10-25", "2027-12-24"
+        ],
+        "early_closes": []
+    },
+    "NYSE": {
+        "holidays": [
+            "2025-01-01", "2025-01-09", "2025-01-20", "2025-02-17", "2025-04-18", "2025-05-26",
+            "2025-06-19", "2025-07-04", "2025-09-01", "2025-11-27", "2025-12-25",
+            "2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25", "2026-06-19",
+            "2026-07-03", "2026-09-07", "2026-11-26", "2026-12-25",
+            "2027-01-01", "2027-01-18", "2027-02-15", "2027-03-26", "2027-05-31", "2027-06-18",
+            "2027-07-05", "2027-09-06", "2027-11-25", "2027-12-24"
+        ],
+        "early_closes": [
+            "2025-07-03", "2025-11-28", "2025-12-24",
+            "2026-11-27", "2026-12-24",
+            "2027-11-26"
+        ]
+    }
+}
+
+
+def _dates(raw: Dict[str, Dict[str, Any]], code: str, key: str) -> Set[date]:
+    return {date.fromisoformat(d) for d in raw.get(code, {}).get(key, [])}
+
+
+class _CalendarData:
+    """休市 / 提早收盤日期集合 (依檔案修改時間快取)"""
+
+    def __init__(self):
+        self.mtime: Optional[float] = None
+        self.holidays: Dict[str, Set[date]] = {}
+        self.early_closes: Dict[str, Set[date]] = {}
+        self.warned_year: Optional[int] = None
+
+    def load(self, raw: Dict[str, Dict[str, Any]]):
+        """檔案中沒有列出任何休市日的年度 (例如舊檔案沒有新年度) 改用 DEFAULT_CALENDAR 的資料"""
+        self.holidays, self.early_closes = {}, {}
+        for code in EXCHANGES:
+            holidays = _dates(raw, code, 'holidays')
+            listed_years = {d.year for d in holidays}
+            self.holidays[code] = holidays | {
+                d for d in _dates(DEFAULT_CALENDAR, code, 'holidays') if d.year not in listed_years
+            }
+            self.early_closes[code] = _dates(raw, code, 'early_closes') | {
+                d for d in _dates(DEFAULT_CALENDAR, code, 'early_closes') if d.year not in listed_years
+            }
+        self.warned_year = None
+
+    def check_coverage(self, today: date):
+        """今年已超出休市資料的範圍時提醒更新 (每年只警告一次)"""
+        if self.warned_year == today.year:
+            return
+        self.warned_year = today.year
+        for code, holidays in self.holidays.items():
+            if not holidays or max(holidays).year < today.year:
+                last = max(holidays).isoformat() if holidays else '無'
+                logging.warning(
+                    f"{EXCHANGES[code].name}休市資料只到 {last}，{today.year} 年的休市日會被當成交易日，"
+                    f"請更新 {CALENDAR_FILE}。"
+                )
+
+
+_data = _CalendarData()
+
+
+def _ensure_file():
+    path = CALENDAR_FILE
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(DEFAULT_CALENDAR, f, indent=2, ensure_ascii=False)
+        logging.warning(f"{path} 不存在，已建立預設交易所行事曆。")
+
+
+def _read_raw() -> Dict[str, Dict[str, Any]]:
+    _ensure_file()
+    with open(CALENDAR_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _calendar() -> _CalendarData:
+    """
+    取得目前的休市資料。每次只 stat 檔案，修改時間有變動時才重新讀取與解析；
+    讀取失敗時沿用上次的資料 (第一次就失敗時使用預設值)。
+    """
+    mtime = None
+    try:
+        _ensure_file()
+        mtime = os.path.getmtime(CALENDAR_FILE)
+        if _data.mtime != mtime:
+            _data.load(_read_raw())
+            _data.mtime = mtime
+    except Exception as e:
+        logging.error(f"讀取交易所行事曆 {CALENDAR_FILE} 失敗: {e}")
+        if not _data.holidays:
+            _data.load(DEFAULT_CALENDAR)
+        _data.mtime = mtime if mtime is not None else -1 # 檔案修正 (修改時間變動) 前不再重新解析
+    _data.check_coverage(date.today())
+    return _data
+
+
+def add_closure(code: str, day: date) -> bool:
+    """
+    追加臨時休市日 (例如颱風假)。回傳 False 表示該日原本就已是休市日。
+    """
+    raw = _read_raw()
+    entry = raw.setdefault(code, {'holidays': [], 'early_closes': []})
+    iso = day.isoformat()
+    if iso in entry.setdefault('holidays', []):
+        return False
+    entry['holidays'] = sorted(entry['holidays'] + [iso])
+    with open(CALENDAR_FILE, 'w', encoding='utf-8') as f:
+        json.dump(raw, f, indent=2, ensure_ascii=False)
+    _data.mtime = None # 強制下次查詢時重新載入
+    return True
+
+
+# =========================================================
+# 查詢函式
+# =========================================================
+
+def exchange_for(symbol: str) -> Exchange:
+    """依股票代碼後綴判斷所屬交易所"""
+    for suffix, code in SUFFIX_EXCHANGES.items():
+        if symbol.upper().endswith(suffix):
+            return EXCHANGES[code]
+    return EXCHANGES[DEFAULT_EXCHANGE]
+
+
+def is_trading_day(exchange: Exchange, day: date) -> bool:
+    if day.weekday() >= 5:
+        return False
+    return day not in _calendar().holidays.get(exchange.code, set())
+
+
+def session(exchange: Exchange, day: date) -> Optional[Tuple[datetime, datetime]]:
+    """回傳該交易日的 (開盤, 收盤) 時間 (帶時區)；非交易日回傳 None"""
+    if not is_trading_day(exchange, day):
+        return None
+    close = exchange.close
+    if exchange.early_close and day in _calendar().early_closes.get(exchange.code, set()):
+        close = exchange.early_close
+    return (
+        datetime.combine(day, exchange.open, tzinfo=exchange.tz),
+        datetime.combine(day, close, tzinfo=exchange.tz),
+    )
+
+
+def local_date(exchange: Exchange, now: datetime) -> date:
+    """交易所當地的日期"""
+    return now.astimezone(exchange.tz).date()
+
+
+def is_open(exchange: Exchange, now: datetime) -> bool:
+    """目前是否在該交易所的交易時段內"""
+    hours = session(exchange, local_date(exchange, now))
+    return hours is not None and hours[0] <= now < hours[1]
+
+
+def next_session(exchange: Exchange, now: datetime, max_days: int = 30) -> Optional[Tuple[datetime, datetime]]:
+    """下一個 (或目前進行中的) 交易時段"""
+    day = local_date(exchange, now)
+    for offset in range(max_days):
+        hours = session(exchange, day + timedelta(days=offset))
+        if hours and hours[1] > now:
+            return hours
+    return None
+
+
+def next_trading_day(exchange: Exchange, day: date, max_days: int = 30) -> Optional[date]:
+    """day 之後的下一個交易日"""
+    for offset in range(1, max_days + 1):
+        candidate = day + timedelta(days=offset)
+        if is_trading_day(exchange, candidate):
+            return candidate
+    return None
@@ -0,0 +1,516 @@
+import asyncio
+import enum
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import discord
+
+from core.audio_cache import get_audio_cache
+from core.media_cache import get_media_cache, STREAM_URL_SAFETY_MARGIN
+from core.media_extractor import get_extractor, ExtractionError, ExtractionTimeout
+from core.music_queue import (
+    MusicQueue, QueuedSong, PlaylistCursor, PLAYLIST_PAGE_SIZE,
+    fetch_playlist_page, songs_from_entries, next_cursor,
+)
+from core.music_telemetry import get_telemetry
+from core.search_cache import get_search_cache
+from core.stream_stats import StreamCpu
+
+# =========================================================
+# 每個伺服器一個播放協程
+# 播放流程由單一協程依序執行 (等待佇列 -> 解析 -> 播放 -> 等待結束)，
+# 取代 after 回呼一路遞迴呼叫 song_finished / play_next_song 的做法。
+# =========================================================
+
+# FFmpeg 選項
+FFMPEG_OPTS = {
+    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
+    'options': '-vn',
+}
+# 本地快取檔案不需要斷線重連
+FFMPEG_LOCAL_OPTS = {
+    'options': '-vn',
+}
+OPUS_BITRATE = 128 # 來源不是 Opus 時，FFmpeg 轉成 Opus 的位元率 (kbps)
+
+MAX_QUEUE_SIZE = 2000          # 每個伺服器佇列的上限 (超過的歌曲不會加入)
+MAX_RESOLVE_RETRIES = 2        # 暫時性錯誤 (逾時、429、5xx) 的重試次數
+RETRY_BACKOFF = 2              # 重試等待秒數 (每次加倍)
+MAX_CONSECUTIVE_FAILURES = 5   # 連續失敗幾首後暫停，等使用者處理
+PREFETCH_MAX_BACKLOG = 4       # 解析服務排隊超過這個數量時先不預先解析 (讓正在等的播放優先)
+
+_TRANSIENT_ERRORS = ('timed out', 'HTTP Error 429', 'HTTP Error 5', 'Connection reset', 'Temporary failure')
+
+
+class PlayerStatus(enum.Enum):
+    IDLE = '待機'          # 佇列是空的
+    LOADING = '載入清單'   # 正在展開播放清單的下一頁
+    RESOLVING = '解析中'   # 正在取得串流網址 / 建立音訊來源
+    PLAYING = '播放中'
+    STALLED = '已暫停'     # 連續失敗或不在語音頻道，等待 /play、/skip 等操作喚醒
+    STOPPED = '已停止'
+
+
+def _is_transient(error: Exception) -> bool:
+    return isinstance(error, ExtractionTimeout) or any(s in str(error) for s in _TRANSIENT_ERRORS)
+
+
+def _consume_exception(task: asyncio.Future):
+    """背景預先解析失敗時只記錄，避免 'exception was never retrieved' 警告"""
+    if not task.cancelled() and task.exception():
+        logging.info(f"預先解析下一首失敗，輪到時會重新解析: {task.exception()}")
+
+
+async def _resolve_stream(webpage_url: str) -> Tuple[str, float]:
+    """
+    取得單首歌曲的串流網址，回傳 (串流網址, 到期時間)。
+    仍有效的網址直接取自快取；同一首同時被要求 (預先解析 + 播放) 時只解析一次。
+    """
+    return await get_media_cache().stream(webpage_url)
+
+
+async def _create_source(source: str, ffmpeg_opts: dict, codec: Optional[str] = None):
+    """
+    建立 Opus 音訊來源。來源已是 Opus 時直接轉封裝 (passthrough)，
+    Discord 收到的封包與原始音軌相同；其他格式才由 FFmpeg 轉成 Opus。
+    codec 未知時以 ffprobe 探測。回傳 (音訊來源, 模式)。
+    """
+    if codec is None:
+        try:
+            codec, _ = await discord.FFmpegOpusAudio.probe(source, method='fallback')
+        except Exception as e:
+            logging.info(f"探測音訊格式失敗，改用轉碼: {e}")
+    passthrough = codec == 'opus'
+    audio = discord.FFmpegOpusAudio(
+        source, codec='copy' if passthrough else None, bitrate=OPUS_BITRATE, **ffmpeg_opts
+    )
+    return audio, 'passthrough' if passthrough else 'transcode'
+
+
+class _FirstPacketSource(discord.AudioSource):
+    """包住實際的音訊來源，第一次讀到封包時回呼 (在 discord.py 的播放執行緒中呼叫)"""
+
+    def __init__(self, original: discord.AudioSource, on_first_packet):
+        self.original = original
+        self._on_first_packet = on_first_packet
+
+    def read(self) -> bytes:
+        data = self.original.read()
+        if data and self._on_first_packet is not None:
+            callback, self._on_first_packet = self._on_first_packet, None
+            callback(time.monotonic())
+        return data
+
+    def is_opus(self) -> bool:
+        return self.original.is_opus()
+
+    def cleanup(self):
+        self.original.cleanup()
+
+
+class GuildPlayer:
+    """
+    單一伺服器的播放器。指令只負責修改佇列並呼叫 notify()，
+    實際播放全部由 _run() 這個協程處理。
+    """
+
+    def __init__(self, guild: discord.Guild, channel: discord.abc.Messageable):
+        self.guild = guild
+        self.channel = channel # 播放失敗等通知送到這個頻道
+        self.queue = MusicQueue()
+        self.status = PlayerStatus.IDLE
+        self.now_playing: Optional[QueuedSong] = None
+        self.stream: Optional[Dict[str, Any]] = None   # {'title', 'mode', 'cpu': StreamCpu}
+        self.consecutive_failures = 0
+        # 資源統計
+        self.stats = {
+            'started_at': time.time(), 'played': 0, 'failed': 0, 'retries': 0, 'skipped': 0,
+            'resolve_seconds': 0.0, 'cpu_seconds': 0.0,
+        }
+
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._track_done = asyncio.Event()
+        self._track_error: Optional[Exception] = None
+        self._audio: Optional[discord.AudioSource] = None # 目前的音訊來源 (停止時確保 FFmpeg 被結束)
+        # 延遲統計用的時間點 (monotonic)
+        self._requested_at: Optional[float] = None   # 佇列原本是空的，點歌的時間
+        self._spawned_at: Optional[float] = None     # 開始建立 FFmpeg 音訊來源的時間
+        self._last_track_end: Optional[float] = None # 上一首結束的時間 (之後佇列還有歌才記錄)
+        self._track_started_at: Optional[float] = None # 目前這首送出第一個封包的時間
+        self._track_offset = 0.0                       # 目前這首從第幾秒開始播放
+        # 從快照恢復時，第一首從中斷的位置繼續：(歌曲, 秒數)
+        self.resume_offset: Optional[Tuple[QueuedSong, float]] = None
+        self._prefetch: Optional[Dict[str, Any]] = None  # {'webpage_url': ..., 'task': Future[(串流網址, 到期時間)]}
+        self._resolving: Optional[asyncio.Task] = None
+        self._expanding: Optional[asyncio.Task] = None
+        self._task = asyncio.create_task(self._run(), name=f"music-player-{guild.id}")
+
+    # --- 給指令使用的操作 ---
+
+    def add(self, songs: Iterable[QueuedSong], cursor: Optional[PlaylistCursor] = None) -> int:
+        """
+        加入歌曲 (佇列已滿時多出的部分不加入)，回傳實際加入的數量。
+        播放清單的 cursor 只有在清單第一頁全部放得下時才加入。
+        """
+        if self.status == PlayerStatus.IDLE and not self.queue:
+            self._requested_at = time.monotonic()
+        added = 0
+        for song in songs:
+            if len(self.queue) >= MAX_QUEUE_SIZE:
+                cursor = None
+                break
+            self.queue.append(song)
+            added += 1
+        if cursor is not None and len(self.queue) < MAX_QUEUE_SIZE:
+            self.queue.append(cursor)
+        self.notify()
+        return added
+
+    def notify(self):
+        """佇列有變動：喚醒待機 / 暫停中的播放協程，並更新下一首的預先解析"""
+        self._wakeup.set()
+        if self.status == PlayerStatus.PLAYING:
+            self._prefetch_next()
+
+    def skip(self) -> bool:
+        """跳過目前的歌曲 (解析中則直接中止解析)；沒有歌曲在處理時回傳 False"""
+        if self.status == PlayerStatus.RESOLVING and self._resolving and not self._resolving.done():
+            self._resolving.cancel()
+        elif self.status == PlayerStatus.PLAYING and self.guild.voice_client:
+            self.guild.voice_client.stop()
+        elif self.status == PlayerStatus.STALLED and self.queue:
+            self.queue.popleft() # 丟掉卡住的那首，從下一首繼續
+            self._wakeup.set()
+        else:
+            return False
+        self.stats['skipped'] += 1
+        return True
+
+    def clear(self):
+        self.queue.clear()
+        self._cancel_pending()
+
+    async def shutdown(self):
+        """停止播放協程與所有背景工作 (不會中斷語音連線)"""
+        self.clear()
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        vc = self.guild.voice_client
+        if vc and (vc.is_playing() or vc.is_paused()):
+            vc.stop()
+        self._release_audio()
+        self.status = PlayerStatus.STOPPED
+        self.now_playing = None
+
+    def position(self) -> Optional[float]:
+        """目前這首已播放到第幾秒 (沒有在播放時為 None)"""
+        if self.status != PlayerStatus.PLAYING or self._track_started_at is None:
+            return None
+        return self._track_offset + time.monotonic() - self._track_started_at
+
+    def snapshot(self) -> Dict[str, Any]:
+        """目前狀態與資源統計 (供 /streams 顯示)"""
+        usage = self.stream['cpu'].sample() if self.stream else {}
+        return {
+            'status': self.status,
+            'queue': len(self.queue),
+            'now_playing': self.now_playing.title if self.now_playing else None,
+            'mode': self.stream['mode'] if self.stream else None,
+            'usage': usage,
+            **self.stats,
+        }
+
+    # --- 播放協程 ---
+
+    async def _run(self):
+        while True:
+            try:
+                self.status = PlayerStatus.IDLE
+                self.now_playing = None
+                song = await self._next_song()
+                await self._play(song)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 不讓單一首的意外錯誤結束整個播放器
+                logging.exception(f"播放器發生未預期的錯誤 (Guild: {self.guild.id})")
+                self._release_audio()
+                await asyncio.sleep(1)
+
+    async def _wait_for_wakeup(self):
+        self._wakeup.clear()
+        await self._wakeup.wait()
+
+    async def _next_song(self) -> QueuedSong:
+        """等待並取出下一首 (佇列最前面是播放清單時先載入下一頁)"""
+        while True:
+            while not self.queue:
+                await self._wait_for_wakeup()
+            if isinstance(self.queue.peek(), PlaylistCursor):
+                self.status = PlayerStatus.LOADING
+                # 失敗時 cursor 會被移除，不會卡在這裡；被 /stop、/queue clear 取消也只是重新檢查佇列
+                await asyncio.wait({self._schedule_expand()})
+                continue
+            return self.queue.popleft()
+
+    async def _play(self, song: QueuedSong):
+        if self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+            self.status = PlayerStatus.STALLED
+            self.queue.insert_at(0, [song])
+            self._last_track_end = None
+            await self._send(f"⚠️ 已連續 {self.consecutive_failures} 首播放失敗，暫停播放。使用 `/skip` 或 `/play` 繼續。")
+            await self._wait_for_wakeup()
+            self.consecutive_failures = 0
+            return
+
+        if not self.guild.voice_client:
+            # 不在語音頻道 (被踢出或斷線)：放回佇列，等下一次 /play 重新連線
+            self.status = PlayerStatus.STALLED
+            self.queue.insert_at(0, [song])
+            self._last_track_end = None
+            await self._wait_for_wakeup()
+            return
+
+        self.now_playing = song
+
+        # 常播放的歌曲：播放到第 N 次時在背景下載到本地快取
+        audio_cache = get_audio_cache()
+        if audio_cache.record_play(song.webpage_url):
+            audio_cache.schedule_download(song.webpage_url)
+
+        opened = await self._open_with_retries(song)
+        if opened is None:
+            return
+        audio, mode = opened
+
+        vc = self.guild.voice_client
+        if not vc:
+            audio.cleanup()
+            return
+
+        self._track_done.clear()
+        self._track_error = None
+        self._audio = audio
+        vc.play(_FirstPacketSource(audio, self._on_first_packet), after=self._after_track)
+        self.resume_offset = None
+        process = getattr(audio, '_process', None)
+        player = getattr(vc, '_player', None)
+        self.stream = {
+            'title': song.title,
+            'mode': mode,
+            'cpu': StreamCpu(getattr(process, 'pid', None), getattr(player, 'native_id', None)),
+        }
+        self.status = PlayerStatus.PLAYING
+        self.consecutive_failures = 0
+        self.stats['played'] += 1
+
+        # 趁這首播放時先解析下一首
+        self._prefetch_next()
+
+        await self._track_done.wait()
+        self._release_audio()
+        self._last_track_end = time.monotonic() if self.queue else None
+        if self._track_error:
+            get_telemetry().failure('playback', self._track_error)
+            logging.error(f"播放時發生錯誤 (Guild: {self.guild.id}): {self._track_error}")
+
+    def _on_first_packet(self, at: float):
+        self._loop.call_soon_threadsafe(self._record_first_packet, at)
+
+    def _record_first_packet(self, at: float):
+        """送出第一個封包：記錄 FFmpeg 啟動、換歌間隔與點歌到出聲的延遲"""
+        telemetry = get_telemetry()
+        if self._spawned_at is not None:
+            telemetry.observe('first_audio', at - self._spawned_at)
+        if self._last_track_end is not None:
+            telemetry.observe('gap', at - self._last_track_end)
+        if self._requested_at is not None:
+            telemetry.observe('time_to_audio', at - self._requested_at)
+        self._spawned_at = self._last_track_end = self._requested_at = None
+        self._track_started_at = at
+
+    def _after_track(self, error: Optional[Exception]):
+        """discord.py 播放執行緒的回呼：只通知協程，不在這裡做任何事"""
+        self._track_error = error
+        self._loop.call_soon_threadsafe(self._track_done.set)
+
+    def _release_audio(self):
+        """結束目前的音訊來源：結算 CPU 統計並結束 FFmpeg 子行程 (重複呼叫無妨)"""
+        self._finish_stream()
+        audio, self._audio = self._audio, None
+        self._track_started_at = None
+        if audio is not None:
+            audio.cleanup()
+
+    def _finish_stream(self):
+        """結束目前串流的 CPU 統計"""
+        if self.stream:
+            usage = self.stream['cpu'].sample()
+            elapsed = time.monotonic() - self.stream['cpu'].started
+            self.stats['cpu_seconds'] += sum(usage.get(f'{k}_avg') or 0.0 for k in ('ffmpeg', 'player')) / 100 * elapsed
+            self.stream = None
+
+    async def _open_with_retries(self, song: QueuedSong):
+        """
+        建立音訊來源；暫時性錯誤依 RETRY_BACKOFF 重試，最多 MAX_RESOLVE_RETRIES 次。
+        被 /skip 中止或最終失敗時回傳 None。
+        """
+        for attempt in range(MAX_RESOLVE_RETRIES + 1):
+            self.status = PlayerStatus.RESOLVING
+            started = time.monotonic()
+            self._resolving = asyncio.ensure_future(self._open_source(song))
+            try:
+                return await self._resolving
+            except asyncio.CancelledError:
+                if not self._resolving.cancelled():
+                    raise # 播放器本身被停止
+                return None # 解析途中被 /skip 跳過
+            except Exception as e:
+                if attempt < MAX_RESOLVE_RETRIES and _is_transient(e):
+                    self.stats['retries'] += 1
+                    logging.warning(f"解析 {song.title} 失敗，{RETRY_BACKOFF * 2 ** attempt} 秒後重試: {e}")
+                    await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+                    continue
+                self.stats['failed'] += 1
+                self.consecutive_failures += 1
+                if isinstance(e, ExtractionError) and not _is_transient(e):
+                    get_search_cache().invalidate_url(song.webpage_url) # 影片已移除等：不再從搜尋快取回傳
+                await self._send(f"❌ 播放 **{song.title}** 失敗 (可能是地區限制或影片已移除)。\n{e}")
+                return None
+            finally:
+                self.stats['resolve_seconds'] += time.monotonic() - started
+                self._resolving = None
+        return None
+
+    def _seek_options(self, song: QueuedSong, ffmpeg_opts: dict) -> dict:
+        """從快照恢復的第一首：加上 -ss 從中斷的位置開始"""
+        resume = self.resume_offset
+        self._track_offset = 0.0
+        if resume is None or resume[0] is not song:
+            self.resume_offset = None
+            return ffmpeg_opts
+        self._track_offset = resume[1]
+        before = f"{ffmpeg_opts.get('before_options', '')} -ss {resume[1]:.1f}".strip()
+        return {**ffmpeg_opts, 'before_options': before}
+
+    async def _open_source(self, song: QueuedSong):
+        # 已有本地快取：直接播放檔案，不解析也不連網 (快取檔一律是 Opus)
+        local_path = get_audio_cache().lookup(song.webpage_url)
+        if local_path:
+            self._spawned_at = time.monotonic()
+            audio, _ = await _create_source(local_path, self._seek_options(song, FFMPEG_LOCAL_OPTS), codec='opus')
+            return audio, 'local'
+
+        # 串流 (通常已在上一首播放時預先解析完成)；yt-dlp 已告知音軌格式時不必再探測
+        with get_telemetry().timer('resolve'):
+            stream_url = await self._get_stream_url(song)
+        metadata = get_media_cache().cached_metadata(song.webpage_url) or {}
+        acodec = metadata.get('acodec')
+        codec = acodec.split('.')[0] if acodec and acodec != 'none' else None
+        self._spawned_at = time.monotonic()
+        return await _create_source(stream_url, self._seek_options(song, FFMPEG_OPTS), codec)
+
+    async def _send(self, content: str):
+        try:
+            await self.channel.send(content)
+        except discord.HTTPException as e:
+            logging.warning(f"播放器通知送出失敗 (Guild: {self.guild.id}): {e}")
+
+    # --- 預先解析 / 播放清單展開 ---
+
+    def _cancel_pending(self):
+        for task in (self._prefetch['task'] if self._prefetch else None, self._expanding):
+            if task and not task.done():
+                task.cancel()
+        self._prefetch = None
+        self._expanding = None
+
+    def _schedule_expand(self) -> Optional[asyncio.Task]:
+        """佇列前幾首內有未展開的播放清單時，在背景載入它的下一頁 (回傳該 Task)"""
+        cursor = next_cursor(self.queue)
+        if cursor is None:
+            return None
+        if self._expanding is None or self._expanding.done():
+            self._expanding = asyncio.ensure_future(self._load_playlist_page(cursor))
+        return self._expanding
+
+    async def _load_playlist_page(self, cursor: PlaylistCursor):
+        """
+        展開播放清單的下一頁，插在 cursor 前面；清單到底或載入失敗時移除 cursor。
+        """
+        try:
+            with get_telemetry().timer('playlist_page'):
+                _, entries = await fetch_playlist_page(cursor.url, cursor.next_index)
+        except Exception as e:
+            logging.error(f"載入播放清單 {cursor.title} 第 {cursor.next_index} 首起失敗: {e}")
+            entries = None
+
+        index = self.queue.index(cursor)
+        if index is None: # 載入期間佇列被清空或移除了這個播放清單
+            return
+        cursor.next_index += PLAYLIST_PAGE_SIZE
+        if entries is None or len(entries) < PLAYLIST_PAGE_SIZE:
+            self.queue.remove_at(index)
+        self.queue.insert_at(index, songs_from_entries(entries or [], cursor.requester_id))
+
+        if self.status == PlayerStatus.PLAYING:
+            self._prefetch_next()
+
+    def _prefetch_next(self):
+        """
+        播放中時在背景解析佇列下一首的串流網址。
+        已經在解析同一首就不重複；佇列第一首換了 (跳過、插隊...) 則取消舊的並重新解析。
+        解析服務忙碌時先不預先解析，輪到時再解析。
+        """
+        self._schedule_expand()
+        head = self.queue.peek()
+        if head is None or isinstance(head, PlaylistCursor):
+            return # 下一首還在播放清單裡，載入完成後會再呼叫一次
+        url = head.webpage_url
+        if get_audio_cache().lookup(url):
+            return # 已有本地快取，不需要串流網址
+        pending = self._prefetch
+        if pending and pending['webpage_url'] == url:
+            task = pending['task']
+            if not task.done():
+                return
+            if not task.cancelled() and not task.exception() and task.result()[1] - time.time() > STREAM_URL_SAFETY_MARGIN:
+                return
+        if pending and not pending['task'].done():
+            pending['task'].cancel()
+        if get_extractor().backlog > PREFETCH_MAX_BACKLOG:
+            self._prefetch = None
+            return
+
+        task = asyncio.ensure_future(_resolve_stream(url))
+        task.add_done_callback(_consume_exception)
+        self._prefetch = {'webpage_url': url, 'task': task}
+
+    async def _get_stream_url(self, song: QueuedSong) -> str:
+        """
+        取得歌曲的串流網址：優先使用預先解析的結果 (尚未完成就等它)，
+        不是同一首、解析失敗、預先解析被取消或網址快到期時才重新解析。
+        """
+        pending = self._prefetch
+        self._prefetch = None
+        if pending and pending['webpage_url'] == song.webpage_url:
+            task = pending['task']
+            try:
+                # shield：本協程被 /skip 取消時不連帶取消預先解析，兩種取消才分得開
+                stream_url, expires_at = await asyncio.shield(task)
+                if expires_at - time.time() > STREAM_URL_SAFETY_MARGIN:
+                    return stream_url
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise # 本協程被取消
+                # 預先解析被取消 (例如佇列變動)，不是 /skip：重新解析
+            except Exception:
+                pass
+
+        stream_url, _ = await _resolve_stream(song.webpage_url)
+        return stream_url
@@ -0,0 +1,158 @@
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from core.stock_history import HISTORY_DIR, PRICE_FIELDS
+from core.stock_rules import RuleSet
+from core.twse_snapshot import Snapshot, TWSE_SUFFIX
+
+# =========================================================
+# 全市場日線矩陣 (股票 x 交易日)
+# 由每日的證交所快照逐日累積，供全市場選股 (/stock screen) 一次向量化評估。
+# =========================================================
+
+PANEL_DAYS = 250 # 保留最近約一年的交易日 (足夠 MA20 / RSI 收斂)
+
+
+class MarketPanel(NamedTuple):
+    symbols: np.ndarray # (股票,) 代碼，例如 2330.TW
+    names: np.ndarray   # (股票,) 名稱
+    ts: np.ndarray      # (交易日,) 當日 00:00 UTC 的 Unix 秒，依時間排序
+    open: np.ndarray    # (股票, 交易日)；當日無成交為 NaN
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """價格與成交量矩陣 (規則引擎的輸入格式)"""
+        return {field: getattr(self, field) for field in PRICE_FIELDS}
+
+
+def empty_panel() -> MarketPanel:
+    return MarketPanel(
+        np.empty(0, dtype=str), np.empty(0, dtype=str), np.empty(0, dtype=np.int64),
+        *(np.empty((0, 0)) for _ in PRICE_FIELDS)
+    )
+
+
+def panel_path(exchange_code: str) -> str:
+    return os.path.join(HISTORY_DIR, f"_market_{exchange_code}.npz")
+
+
+def load_panel(exchange_code: str) -> MarketPanel:
+    """讀取全市場矩陣，檔案不存在或損毀時回傳空矩陣"""
+    path = panel_path(exchange_code)
+    if not os.path.exists(path):
+        return empty_panel()
+    try:
+        with np.load(path) as data:
+            return MarketPanel(*(data[field] for field in MarketPanel._fields))
+    except Exception as e:
+        logging.error(f"讀取全市場矩陣 {path} 失敗: {e}")
+        return empty_panel()
+
+
+def save_panel(exchange_code: str, panel: MarketPanel):
+    """原子性地寫入全市場矩陣 (先寫暫存檔再取代)"""
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    path = panel_path(exchange_code)
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **panel._asdict())
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.error(f"儲存全市場矩陣 {path} 失敗: {e}")
+
+
+def append_snapshot(panel: MarketPanel, snapshot: Snapshot, max_days: int = PANEL_DAYS) -> MarketPanel:
+    """
+    將一天的快照併入矩陣 (可不依時間順序加入，方便回補)。
+    同一交易日重複加入時以新快照為準；新上市的股票在之前的交易日補 NaN。
+    """
+    if snapshot.day is None or not snapshot.rows:
+        return panel
+    day_ts = int(datetime(snapshot.day.year, snapshot.day.month, snapshot.day.day, tzinfo=timezone.utc).timestamp())
+
+    codes = list(snapshot.rows)
+    new_symbols = np.array([code + TWSE_SUFFIX for code in codes])
+    known = {symbol: i for i, symbol in enumerate(panel.symbols.tolist())}
+    added = [s for s in new_symbols.tolist() if s not in known]
+    symbols = np.concatenate([panel.symbols, np.array(added, dtype=new_symbols.dtype)]) if added else panel.symbols
+    names = np.concatenate([panel.names, np.array([''] * len(added))]) if added else panel.names
+    names = names.astype(object)
+
+    ts = np.union1d(panel.ts, np.array([day_ts], dtype=np.int64))[-max_days:]
+    old_keep = panel.ts >= ts[0]
+    old_cols = np.searchsorted(ts, panel.ts[old_keep])
+    col = int(np.searchsorted(ts, day_ts))
+    if col >= len(ts) or ts[col] != day_ts:
+        return panel # 比保留區間還舊的快照
+
+    rows = np.array([known.get(s, -1) for s in new_symbols.tolist()])
+    rows[rows < 0] = len(panel.symbols) + np.arange(len(added))
+    names[rows] = [snapshot.rows[code].name for code in codes]
+
+    matrices = []
+    for field in PRICE_FIELDS:
+        matrix = np.full((len(symbols), len(ts)), np.nan)
+        matrix[:len(panel.symbols), old_cols] = getattr(panel, field)[:, old_keep]
+        matrix[:, col] = np.nan # 以新快照完整取代該日 (快照中沒有的股票視為無成交)
+        matrix[rows, col] = [getattr(snapshot.rows[code], field) for code in codes]
+        matrices.append(matrix)
+
+    return MarketPanel(symbols, names.astype(str), ts, *matrices)
+
+
+def update_panel(exchange_code: str, snapshot: Snapshot) -> MarketPanel:
+    """將快照寫入磁碟上的全市場矩陣並回傳更新後的結果"""
+    panel = append_snapshot(load_panel(exchange_code), snapshot)
+    save_panel(exchange_code, panel)
+    return panel
+
+
+# =========================================================
+# 全市場選股
+# =========================================================
+
+def screen(panel: MarketPanel, ruleset: RuleSet, rule_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    對整個市場一次評估規則，回傳最新交易日觸發規則的股票，依成交金額由大到小排序。
+    rule_ids 指定只看哪些規則 (預設全部)。
+    """
+    if len(panel.ts) < 2 or len(panel.symbols) == 0:
+        return []
+
+    result = ruleset.evaluate(panel.columns())
+    rules = [r for r in ruleset.rules if rule_ids is None or r.id in rule_ids]
+    if not rules:
+        return []
+
+    fired = np.stack([np.asarray(result.masks[r.id])[:, -1] for r in rules]) # (規則, 股票)
+    matched = np.flatnonzero(fired.any(axis=0))
+    if matched.size == 0:
+        return []
+
+    close = panel.close[matched, -1]
+    prev_close = panel.close[matched, -2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change_pct = (close / prev_close - 1) * 100
+    turnover = close * panel.volume[matched, -1]
+    order = np.argsort(-np.nan_to_num(turnover, nan=-1.0), kind='stable')
+
+    titles = [r.title for r in rules]
+    return [
+        {
+            'symbol': str(panel.symbols[i]),
+            'name': str(panel.names[i]),
+            'close': float(close[k]),
+            'change_pct': float(change_pct[k]),
+            'turnover': float(turnover[k]),
+            'rules': [titles[j] for j in np.flatnonzero(fired[:, i])],
+        }
+        for k, i in ((k, matched[k]) for k in order)
+    ]
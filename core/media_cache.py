@@ -0,0 +1,228 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from core.deferred_json import DeferredJsonWriter
+from core.media_extractor import get_extractor
+from core.media_urls import youtube_id
+
+# =========================================================
+# 媒體網址快取
+# - 影片資訊 (標題、長度、音訊格式...)：依影片 ID 保存在磁碟 (LRU，最多 METADATA_CACHE_SIZE 部)
+# - 串流網址：有簽章、會過期，只放在記憶體的 LRU，有效期取自網址內的 expire
+# - 同一部影片同時被多處要求時只解析一次 (single-flight)
+# =========================================================
+
+METADATA_FILE = './data/media_metadata.json'
+METADATA_CACHE_SIZE = 20000        # 磁碟上最多保留幾部影片的資訊 (最久沒用到的先移除)
+STREAM_CACHE_SIZE = 256            # 記憶體中最多保留幾個串流網址
+STREAM_URL_FALLBACK_TTL = 30 * 60  # 串流網址沒有標示到期時間時，視為 30 分鐘內有效
+STREAM_URL_SAFETY_MARGIN = 60      # 距離到期不到這個秒數就重新解析
+
+# 寫入磁碟的影片資訊欄位
+_METADATA_FIELDS = ('title', 'duration', 'webpage_url', 'format_id', 'ext', 'acodec', 'abr', 'asr', 'extractor')
+
+
+def video_key(url: str) -> Optional[str]:
+    """
+    取出影片的識別鍵，例如 youtube:dQw4w9WgXcQ。
+    同一部影片的各種網址形式 (watch?v=、youtu.be、shorts、YouTube Music) 會得到相同的鍵；無法辨識時回傳 None。
+    """
+    video = youtube_id(url)
+    return f"youtube:{video}" if video else None
+
+
+def stream_expiry(stream_url: str) -> float:
+    """
+    從串流網址取出到期時間 (Unix 秒)。
+    YouTube 的 googlevideo 網址會帶 expire=... 參數 (或 /expire/.../ 路徑)；找不到時使用預設有效期。
+    """
+    try:
+        parsed = urlparse(stream_url)
+        expire = parse_qs(parsed.query).get('expire', [None])[0]
+        if expire is None:
+            match = re.search(r'/expire/(\d+)', parsed.path)
+            expire = match.group(1) if match else None
+        if expire is not None:
+            return float(expire)
+    except ValueError:
+        pass
+    return time.time() + STREAM_URL_FALLBACK_TTL
+
+
+class MediaCache:
+    def __init__(self, path: str = METADATA_FILE, stream_capacity: int = STREAM_CACHE_SIZE,
+                 metadata_capacity: int = METADATA_CACHE_SIZE):
+        self.path = path
+        self.stream_capacity = stream_capacity
+        self.metadata_capacity = metadata_capacity
+        self._metadata: Optional['OrderedDict[str, Dict[str, Any]]'] = None
+        self._writer = DeferredJsonWriter(path, lambda: {k: dict(v) for k, v in self._load().items()}, '媒體資訊快取')
+        self._streams: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self.stats = {'metadata_hits': 0, 'stream_hits': 0, 'extractions': 0, 'collapsed': 0}
+
+    # --- 影片資訊 (磁碟) ---
+
+    def _load(self) -> 'OrderedDict[str, Dict[str, Any]]':
+        """檔案依最近使用的順序排列 (最舊的在前)"""
+        if self._metadata is None:
+            metadata = OrderedDict()
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf8') as f:
+                        metadata.update(json.load(f))
+                except Exception as e:
+                    logging.error(f"讀取媒體資訊快取 {self.path} 失敗: {e}")
+            self._metadata = metadata
+        return self._metadata
+
+    async def preload(self):
+        """在執行緒中讀取檔案 (Cog 載入時呼叫)"""
+        await asyncio.to_thread(self._load)
+
+    async def flush(self):
+        await self._writer.flush()
+
+    def cached_metadata(self, url: str) -> Optional[Dict[str, Any]]:
+        key = video_key(url)
+        metadata = self._load()
+        entry = metadata.get(key) if key else None
+        if entry is not None:
+            metadata.move_to_end(key) # 只調整順序，下次寫入時一併保存
+        return entry
+
+    def _remember(self, key: Optional[str], info: Dict[str, Any]):
+        """合併新解析到的欄位 (只有標題的結果不會覆蓋已知的格式資訊)"""
+        if not key:
+            return
+        fields = {k: info[k] for k in _METADATA_FIELDS if info.get(k) is not None}
+        if not fields:
+            return
+        metadata = self._load()
+        entry = metadata.setdefault(key, {})
+        metadata.move_to_end(key)
+        if any(entry.get(k) != v for k, v in fields.items()):
+            entry.update(fields)
+            while len(metadata) > self.metadata_capacity:
+                metadata.popitem(last=False)
+            self._writer.mark_dirty()
+
+    # --- 串流網址 (記憶體 LRU) ---
+
+    def cached_stream(self, url: str) -> Optional[Tuple[str, float]]:
+        """仍在有效期內的串流網址 (快到期的視為沒有)"""
+        key = video_key(url) or url
+        hit = self._streams.get(key)
+        if hit is None:
+            return None
+        if hit[1] - time.time() <= STREAM_URL_SAFETY_MARGIN:
+            del self._streams[key]
+            return None
+        self._streams.move_to_end(key)
+        return hit
+
+    def _store_stream(self, key: str, stream_url: str, expires_at: float):
+        self._streams[key] = (stream_url, expires_at)
+        self._streams.move_to_end(key)
+        while len(self._streams) > self.stream_capacity:
+            self._streams.popitem(last=False)
+
+    # --- 合併同時的請求 ---
+
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        相同 key 的請求共用一次解析。每個呼叫端各自可以被取消；
+        所有等待者都取消時才中止底層的解析。
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.stats['collapsed'] += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight.get(key) is task and not task.done():
+                self._waiters[key] -= 1
+                if self._waiters[key] <= 0:
+                    # 立即移出，之後的請求重新解析，而不是加入這個正在取消的工作而收到 CancelledError
+                    del self._inflight[key]
+                    del self._waiters[key]
+                    task.cancel()
+            raise
+
+    def _finish(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiters[key]
+        if not task.cancelled():
+            task.exception() # 已由等待者取得；避免 'exception was never retrieved'
+
+    # --- 對外介面 ---
+
+    async def stream(self, url: str) -> Tuple[str, float]:
+        """取得 (串流網址, 到期時間)：優先使用仍有效的快取，否則解析並更新影片資訊"""
+        hit = self.cached_stream(url)
+        if hit:
+            self.stats['stream_hits'] += 1
+            return hit
+
+        key = video_key(url)
+
+        async def resolve():
+            self.stats['extractions'] += 1
+            info = await get_extractor().extract(url, 'stream')
+            stream_url = info.get('url')
+            if not stream_url:
+                raise Exception("無法獲取 stream_url")
+            expires_at = stream_expiry(stream_url)
+            self._store_stream(key or url, stream_url, expires_at)
+            self._remember(key, info)
+            return stream_url, expires_at
+
+        return await self._single_flight(f"stream:{key or url}", resolve)
+
+    async def metadata(self, url: str) -> Dict[str, Any]:
+        """取得影片資訊 (至少包含 title)：已知的影片直接讀快取，不會過期"""
+        cached = self.cached_metadata(url)
+        if cached and cached.get('title'):
+            self.stats['metadata_hits'] += 1
+            return cached
+
+        key = video_key(url)
+
+        async def resolve():
+            self.stats['extractions'] += 1
+            info = await get_extractor().extract(url, 'title', timeout=15)
+            self._remember(key, info)
+            return self.cached_metadata(url) or info
+
+        return await self._single_flight(f"meta:{key or url}", resolve)
+
+    def remember(self, url: str, info: Dict[str, Any]):
+        """記下其他地方已解析到的資訊 (例如 /play 的搜尋結果)"""
+        self._remember(video_key(url), info)
+
+
+_cache: Optional[MediaCache] = None
+
+
+def get_media_cache() -> MediaCache:
+    """兩個音樂 Cog 共用的媒體快取"""
+    global _cache
+    if _cache is None:
+        _cache = MediaCache()
+    return _cache
@@ -0,0 +1,323 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+# =========================================================
+# yt-dlp 解析服務 (獨立的工作行程)
+# extract_info 是吃 GIL 的純 Python 運算，放在事件迴圈的執行緒池裡會讓語音封包與心跳卡頓。
+# 這裡改由數個常駐的工作行程處理，每個行程保留已初始化的 YoutubeDL 實例。
+# =========================================================
+
+EXTRACT_WORKERS = int(os.getenv('MEDIA_EXTRACT_WORKERS', '2'))
+EXTRACT_TIMEOUT = 30           # 單次解析的預設逾時 (秒)
+WORKER_MAX_JOBS = 500          # 每個工作行程處理多少次後重新啟動，避免記憶體慢慢膨脹
+WORKER_POLL_INTERVAL = 0.25    # 等待結果時檢查取消 / 逾時的間隔 (秒)
+
+# yt-dlp 設定：依用途分成幾種 profile，工作行程會為每種 profile 各保留一個 YoutubeDL
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # 單首歌曲的串流網址
+    'stream': {
+        # 優先選 Opus 音軌，播放時可直接轉封裝給 Discord 而不必重新編碼
+        'format': 'bestaudio[acodec=opus]/bestaudio[ext=m4a]/bestaudio[ext=aac]/bestaudio/best',
+        'noplaylist': True,
+        'quiet': True,
+        'default_search': 'ytsearch',
+        'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
+        'restrictfilenames': True,
+        'extract_flat': True,
+    },
+    # /play 的關鍵字搜尋或播放清單 (只展開成扁平的項目)
+    'search': {
+        'format': 'bestaudio[ext=m4a]/bestaudio[ext=aac]/bestaudio[ext=opus]/bestaudio/best',
+        'noplaylist': False,
+        'quiet': True,
+        'default_search': 'ytsearch',
+        'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
+        'restrictfilenames': True,
+        'extract_flat': True,
+    },
+    # 音樂分享頻道只需要標題
+    'title': {
+        'quiet': True, 'no_warnings': True, 'forcetitle': True,
+        'skip_download': True, 'simulate': True, 'format': 'best',
+        'extract_flat': 'in_playlist', 'retries': 3, 'socket_timeout': 5,
+    },
+    # 本地音訊快取：下載並轉成 Opus (存放目錄由請求的 paths 指定)
+    'download': {
+        'format': 'bestaudio[acodec=opus]/bestaudio/best',
+        'noplaylist': True,
+        'quiet': True,
+        'no_warnings': True,
+        'outtmpl': '%(id)s.%(ext)s',
+        'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'opus'}],
+    },
+}
+
+# 回傳給主行程的欄位 (完整的 info dict 很大，只挑需要的減少行程間傳輸)
+_STREAM_FIELDS = ('id', 'title', 'webpage_url', 'url', 'duration', 'format_id', 'ext', 'acodec', 'abr', 'asr', 'extractor', 'http_headers')
+_ENTRY_FIELDS = ('id', 'title', 'url', 'duration')
+
+
+class ExtractionError(Exception):
+    """yt-dlp 解析失敗 (訊息為工作行程中的原始錯誤)"""
+
+
+class ExtractionTimeout(ExtractionError):
+    """解析超過時間限制，工作行程已被重新啟動"""
+
+
+# =========================================================
+# 工作行程端
+# =========================================================
+
+def _trim(profile: str, info: Dict[str, Any]) -> Dict[str, Any]:
+    if profile == 'title':
+        return {'title': info.get('title')}
+    if profile == 'download':
+        downloads = info.get('requested_downloads') or [{}]
+        return {'id': info.get('id'), 'title': info.get('title'), 'filepath': downloads[0].get('filepath')}
+    result = {k: info.get(k) for k in _STREAM_FIELDS if k in info}
+    if 'entries' in info:
+        result['entries'] = [
+            {k: entry.get(k) for k in _ENTRY_FIELDS}
+            for entry in info['entries'] if entry
+        ]
+    return result
+
+
+def _run_job(ydls: Dict[str, Any], profile: str, url: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    import yt_dlp
+
+    ydl = ydls.get(profile)
+    if ydl is None:
+        ydl = ydls[profile] = yt_dlp.YoutubeDL(PROFILES[profile])
+
+    # 單次請求的額外設定 (例如 playlist_items 分頁)：暫時套用在常駐的實例上，結束後還原
+    saved = {k: ydl.params.get(k) for k in (options or {})}
+    ydl.params.update(options or {})
+    try:
+        if profile == 'title':
+            info = ydl.extract_info(url, download=False, process=False)
+        elif profile == 'download':
+            info = ydl.extract_info(url, download=True)
+        else:
+            info = ydl.extract_info(url, download=False)
+            if profile == 'stream' and not info.get('url'):
+                info = ydl.extract_info(url, download=True)
+        return _trim(profile, ydl.sanitize_info(info))
+    finally:
+        ydl.params.update(saved)
+
+
+def _worker_main(conn):
+    """工作行程主迴圈：接收 (profile, url, options)，回傳 (True, 結果) 或 (False, 錯誤訊息)"""
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C 由主行程處理
+    ydls: Dict[str, Any] = {}
+    try:
+        import yt_dlp
+        # 預先建立各 profile 的 YoutubeDL，讓第一次解析不用等 import 與初始化
+        for name, opts in PROFILES.items():
+            ydls[name] = yt_dlp.YoutubeDL(opts)
+    except ImportError:
+        pass
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        profile, url, options = job
+        try:
+            conn.send((True, _run_job(ydls, profile, url, options)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+# =========================================================
+# 主行程端
+# =========================================================
+
+class _Worker:
+    """一個工作行程與它的管線"""
+    __slots__ = ('id', 'process', 'conn', 'jobs', 'started_at')
+
+    def __init__(self, worker_id: int, ctx):
+        parent, child = ctx.Pipe()
+        self.id = worker_id
+        self.conn = parent
+        self.process = ctx.Process(target=_worker_main, args=(child,), daemon=True, name=f"media-extractor-{worker_id}")
+        self.process.start()
+        child.close()
+        self.jobs = 0
+        self.started_at = time.time()
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+
+
+class ExtractionService:
+    """
+    yt-dlp 解析服務。請求進入佇列，由 N 個常駐工作行程依序處理。
+    - 逾時：終止該工作行程並重新啟動，請求以 ExtractionTimeout 失敗
+    - 取消：尚未開始的請求直接丟棄；執行中的請求會終止工作行程 (例如跳過歌曲時不必等解析完)
+    - 健康檢查：工作行程意外結束或處理次數達上限時自動重新啟動
+    """
+
+    def __init__(self, workers: int = EXTRACT_WORKERS, timeout: float = EXTRACT_TIMEOUT):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context('spawn')
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pool: Dict[int, _Worker] = {}
+        self._ids = itertools.count(1)
+        self.stats = {'completed': 0, 'failed': 0, 'timeouts': 0, 'cancelled': 0, 'restarts': 0}
+
+    def _ensure_started(self):
+        self._queue = self._queue or asyncio.Queue()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._dispatch(slot)) for slot in range(self.workers)]
+            logging.info(f"yt-dlp 解析服務已啟動 ({self.workers} 個工作行程)。")
+            return
+        # 只替換已結束的分派協程；仍在執行的不能重建，否則兩個協程會共用同一條管線
+        for slot, task in enumerate(self._tasks):
+            if task.done():
+                if not task.cancelled() and task.exception() is not None:
+                    logging.error(f"yt-dlp 分派協程 #{slot} 異常結束: {task.exception()!r}")
+                self._tasks[slot] = asyncio.create_task(self._dispatch(slot))
+
+    async def extract(self, url: str, profile: str = 'stream', timeout: Optional[float] = None,
+                      options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        送出一次解析請求並等待結果。呼叫端的 Task 被取消時，請求也會一併取消。
+        options 會暫時覆蓋該 profile 的 yt-dlp 設定 (只對這次請求有效)。
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"未知的解析設定: {profile}")
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((profile, url, options, timeout or self.timeout, future))
+        return await future
+
+    # --- 工作行程管理 ---
+
+    def _spawn(self, slot: int) -> _Worker:
+        worker = _Worker(next(self._ids), self._ctx)
+        self._pool[slot] = worker
+        return worker
+
+    def _restart(self, slot: int, reason: str, respawn: bool = True):
+        """終止工作行程；respawn 時立刻啟動新的，讓下一個請求不必等 import 與初始化"""
+        old = self._pool.pop(slot, None)
+        if old is not None:
+            old.kill()
+            action = "重新啟動" if respawn else "停止"
+            logging.warning(f"{action} yt-dlp 工作行程 #{old.id} ({reason})。")
+        if respawn:
+            self._spawn(slot)
+            self.stats['restarts'] += 1
+
+    async def _dispatch(self, slot: int):
+        """每個工作行程對應一個分派協程，一次只交給它一個請求"""
+        loop = asyncio.get_running_loop()
+        if slot not in self._pool:
+            await loop.run_in_executor(None, self._spawn, slot)
+        while True:
+            profile, url, options, timeout, future = await self._queue.get()
+            if future.done(): # 排隊時已被取消
+                self.stats['cancelled'] += 1
+                continue
+
+            worker = self._pool.get(slot)
+            if worker is None or not worker.alive():
+                await loop.run_in_executor(None, self._restart, slot, "行程已結束")
+                worker = self._pool[slot]
+
+            try:
+                worker.conn.send((profile, url, options))
+                deadline = loop.time() + timeout
+                while True:
+                    if future.done(): # 執行中被取消
+                        self.stats['cancelled'] += 1
+                        await loop.run_in_executor(None, self._restart, slot, "請求已取消")
+                        break
+                    if await loop.run_in_executor(None, worker.conn.poll, WORKER_POLL_INTERVAL):
+                        ok, payload = worker.conn.recv()
+                        worker.jobs += 1
+                        if future.done(): # 等待結果期間被取消 (工作行程已空閒，不必重新啟動)
+                            self.stats['cancelled'] += 1
+                        elif ok:
+                            self.stats['completed'] += 1
+                            future.set_result(payload)
+                        else:
+                            self.stats['failed'] += 1
+                            future.set_exception(ExtractionError(payload))
+                        if worker.jobs >= WORKER_MAX_JOBS:
+                            await loop.run_in_executor(None, self._restart, slot, f"已處理 {worker.jobs} 次")
+                        break
+                    if loop.time() > deadline:
+                        self.stats['timeouts'] += 1
+                        await loop.run_in_executor(None, self._restart, slot, f"逾時 {timeout:g} 秒")
+                        if not future.done():
+                            future.set_exception(ExtractionTimeout(f"解析逾時 ({timeout:g} 秒)"))
+                        break
+            except (EOFError, OSError, BrokenPipeError) as e:
+                self.stats['failed'] += 1
+                await loop.run_in_executor(None, self._restart, slot, f"管線錯誤: {e}")
+                if not future.done():
+                    future.set_exception(ExtractionError(f"工作行程異常結束: {e}"))
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+
+    @property
+    def backlog(self) -> int:
+        """排隊中尚未交給工作行程的請求數"""
+        return self._queue.qsize() if self._queue else 0
+
+    def health(self) -> Dict[str, Any]:
+        """目前的工作行程狀態與累計統計"""
+        now = time.time()
+        return {
+            'workers': [
+                {'slot': slot, 'id': w.id, 'alive': w.alive(), 'jobs': w.jobs, 'uptime': now - w.started_at}
+                for slot, w in sorted(self._pool.items())
+            ],
+            'queued': self.backlog,
+            **self.stats,
+        }
+
+    async def close(self):
+        """停止分派協程並結束所有工作行程；之後的請求會重新啟動服務"""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        for slot in list(self._pool):
+            await asyncio.to_thread(self._restart, slot, "服務關閉", False)
+
+
+_service: Optional[ExtractionService] = None
+
+
+def get_extractor() -> ExtractionService:
+    """兩個音樂 Cog 共用的解析服務 (MusicPlay 卸載時關閉，下一次請求時再啟動工作行程)"""
+    global _service
+    if _service is None:
+        _service = ExtractionService()
+    return _service
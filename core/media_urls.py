@@ -0,0 +1,124 @@
+import re
+from typing import Optional
+from urllib.parse import urlparse, parse_qs, urlencode, parse_qsl
+
+# =========================================================
+# 媒體網址正規化
+# 同一首歌在 YouTube / YouTube Music / SoundCloud / Spotify 有很多種網址寫法
+# (短網址、行動版、?t=30、?si=分享追蹤碼...)。canonical_media_id 把它們轉成同一個識別鍵，
+# 用於查重與快取；無法辨識的網址由 canonical_url 做一般性的整理。
+# =========================================================
+
+_YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+                  'youtube-nocookie.com', 'www.youtube-nocookie.com')
+_YOUTUBE_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_YOUTUBE_PATH_PREFIXES = ('/shorts/', '/embed/', '/live/', '/v/')
+
+_SOUNDCLOUD_HOSTS = ('soundcloud.com', 'www.soundcloud.com', 'm.soundcloud.com')
+_SOUNDCLOUD_RESERVED = ('discover', 'search', 'stream', 'upload', 'you', 'charts', 'pages', 'settings')
+
+_SPOTIFY_KINDS = ('track', 'album', 'playlist', 'episode', 'show', 'artist')
+_SPOTIFY_ID = re.compile(r'^[A-Za-z0-9]{22}$')
+_SPOTIFY_URI = re.compile(r'^spotify:(' + '|'.join(_SPOTIFY_KINDS) + r'):([A-Za-z0-9]{22})$')
+
+# 不影響內容的追蹤 / 分享參數
+_TRACKING_PARAMS = ('si', 'feature', 'fbclid', 'gclid', 'igshid', 'ref', 'ref_src', 'pp')
+
+
+def _parse(url: str):
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None, ''
+    return parsed, (parsed.hostname or '').lower()
+
+
+def youtube_id(url: str) -> Optional[str]:
+    """YouTube / YouTube Music 的影片 ID (watch?v=、youtu.be、shorts、embed、live)；不是影片時回傳 None"""
+    parsed, host = _parse(url)
+    if parsed is None:
+        return None
+    candidate = None
+    if host == 'youtu.be':
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    elif host in _YOUTUBE_HOSTS:
+        if parsed.path == '/watch':
+            candidate = parse_qs(parsed.query).get('v', [None])[0]
+        elif parsed.path.startswith(_YOUTUBE_PATH_PREFIXES):
+            candidate = parsed.path.split('/')[2]
+    if candidate and _YOUTUBE_ID.match(candidate):
+        return candidate
+    return None
+
+
+def soundcloud_path(url: str) -> Optional[str]:
+    """SoundCloud 的 '使用者/曲目' (或 '使用者/sets/清單')，小寫、去掉查詢參數；其他頁面回傳 None"""
+    parsed, host = _parse(url)
+    if parsed is None or host not in _SOUNDCLOUD_HOSTS:
+        return None
+    parts = [part for part in parsed.path.lower().split('/') if part]
+    if len(parts) < 2 or parts[0] in _SOUNDCLOUD_RESERVED:
+        return None
+    if parts[1] == 'sets' and len(parts) >= 3:
+        return '/'.join(parts[:3])
+    if parts[1] in ('sets', 'likes', 'tracks', 'albums', 'reposts', 'followers', 'following'):
+        return None # 使用者頁面的分頁，不是單一曲目
+    return '/'.join(parts[:2])
+
+
+def spotify_id(url: str) -> Optional[str]:
+    """Spotify 的 '種類:ID' (track:xxxx)，支援 open.spotify.com (含 /intl-xx/) 與 spotify: URI"""
+    match = _SPOTIFY_URI.match(url.strip())
+    if match:
+        return f"{match.group(1)}:{match.group(2)}"
+    parsed, host = _parse(url)
+    if parsed is None or host != 'open.spotify.com':
+        return None
+    parts = [part for part in parsed.path.split('/') if part]
+    if parts and parts[0].startswith('intl-'):
+        parts = parts[1:]
+    if len(parts) >= 2 and parts[0] in _SPOTIFY_KINDS and _SPOTIFY_ID.match(parts[1]):
+        return f"{parts[0]}:{parts[1]}"
+    return None
+
+
+def canonical_media_id(url: str) -> Optional[str]:
+    """
+    可辨識平台的識別鍵：youtube:<影片ID>、soundcloud:<使用者/曲目>、spotify:<種類:ID>。
+    YouTube Music 與 YouTube 是同一部影片，使用相同的鍵。無法辨識時回傳 None。
+    """
+    video = youtube_id(url)
+    if video:
+        return f"youtube:{video}"
+    track = soundcloud_path(url)
+    if track:
+        return f"soundcloud:{track}"
+    item = spotify_id(url)
+    if item:
+        return f"spotify:{item}"
+    return None
+
+
+def canonical_url(url: str) -> str:
+    """
+    查重用的鍵：可辨識的媒體用 canonical_media_id；其他網址統一主機名稱大小寫、去掉 www.、
+    #片段、結尾斜線與追蹤參數 (utm_* 等)，剩下的查詢參數依名稱排序。
+    """
+    media_id = canonical_media_id(url)
+    if media_id:
+        return media_id
+    parsed, host = _parse(url)
+    if parsed is None or not host:
+        return url.strip()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key not in _TRACKING_PARAMS and not key.startswith('utm_')
+    )
+    try:
+        port = f":{parsed.port}" if parsed.port else ''
+    except ValueError:
+        port = ''
+    path = parsed.path.rstrip('/')
+    return f"{host}{port}{path}" + (f"?{urlencode(query)}" if query else '')
@@ -0,0 +1,301 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from core.media_urls import canonical_url
+
+# =========================================================
+# 音樂分享清單 (SQLite)
+# 取代 data/music_list.json：新增、查重、分頁、搜尋、刪除都只碰到需要的資料列，
+# 清單成長到數萬首時指令仍維持固定的速度。
+# - WAL 模式：讀取 (分頁、搜尋) 不會被寫入擋住
+# - canonical_url 唯一索引：同一首歌的不同網址形式只會存一次 (見 core/media_urls.py)
+#   另在記憶體保留 canonical_url -> id 的雜湊索引，查重不必進資料庫
+# - FTS5 trigram 索引：標題搜尋支援中日韓文字 (不需要斷詞)
+# 所有方法都是同步的，Cog 以 asyncio.to_thread 呼叫。
+# =========================================================
+
+MUSIC_DB_FILE = './data/music_library.db'
+LEGACY_MUSIC_FILE = './data/music_list.json' # 舊版清單，第一次開啟資料庫時自動匯入
+
+SCHEMA_VERSION = 2 # 2: canonical_url 改用 core/media_urls.py (支援 SoundCloud / Spotify 與更多 YouTube 網址)
+_TRIGRAM_MIN_CHARS = 3 # trigram 索引至少要 3 個字元；更短的關鍵字改用 LIKE
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id            INTEGER PRIMARY KEY,
+    canonical_url TEXT NOT NULL,
+    url           TEXT NOT NULL,
+    title         TEXT NOT NULL DEFAULT '',
+    posted_by     TEXT NOT NULL DEFAULT '',
+    posted_at     TEXT NOT NULL DEFAULT ''
+);
+CREATE UNIQUE INDEX IF NOT EXISTS songs_canonical_url ON songs(canonical_url);
+CREATE INDEX IF NOT EXISTS songs_posted_at ON songs(posted_at DESC, id DESC);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+    title, content='songs', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS songs_ai AFTER INSERT ON songs BEGIN
+    INSERT INTO songs_fts(rowid, title) VALUES (new.id, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_ad AFTER DELETE ON songs BEGIN
+    INSERT INTO songs_fts(songs_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_au AFTER UPDATE OF title ON songs BEGIN
+    INSERT INTO songs_fts(songs_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    INSERT INTO songs_fts(rowid, title) VALUES (new.id, new.title);
+END;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# 清單的排列順序：最新分享的在前 (與舊版 JSON 相同)
+_ORDER = "ORDER BY posted_at DESC, id DESC"
+_COLUMNS = "id, title, url, posted_by, posted_at"
+
+
+def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+    """資料列 -> 與舊版 JSON 相同格式的 dict (空白欄位省略，讓 .get(key, 預設值) 照常運作)"""
+    entry = {
+        'id': row['id'], 'title': row['title'], 'url': row['url'],
+        'posted_by': row['posted_by'], 'timestamp': row['posted_at'],
+    }
+    return {key: value for key, value in entry.items() if value != ''}
+
+
+class MusicLibrary:
+    def __init__(self, path: str = MUSIC_DB_FILE, legacy_path: Optional[str] = LEGACY_MUSIC_FILE):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock() # 同一個連線給多個執行緒使用，一次只執行一個操作
+        self._conn: Optional[sqlite3.Connection] = None
+        self._ids: Dict[str, int] = {} # canonical_url -> 資料列 id (與資料表同步)
+
+    # --- 連線 / 結構 ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            conn.commit()
+            self._conn = conn
+            self._upgrade_schema()
+            self._migrate_legacy()
+            self._ids = dict(conn.execute("SELECT canonical_url, id FROM songs").fetchall())
+        return self._conn
+
+    def open(self):
+        """開啟資料庫並載入查重索引 (Cog 載入時在執行緒中先呼叫，之後 contains() 不需要 I/O)"""
+        with self._lock:
+            self._connect()
+
+    def _upgrade_schema(self):
+        conn = self._conn
+        row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        version = int(row[0]) if row else None
+        if version is not None and version < 2:
+            self._rekey()
+        conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+        conn.commit()
+
+    def _rekey(self):
+        """以新的正規化規則重算 canonical_url；變成重複的歌曲保留最早加入的一筆"""
+        conn = self._conn
+        seen = set()
+        removed = 0
+        with conn:
+            conn.execute("DROP INDEX IF EXISTS songs_canonical_url")
+            for song_id, url in conn.execute("SELECT id, url FROM songs ORDER BY id").fetchall():
+                key = canonical_url(url)
+                if key in seen:
+                    conn.execute("DELETE FROM songs WHERE id = ?", (song_id,))
+                    removed += 1
+                    continue
+                seen.add(key)
+                conn.execute("UPDATE songs SET canonical_url = ? WHERE id = ?", (key, song_id))
+            conn.execute("CREATE UNIQUE INDEX songs_canonical_url ON songs(canonical_url)")
+        logging.info(f"已更新音樂清單的網址正規化 ({len(seen)} 首，移除 {removed} 首重複)")
+
+    def _migrate_legacy(self):
+        """一次性匯入舊的 music_list.json，完成後改名為 .migrated 保留備份"""
+        conn = self._conn
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone():
+            return
+        try:
+            with open(self.legacy_path, 'r', encoding='utf8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            logging.error(f"讀取舊音樂清單 {self.legacy_path} 失敗，略過匯入: {e}")
+            return
+
+        inserted = self._insert_many(
+            (entry.get('url', ''), entry.get('title', ''), entry.get('posted_by', ''), entry.get('timestamp', ''))
+            for entry in entries if isinstance(entry, dict) and entry.get('url')
+        )
+        conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('legacy_migrated', ?)", (str(inserted),))
+        conn.commit()
+        try:
+            os.replace(self.legacy_path, self.legacy_path + '.migrated')
+        except OSError as e:
+            logging.warning(f"舊音樂清單改名失敗 (已匯入，不影響使用): {e}")
+        logging.info(f"已將 {self.legacy_path} 的 {inserted} / {len(entries)} 筆紀錄匯入 {self.path}")
+
+    def _insert_many(self, rows: Iterable[Tuple[str, str, str, str]]) -> int:
+        """(url, title, posted_by, posted_at)；已存在的 (相同 canonical_url) 略過，回傳新增數量"""
+        conn = self._conn
+        inserted = 0
+        for url, title, posted_by, posted_at in rows:
+            key = canonical_url(url)
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO songs(canonical_url, url, title, posted_by, posted_at) VALUES (?, ?, ?, ?, ?)",
+                (key, url, title or '', posted_by or '', posted_at or '')
+            )
+            if cursor.rowcount > 0:
+                self._ids[key] = cursor.lastrowid
+                inserted += 1
+        return inserted
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- 查詢 ---
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+    def contains(self, url: str) -> bool:
+        """O(1) 查重 (記憶體索引)；youtu.be/X、watch?v=X&t=30、music.youtube.com/watch?v=X 視為同一首"""
+        if self._conn is None:
+            self.open()
+        return canonical_url(url) in self._ids
+
+    def find(self, url: str) -> Optional[Dict[str, Any]]:
+        """清單中與 url 相同的歌曲 (依正規化後的網址比對)"""
+        if self._conn is None:
+            self.open()
+        song_id = self._ids.get(canonical_url(url))
+        if song_id is None:
+            return None
+        with self._lock:
+            row = self._connect().execute(f"SELECT {_COLUMNS} FROM songs WHERE id = ?", (song_id,)).fetchone()
+            return _row_to_entry(row) if row else None
+
+    def page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """清單的一頁 (依分享時間由新到舊，走 posted_at 索引)"""
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {_COLUMNS} FROM songs {_ORDER} LIMIT ? OFFSET ?", (limit, max(0, offset))
+            ).fetchall()
+            return [_row_to_entry(row) for row in rows]
+
+    def _search_clause(self, keyword: str) -> Tuple[str, tuple]:
+        keyword = keyword.strip()
+        if len(keyword) >= _TRIGRAM_MIN_CHARS:
+            phrase = '"' + keyword.replace('"', '""') + '"'
+            return "id IN (SELECT rowid FROM songs_fts WHERE songs_fts MATCH ?)", (phrase,)
+        escaped = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return "title LIKE ? ESCAPE '\\'", (f"%{escaped}%",)
+
+    def search(self, keyword: str, offset: int, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """標題包含關鍵字 (不分大小寫) 的歌曲：回傳 (總數, 這一頁)"""
+        where, params = self._search_clause(keyword)
+        with self._lock:
+            conn = self._connect()
+            total = conn.execute(f"SELECT COUNT(*) FROM songs WHERE {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM songs WHERE {where} {_ORDER} LIMIT ? OFFSET ?",
+                params + (limit, max(0, offset))
+            ).fetchall()
+            return total, [_row_to_entry(row) for row in rows]
+
+    def random(self) -> Optional[Dict[str, Any]]:
+        """隨機一首：在 id 範圍內隨機取一點，往後找第一筆 (走主鍵索引，不載入整張表)"""
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT {_COLUMNS} FROM songs "
+                "WHERE id >= (SELECT abs(random()) % (MAX(id) - MIN(id) + 1) + MIN(id) FROM songs) "
+                "ORDER BY id LIMIT 1"
+            ).fetchone()
+            return _row_to_entry(row) if row else None
+
+    def shuffled(self, limit: int) -> List[Dict[str, Any]]:
+        """隨機排序的最多 limit 首 (/playlist 使用)"""
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {_COLUMNS} FROM songs ORDER BY random() LIMIT ?", (limit,)
+            ).fetchall()
+            return [_row_to_entry(row) for row in rows]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """meta 表的設定值 (例如 /importmusic 的匯入進度)；不存在時回傳 None"""
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    # --- 寫入 ---
+
+    def add(self, url: str, title: str, posted_by: str, posted_at: str) -> bool:
+        """新增一首；已存在 (相同 canonical_url) 時回傳 False"""
+        return self.add_many([(url, title, posted_by, posted_at)]) == 1
+
+    def add_many(self, rows: Iterable[Tuple[str, str, str, str]], meta: Optional[Dict[str, str]] = None) -> int:
+        """
+        一次交易新增多首 (url, title, posted_by, posted_at)，回傳新增數量。
+        meta 會在同一個交易中寫入 (例如匯入進度)，確保進度與資料一致。
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    inserted = self._insert_many(rows)
+                    for key, value in (meta or {}).items():
+                        conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+                    return inserted
+            except Exception:
+                # 交易已回滾：記憶體索引重新與資料表同步
+                self._ids = dict(conn.execute("SELECT canonical_url, id FROM songs").fetchall())
+                raise
+
+    def remove_at(self, number: int) -> Optional[Dict[str, Any]]:
+        """刪除清單中第 number 首 (從 1 開始，與 /musiclist 的編號相同)；編號無效時回傳 None"""
+        if number < 1:
+            return None
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute(
+                    f"SELECT {_COLUMNS}, canonical_url FROM songs {_ORDER} LIMIT 1 OFFSET ?", (number - 1,)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("DELETE FROM songs WHERE id = ?", (row['id'],))
+            self._ids.pop(row['canonical_url'], None)
+            return _row_to_entry(row)
+
+
+_library: Optional[MusicLibrary] = None
+
+
+def get_music_library() -> MusicLibrary:
+    """兩個音樂 Cog 共用的清單資料庫"""
+    global _library
+    if _library is None:
+        _library = MusicLibrary()
+    return _library
@@ -0,0 +1,233 @@
+import random
+from collections import Counter, deque
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse, parse_qs
+
+from core.media_extractor import get_extractor
+
+# =========================================================
+# 播放佇列
+# 佇列可能一次放進上千首 (播放清單、music_list.json)，項目使用 __slots__ 精簡記憶體，
+# 點歌者只存 ID (需要顯示名稱時再向伺服器查詢)，不保留整個 discord.Member。
+# =========================================================
+
+PLAYLIST_PAGE_SIZE = 50  # 每次從播放清單展開的首數
+PLAYLIST_LOW_WATER = 3   # 佇列前幾首內出現未展開的播放清單時就先載入下一頁
+
+
+class QueuedSong:
+    """佇列中的一首歌"""
+    __slots__ = ('title', 'webpage_url', 'requester_id')
+
+    def __init__(self, title: str, webpage_url: str, requester_id: int):
+        self.title = title
+        self.webpage_url = webpage_url
+        self.requester_id = requester_id
+
+
+class PlaylistCursor:
+    """
+    大型播放清單中尚未展開的部分。佔住佇列中的一個位置，
+    播放到附近時再從 next_index 起抓下一頁，展開的歌曲插在它前面。
+    """
+    __slots__ = ('url', 'title', 'requester_id', 'next_index')
+
+    def __init__(self, url: str, title: str, requester_id: int, next_index: int):
+        self.url = url
+        self.title = title
+        self.requester_id = requester_id
+        self.next_index = next_index # 下一頁第一首的位置 (從 1 開始，與 yt-dlp 的 playlist_items 相同)
+
+
+QueueItem = Union[QueuedSong, PlaylistCursor]
+
+
+class MusicQueue:
+    """
+    每個伺服器的播放佇列 (deque + 網址計數索引)。
+    - 取出下一首 / 加到尾端為 O(1)；依位置移除、插入以 rotate 完成，只移動較短的一側
+    - 網址計數讓「是否已在佇列中」為 O(1)，也供 dedupe 使用
+    - page() 只走訪需要的那一段，不複製整個佇列
+    位置一律從 0 開始 (指令層再換成從 1 開始的編號)。
+    """
+
+    def __init__(self, items: Iterable[QueueItem] = ()):
+        self._items: deque = deque()
+        self._urls: Counter = Counter()
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def __iter__(self) -> Iterator[QueueItem]:
+        return iter(self._items)
+
+    def __getitem__(self, pos: int) -> QueueItem:
+        return self._items[pos]
+
+    # --- 網址索引 ---
+
+    def _index_add(self, item: QueueItem):
+        if isinstance(item, QueuedSong):
+            self._urls[item.webpage_url] += 1
+
+    def _index_drop(self, item: QueueItem):
+        if isinstance(item, QueuedSong):
+            self._urls[item.webpage_url] -= 1
+            if self._urls[item.webpage_url] <= 0:
+                del self._urls[item.webpage_url]
+
+    def contains_url(self, url: str) -> bool:
+        return url in self._urls
+
+    @property
+    def song_count(self) -> int:
+        """已展開的歌曲數 (不含播放清單 cursor)"""
+        return sum(self._urls.values())
+
+    # --- 基本操作 ---
+
+    def append(self, item: QueueItem):
+        self._items.append(item)
+        self._index_add(item)
+
+    def extend(self, items: Iterable[QueueItem]):
+        for item in items:
+            self.append(item)
+
+    def peek(self) -> Optional[QueueItem]:
+        return self._items[0] if self._items else None
+
+    def popleft(self) -> QueueItem:
+        item = self._items.popleft()
+        self._index_drop(item)
+        return item
+
+    def clear(self):
+        self._items.clear()
+        self._urls.clear()
+
+    def index(self, item: QueueItem) -> Optional[int]:
+        """以物件本身 (而非內容) 找出位置，找不到回傳 None"""
+        for pos, candidate in enumerate(self._items):
+            if candidate is item:
+                return pos
+        return None
+
+    def page(self, start: int, count: int) -> List[QueueItem]:
+        return list(islice(self._items, start, start + count))
+
+    # --- 依位置操作 ---
+
+    def _check(self, pos: int):
+        if not 0 <= pos < len(self._items):
+            raise IndexError(f"佇列中沒有第 {pos + 1} 首")
+
+    def remove_at(self, pos: int) -> QueueItem:
+        self._check(pos)
+        self._items.rotate(-pos)
+        item = self._items.popleft()
+        self._items.rotate(pos)
+        self._index_drop(item)
+        return item
+
+    def insert_at(self, pos: int, items: List[QueueItem]):
+        """在 pos 前插入多個項目 (維持原本順序)"""
+        pos = max(0, min(pos, len(self._items)))
+        self._items.rotate(-pos)
+        self._items.extendleft(reversed(items))
+        self._items.rotate(pos)
+        for item in items:
+            self._index_add(item)
+
+    def move(self, src: int, dst: int) -> QueueItem:
+        """把 src 位置的項目移到 dst 位置"""
+        self._check(src)
+        self._check(dst)
+        item = self.remove_at(src)
+        self.insert_at(dst, [item])
+        return item
+
+    # --- 整體操作 ---
+
+    def shuffle(self):
+        items = list(self._items)
+        random.shuffle(items)
+        self._items = deque(items)
+
+    def dedupe(self) -> int:
+        """移除重複的歌曲 (保留最前面的一首)，回傳移除數量"""
+        seen = set()
+        kept = deque()
+        for item in self._items:
+            if isinstance(item, QueuedSong):
+                if item.webpage_url in seen:
+                    continue
+                seen.add(item.webpage_url)
+            kept.append(item)
+        removed = len(self._items) - len(kept)
+        self._items = kept
+        self._urls = Counter({url: 1 for url in seen})
+        return removed
+
+
+def is_playlist_url(url: str) -> bool:
+    """YouTube 播放清單 / 合輯網址 (list=...)；單一影片或關鍵字搜尋回傳 False"""
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return False
+    if not parsed.scheme.startswith('http'):
+        return False
+    host = (parsed.hostname or '').lower()
+    if not (host == 'youtu.be' or host.endswith('youtube.com')):
+        return False
+    return bool(parse_qs(parsed.query).get('list'))
+
+
+async def fetch_playlist_page(url: str, start: int, count: int = PLAYLIST_PAGE_SIZE) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    只展開播放清單的第 start ~ start+count-1 首 (扁平資訊，不解析串流)。
+    回傳 (清單標題, 項目)；項目少於 count 表示已到清單結尾。
+    """
+    info = await get_extractor().extract(
+        url, 'search', timeout=60,
+        options={'playlist_items': f"{start}-{start + count - 1}"}
+    )
+    entries = [entry for entry in info.get('entries') or [] if entry and entry.get('url')]
+    return info.get('title') or 'N/A', entries
+
+
+def songs_from_entries(entries: List[Dict[str, Any]], requester_id: int) -> List[QueuedSong]:
+    return [QueuedSong(entry.get('title') or 'N/A', entry['url'], requester_id) for entry in entries]
+
+
+def item_to_record(item: QueueItem) -> List[Any]:
+    """佇列項目 -> 精簡的 JSON 紀錄：歌曲 ['s', 標題, 網址, 點歌者]，播放清單 ['p', 標題, 網址, 點歌者, 下一頁位置]"""
+    if isinstance(item, PlaylistCursor):
+        return ['p', item.title, item.url, item.requester_id, item.next_index]
+    return ['s', item.title, item.webpage_url, item.requester_id]
+
+
+def item_from_record(record: List[Any]) -> Optional[QueueItem]:
+    """item_to_record 的反向；格式不符時回傳 None"""
+    try:
+        if record[0] == 'p':
+            return PlaylistCursor(record[2], record[1], int(record[3]), int(record[4]))
+        if record[0] == 's':
+            return QueuedSong(record[1], record[2], int(record[3]))
+    except (IndexError, TypeError, ValueError):
+        pass
+    return None
+
+
+def next_cursor(queue: MusicQueue, limit: int = PLAYLIST_LOW_WATER) -> Optional[PlaylistCursor]:
+    """佇列前 limit 個位置內第一個未展開的播放清單 (沒有則為 None)"""
+    for item in islice(queue, limit):
+        if isinstance(item, PlaylistCursor):
+            return item
+    return None
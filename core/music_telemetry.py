@@ -0,0 +1,148 @@
+import bisect
+import json
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Optional
+
+from core.media_extractor import ExtractionTimeout
+
+# =========================================================
+# 音樂播放的效能統計 (只存在記憶體，重新啟動後歸零)
+# 每個階段一個延遲直方圖，另外依原因統計失敗次數。
+# 階段：
+#   search        /play 的搜尋 (yt-dlp 搜尋 / 播放清單第一頁)
+#   title         /savemusic 等取得影片標題
+#   playlist_page 播放中展開播放清單的下一頁
+#   resolve       取得串流網址 (含快取命中)
+#   first_audio   建立 FFmpeg 音訊來源到送出第一個封包
+#   gap           上一首結束到下一首第一個封包 (佇列還有歌時)
+#   time_to_audio 佇列原本是空的，點歌到第一個封包
+# =========================================================
+
+# 直方圖的區間上界 (秒)；最後一格是無限大
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60)
+RECENT_SAMPLES = 500 # 計算百分位數時使用的最近樣本數
+
+# (原因, 錯誤訊息中的關鍵字)；依序比對，第一個符合的為準
+_FAILURE_CAUSES = (
+    ('rate_limited', ('HTTP Error 429', 'Too Many Requests')),
+    ('age_restricted', ('confirm your age', 'age-restricted')),
+    ('geo_blocked', ('not available in your country', 'geo restriction', 'geo-restricted')),
+    ('private', ('Private video',)),
+    ('unavailable', ('Video unavailable', 'has been removed', 'This video is not available', 'does not exist')),
+    ('server_error', ('HTTP Error 5',)),
+    ('network', ('Connection reset', 'Temporary failure', 'Network is unreachable', 'SSL')),
+    ('ffmpeg', ('ffmpeg', 'FFmpeg', 'ClientException')),
+)
+
+
+def failure_cause(error: Exception) -> str:
+    """把例外歸類成失敗原因 (timeout、unavailable、rate_limited...)"""
+    if isinstance(error, ExtractionTimeout) or 'timed out' in str(error):
+        return 'timeout'
+    text = f"{type(error).__name__}: {error}"
+    for cause, needles in _FAILURE_CAUSES:
+        if any(needle in text for needle in needles):
+            return cause
+    return 'other'
+
+
+class LatencyHistogram:
+    """固定區間的延遲直方圖 + 最近 N 筆樣本 (用來算 p50 / p95)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: deque = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds: float):
+        seconds = max(0.0, seconds)
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else None,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'max': self.max if self.count else None,
+            # 累積計數 (le = 小於等於該秒數)，與 Prometheus 直方圖相同格式
+            'buckets': {
+                **{str(bound): sum(self.counts[:i + 1]) for i, bound in enumerate(self.buckets)},
+                '+Inf': self.count,
+            },
+        }
+
+
+class MusicTelemetry:
+    def __init__(self):
+        self.started_at = time.time()
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.failures: Dict[str, Counter] = {}
+
+    def observe(self, stage: str, seconds: float):
+        self.latency.setdefault(stage, LatencyHistogram()).observe(seconds)
+
+    def failure(self, stage: str, error: Exception) -> str:
+        cause = failure_cause(error)
+        self.failures.setdefault(stage, Counter())[cause] += 1
+        return cause
+
+    def timer(self, stage: str) -> '_Timer':
+        """with get_telemetry().timer('search'): ...  (成功時記錄延遲，例外時記錄失敗原因)"""
+        return _Timer(self, stage)
+
+    def reset(self):
+        self.__init__()
+
+    def export(self) -> Dict[str, Any]:
+        return {
+            'started_at': self.started_at,
+            'exported_at': time.time(),
+            'latency': {stage: hist.summary() for stage, hist in sorted(self.latency.items())},
+            'failures': {stage: dict(counter) for stage, counter in sorted(self.failures.items())},
+        }
+
+    def export_json(self) -> str:
+        return json.dumps(self.export(), ensure_ascii=False, indent=2)
+
+
+class _Timer:
+    def __init__(self, telemetry: MusicTelemetry, stage: str):
+        self.telemetry = telemetry
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.telemetry.observe(self.stage, time.monotonic() - self.started)
+        elif isinstance(exc, Exception):
+            self.telemetry.failure(self.stage, exc)
+        return False
+
+
+_telemetry: Optional[MusicTelemetry] = None
+
+
+def get_telemetry() -> MusicTelemetry:
+    """兩個音樂 Cog 與播放器共用的統計"""
+    global _telemetry
+    if _telemetry is None:
+        _telemetry = MusicTelemetry()
+    return _telemetry
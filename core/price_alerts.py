@@ -0,0 +1,190 @@
+import bisect
+import json
+import os
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# =========================================================
+# 價格到價提醒索引
+# 每支股票各維護一份「向上突破」與「向下跌破」的已排序門檻列表，
+# 新報價進來時只需從上一筆價格二分搜尋到新價格，成本為 O(log n + k)。
+# =========================================================
+
+PRICE_ALERTS_FILE = './data/price_alerts.json'
+
+ABOVE = 'above'
+BELOW = 'below'
+
+
+class _SortedThresholds:
+    """已排序的 (門檻, 提醒 ID) 平行列表，方便用 bisect 直接搜尋浮點數"""
+    __slots__ = ('prices', 'ids')
+
+    def __init__(self):
+        self.prices: List[float] = []
+        self.ids: List[int] = []
+
+    def add(self, price: float, alert_id: int):
+        i = bisect.bisect_right(self.prices, price)
+        self.prices.insert(i, price)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, price: float, alert_id: int):
+        lo = bisect.bisect_left(self.prices, price)
+        hi = bisect.bisect_right(self.prices, price)
+        for i in range(lo, hi):
+            if self.ids[i] == alert_id:
+                del self.prices[i]
+                del self.ids[i]
+                return
+
+    def pop_range(self, lo: int, hi: int) -> List[int]:
+        """移除並回傳 [lo, hi) 範圍內的提醒 ID"""
+        fired = self.ids[lo:hi]
+        del self.prices[lo:hi]
+        del self.ids[lo:hi]
+        return fired
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+
+class PriceAlertIndex:
+    """
+    使用者價格提醒的索引。提醒觸發一次後即自動移除。
+    """
+
+    def __init__(self, path: str = PRICE_ALERTS_FILE):
+        self.path = path
+        self._alerts: Dict[int, Dict[str, Any]] = {}
+        self._above: Dict[str, _SortedThresholds] = defaultdict(_SortedThresholds)
+        self._below: Dict[str, _SortedThresholds] = defaultdict(_SortedThresholds)
+        self._last_price: Dict[str, float] = {}
+        self._next_id = 1
+        self._load()
+
+    # --- 持久化 ---
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._next_id = int(data.get('next_id', 1))
+            self._last_price = {k: float(v) for k, v in data.get('last_prices', {}).items()}
+            for alert in data.get('alerts', []):
+                self._insert(alert)
+                self._next_id = max(self._next_id, alert['id'] + 1)
+        except Exception as e:
+            logging.error(f"讀取 {self.path} 失敗: {e}")
+
+    def save(self):
+        """將所有提醒與最後價格存入檔案"""
+        data = {
+            'next_id': self._next_id,
+            'last_prices': self._last_price,
+            'alerts': sorted(self._alerts.values(), key=lambda a: a['id']),
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"儲存 {self.path} 失敗: {e}")
+
+    # --- 新增 / 移除 ---
+
+    def _insert(self, alert: Dict[str, Any]):
+        self._alerts[alert['id']] = alert
+        side = self._above if alert['direction'] == ABOVE else self._below
+        side[alert['symbol']].add(alert['threshold'], alert['id'])
+
+    def add(self, user_id: int, symbol: str, threshold: float, current_price: Optional[float] = None) -> Dict[str, Any]:
+        """
+        新增提醒。方向由目前價格決定：門檻不低於現價為「向上突破」(等於現價時下一次評估即觸發)，否則為「向下跌破」。
+        最後價格只由 evaluate() 更新；呼叫前應先以 current_price 評估既有提醒，否則上一筆價格之後已穿越門檻的提醒會被略過。
+        """
+        if current_price is None:
+            current_price = self._last_price.get(symbol)
+        direction = ABOVE if current_price is None or threshold >= current_price else BELOW
+
+        alert = {
+            'id': self._next_id,
+            'user_id': user_id,
+            'symbol': symbol,
+            'direction': direction,
+            'threshold': float(threshold),
+            'created_at': datetime.now().isoformat(),
+        }
+        self._next_id += 1
+        self._insert(alert)
+        self.save()
+        return alert
+
+    def remove(self, alert_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """移除提醒；若指定 user_id，只能移除自己的提醒"""
+        alert = self._alerts.get(alert_id)
+        if not alert or (user_id is not None and alert['user_id'] != user_id):
+            return None
+        side = self._above if alert['direction'] == ABOVE else self._below
+        side[alert['symbol']].remove(alert['threshold'], alert_id)
+        del self._alerts[alert_id]
+        self.save()
+        return alert
+
+    def user_alerts(self, user_id: int) -> List[Dict[str, Any]]:
+        return sorted((a for a in self._alerts.values() if a['user_id'] == user_id), key=lambda a: (a['symbol'], a['threshold']))
+
+    def symbols(self) -> List[str]:
+        """目前有提醒的股票代碼"""
+        return sorted({a['symbol'] for a in self._alerts.values()})
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    # --- 評估 ---
+
+    def evaluate(self, symbol: str, price: float) -> List[Dict[str, Any]]:
+        """
+        以新價格評估單一股票的提醒，回傳 (並移除) 被觸發的提醒。
+        向上突破：門檻落在 [上一筆價格, 新價格]；向下跌破：門檻落在 [新價格, 上一筆價格]。
+        門檻等於上一筆價格的提醒一定是在該價格之後才新增的 (否則上一次評估已觸發)，所以包含端點不會重複通知。
+        沒有上一筆價格時，視為所有已達成條件的提醒都觸發。
+        """
+        last = self._last_price.get(symbol)
+        self._last_price[symbol] = float(price)
+        fired_ids: List[int] = []
+
+        above = self._above.get(symbol)
+        if above:
+            lo = 0 if last is None else bisect.bisect_left(above.prices, last)
+            hi = bisect.bisect_right(above.prices, price)
+            if hi > lo:
+                fired_ids += above.pop_range(lo, hi)
+
+        below = self._below.get(symbol)
+        if below:
+            lo = bisect.bisect_left(below.prices, price)
+            hi = len(below) if last is None else bisect.bisect_right(below.prices, last)
+            if hi > lo:
+                fired_ids += below.pop_range(lo, hi)
+
+        return [self._alerts.pop(alert_id) for alert_id in fired_ids]
+
+    def evaluate_many(self, prices: Dict[str, float]) -> Dict[int, List[Tuple[Dict[str, Any], float]]]:
+        """
+        一次評估多支股票的報價，依使用者分組回傳 (提醒, 觸發價格)，方便每人只發一則訊息。
+        最後價格有變動時也會存檔，重新啟動後才能從正確的價格開始判斷穿越。
+        """
+        by_user: Dict[int, List[Tuple[Dict[str, Any], float]]] = defaultdict(list)
+        changed = False
+        for symbol, price in prices.items():
+            changed = changed or self._last_price.get(symbol) != float(price)
+            for alert in self.evaluate(symbol, price):
+                by_user[alert['user_id']].append((alert, price))
+        if by_user or changed:
+            self.save()
+        return dict(by_user)
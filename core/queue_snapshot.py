@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from core.guild_player import GuildPlayer
+from core.music_queue import QueueItem, QueuedSong, item_to_record, item_from_record
+
+# =========================================================
+# 播放佇列快照
+# 定期把每個伺服器的佇列與正在播放的位置寫到磁碟，重新載入 Cog 或重新啟動後直接恢復播放。
+# 只存 ID、標題與網址 (不存 Member 物件或串流網址)；串流網址在輪到該首時才重新解析。
+# =========================================================
+
+QUEUE_SNAPSHOT_FILE = './data/music_queues.json'
+QUEUE_SNAPSHOT_INTERVAL = 30        # 定期快照的間隔 (秒)
+QUEUE_SNAPSHOT_MAX_AGE = 6 * 3600   # 超過這個時間的快照不恢復 (秒)
+RESUME_MIN_POSITION = 5             # 播放不到幾秒的歌從頭開始
+
+
+def snapshot_player(player: GuildPlayer) -> Optional[Dict[str, Any]]:
+    """
+    單一伺服器的快照：{text_channel, voice_channel, now_playing, position, queue, saved_at}。
+    沒有語音連線或沒有任何歌曲時回傳 None (不需要恢復)。
+    """
+    vc = player.guild.voice_client
+    if not vc or not vc.channel or (player.now_playing is None and not player.queue):
+        return None
+    return {
+        'text_channel': getattr(player.channel, 'id', None),
+        'voice_channel': vc.channel.id,
+        'now_playing': item_to_record(player.now_playing) if player.now_playing else None,
+        'position': round(player.position() or 0, 1) or None,
+        'queue': [item_to_record(item) for item in player.queue],
+        'saved_at': time.time(),
+    }
+
+
+def restore_items(snapshot: Dict[str, Any]) -> List[QueueItem]:
+    """快照 -> 佇列項目 (正在播放的那首放在最前面)"""
+    records = ([snapshot['now_playing']] if snapshot.get('now_playing') else []) + list(snapshot.get('queue') or [])
+    return [item for item in map(item_from_record, records) if item is not None]
+
+
+def resume_position(snapshot: Dict[str, Any], first: QueueItem) -> Optional[float]:
+    """恢復後第一首應從第幾秒開始 (不需要接續時為 None)"""
+    position = snapshot.get('position')
+    if not snapshot.get('now_playing') or not isinstance(first, QueuedSong) or not position:
+        return None
+    return position if position >= RESUME_MIN_POSITION else None
+
+
+class QueueSnapshotStore:
+    """music_queues.json：{guild_id: 快照}；內容沒變時不重寫檔案"""
+
+    def __init__(self, path: str = QUEUE_SNAPSHOT_FILE):
+        self.path = path
+        self._last_written: Optional[str] = None
+
+    def load(self) -> Dict[int, Dict[str, Any]]:
+        """讀取仍在有效期內的快照"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logging.error(f"讀取播放佇列快照 {self.path} 失敗: {e}")
+            return {}
+        now = time.time()
+        return {
+            int(guild_id): snapshot for guild_id, snapshot in data.items()
+            if now - snapshot.get('saved_at', 0) <= QUEUE_SNAPSHOT_MAX_AGE
+        }
+
+    def save(self, snapshots: Dict[int, Dict[str, Any]]) -> bool:
+        """寫入所有伺服器的快照 (取代整個檔案)；回傳是否真的寫入"""
+        # 比較時忽略 saved_at (播放中時 position 會變，仍會寫入)
+        content = json.dumps(
+            {str(k): {**v, 'saved_at': None} for k, v in snapshots.items()},
+            ensure_ascii=False, sort_keys=True
+        )
+        if content == self._last_written:
+            return False
+        tmp_path = self.path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf8') as f:
+                json.dump({str(k): v for k, v in snapshots.items()}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"儲存播放佇列快照 {self.path} 失敗: {e}")
+            return False
+        self._last_written = content
+        return True
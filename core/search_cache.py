@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from core.deferred_json import DeferredJsonWriter
+
+# =========================================================
+# /play 關鍵字搜尋結果快取
+# 正規化後的關鍵字 -> 搜尋到的影片 (標題、網址)，有效期 + LRU 數量上限，
+# 存在磁碟上，重新啟動後仍可使用；也提供 /play 的自動完成建議。
+# 命中、新增都只改記憶體，由 DeferredJsonWriter 合併後在執行緒中寫入。
+# =========================================================
+
+SEARCH_CACHE_FILE = './data/search_cache.json'
+SEARCH_CACHE_SIZE = 2000           # 最多保留幾組關鍵字
+SEARCH_CACHE_TTL = 7 * 86400       # 搜尋結果的有效期 (秒)
+AUTOCOMPLETE_LIMIT = 25            # Discord 自動完成最多 25 個選項
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    """全形轉半形、轉小寫、合併空白，讓「Lemon 米津玄師」與「lemon  米津玄師」視為相同的搜尋"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', query)).strip().casefold()
+
+
+def is_keyword_query(query: str) -> bool:
+    """網址由 yt-dlp 直接解析，不經過搜尋，不需要快取"""
+    return not re.match(r'^\w+://', query.strip())
+
+
+class SearchCache:
+    """
+    search_cache.json 格式：[{query, title, url, duration, cached_at, hits}, ...]
+    依最近使用的順序排列 (最舊的在前)，讀入後放在 OrderedDict 做 LRU。
+    """
+
+    def __init__(self, path: str = SEARCH_CACHE_FILE, capacity: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.path = path
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries: Optional['OrderedDict[str, Dict[str, Any]]'] = None
+        self._writer = DeferredJsonWriter(path, lambda: [dict(e) for e in self._load().values()], '搜尋快取')
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _load(self) -> 'OrderedDict[str, Dict[str, Any]]':
+        if self._entries is None:
+            entries = OrderedDict() # 讀完才指定給 self，preload 在執行緒中讀取時事件迴圈不會看到讀到一半的內容
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf8') as f:
+                        for entry in json.load(f):
+                            entries[entry['query']] = entry
+                except Exception as e:
+                    logging.error(f"讀取搜尋快取 {self.path} 失敗: {e}")
+            self._entries = entries
+        return self._entries
+
+    async def preload(self):
+        """在執行緒中讀取檔案 (Cog 載入時呼叫，之後的查詢與自動完成都只讀記憶體)"""
+        await asyncio.to_thread(self._load)
+
+    async def flush(self):
+        await self._writer.flush()
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry.get('cached_at', 0) > self.ttl
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        """仍在有效期內的搜尋結果 (命中時移到最近使用)"""
+        key = normalize_query(query)
+        entries = self._load()
+        entry = entries.get(key)
+        if entry is None or self._expired(entry, time.time()):
+            if entry is not None:
+                del entries[key]
+                self._writer.mark_dirty()
+            self.stats['misses'] += 1
+            return None
+        entry['hits'] = entry.get('hits', 0) + 1
+        entries.move_to_end(key)
+        self._writer.mark_dirty()
+        self.stats['hits'] += 1
+        return entry
+
+    def put(self, query: str, title: str, url: str, duration: Optional[float] = None):
+        key = normalize_query(query)
+        if not key or not url:
+            return
+        entries = self._load()
+        previous = entries.pop(key, None)
+        entries[key] = {
+            'query': key, 'title': title, 'url': url, 'duration': duration,
+            'cached_at': time.time(), 'hits': previous.get('hits', 0) if previous else 0,
+        }
+        while len(entries) > self.capacity:
+            entries.popitem(last=False)
+        self._writer.mark_dirty()
+
+    def invalidate(self, query: str) -> bool:
+        """移除一組關鍵字的快取結果；回傳是否有移除"""
+        if self._load().pop(normalize_query(query), None) is None:
+            return False
+        self._writer.mark_dirty()
+        return True
+
+    def invalidate_url(self, url: str) -> int:
+        """移除所有指向這個網址的搜尋結果 (影片已刪除或無法播放時)；回傳移除的數量"""
+        entries = self._load()
+        stale = [key for key, entry in entries.items() if entry.get('url') == url]
+        for key in stale:
+            self.invalidate(key)
+        return len(stale)
+
+    def suggest(self, prefix: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[Dict[str, Any]]:
+        """
+        自動完成：關鍵字或標題包含輸入內容的快取結果，開頭相符的優先，其次依命中次數。
+        輸入為空時列出最近使用的搜尋。
+        """
+        needle = normalize_query(prefix)
+        now = time.time()
+        live = [entry for entry in reversed(self._load().values()) if not self._expired(entry, now)]
+        if not needle:
+            return live[:limit]
+        matches = [
+            entry for entry in live
+            if needle in entry['query'] or needle in normalize_query(entry.get('title') or '')
+        ]
+        matches.sort(key=lambda entry: (not entry['query'].startswith(needle), -entry.get('hits', 0)))
+        return matches[:limit]
+
+
+_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> SearchCache:
+    global _cache
+    if _cache is None:
+        _cache = SearchCache()
+    return _cache
@@ -0,0 +1,99 @@
+import itertools
+from typing import Dict, List, Tuple, Sequence, Any, Optional
+
+import numpy as np
+
+from core.stock_history import Bars, stack_right_aligned
+from core.stock_rules import RuleSet, BASE_FIELDS
+
+# =========================================================
+# 向量化回測引擎：以 (股票 x 天數) 矩陣一次評估規則檔中的所有訊號規則
+# =========================================================
+
+FORWARD_HORIZONS = (1, 5, 20) # 前瞻報酬的天數
+
+
+def build_panel(histories: Dict[str, Bars]) -> Dict[str, Any]:
+    """將多支股票的日線歷史疊成靠右對齊的矩陣 (每列一支股票)"""
+    symbols = list(histories)
+    panel = {'symbols': symbols}
+    for field in BASE_FIELDS:
+        panel[field] = stack_right_aligned([getattr(histories[s], field) for s in symbols])
+    return panel
+
+
+def _columns(panel: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    return {field: panel[field] for field in BASE_FIELDS}
+
+
+def forward_returns(close: np.ndarray, horizon: int) -> np.ndarray:
+    """計算每個時間點往後 horizon 根的報酬率，最後 horizon 欄為 NaN"""
+    out = np.full(close.shape, np.nan)
+    if close.shape[-1] > horizon:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[..., :-horizon] = close[..., horizon:] / close[..., :-horizon] - 1
+    return out
+
+
+def summarize(ruleset: RuleSet, masks: Dict[str, np.ndarray], fwd: Dict[int, np.ndarray]) -> Dict[str, Dict[str, Any]]:
+    """
+    統計每條規則的觸發次數、各天期的命中率與平均 / 中位數前瞻報酬。
+    命中率依規則的 direction 判斷；無方向性 (0) 的規則以「上漲機率」計。
+    """
+    stats = {}
+    for rule in ruleset.rules:
+        mask = masks[rule.id]
+        entry = {'title': rule.title, 'count': int(mask.sum()), 'direction': rule.direction, 'horizons': {}}
+        for horizon, returns in fwd.items():
+            sample = returns[mask & ~np.isnan(returns)]
+            if sample.size == 0:
+                entry['horizons'][horizon] = {'n': 0, 'hit_rate': np.nan, 'mean': np.nan, 'median': np.nan}
+                continue
+            hits = sample > 0 if rule.direction >= 0 else sample < 0
+            entry['horizons'][horizon] = {
+                'n': int(sample.size),
+                'hit_rate': float(hits.mean()),
+                'mean': float(sample.mean()),
+                'median': float(np.median(sample)),
+            }
+        stats[rule.id] = entry
+    return stats
+
+
+def run_backtest(
+    histories: Dict[str, Bars],
+    ruleset: RuleSet,
+    horizons: Sequence[int] = FORWARD_HORIZONS,
+    params: Optional[Dict[str, float]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    對整份觀察清單的日線歷史執行回測。params 可覆寫規則檔中的參數 (例如 proximity)。
+    """
+    panel = build_panel(histories)
+    fwd = {h: forward_returns(panel['close'], h) for h in horizons}
+    result = ruleset.evaluate(_columns(panel), params)
+    return summarize(ruleset, result.masks, fwd)
+
+
+def sweep(
+    histories: Dict[str, Bars],
+    ruleset: RuleSet,
+    grid: Dict[str, Sequence[float]],
+    horizons: Sequence[int] = FORWARD_HORIZONS,
+) -> List[Tuple[Dict[str, float], Dict[str, Dict[str, Any]]]]:
+    """
+    參數掃描：grid 例如 {'proximity': [0.005, 0.01, 0.02], 'volume_multiplier': [2, 2.5, 3]}。
+    指標快取與前瞻報酬在所有參數組合間共用，每組參數只重新評估布林條件。
+    """
+    panel = build_panel(histories)
+    columns = _columns(panel)
+    fwd = {h: forward_returns(panel['close'], h) for h in horizons}
+    cache = {}
+
+    keys = list(grid)
+    results = []
+    for values in itertools.product(*(grid[k] for k in keys)):
+        params = dict(zip(keys, values))
+        result = ruleset.evaluate(columns, params, cache=cache)
+        results.append((params, summarize(ruleset, result.masks, fwd)))
+    return results
@@ -0,0 +1,155 @@
+import os
+import logging
+from typing import Any, Dict, NamedTuple, Optional, List
+
+import numpy as np
+
+# =========================================================
+# 本地日線歷史快取 (每支股票一個 .npz 檔)
+# =========================================================
+
+HISTORY_DIR = './data/stock_history'
+HISTORY_RANGE = '10y' # 第一次建立快取時向上游抓取的區間
+SECONDS_PER_DAY = 86400
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class Bars(NamedTuple):
+    """以欄為單位 (columnar) 的 K 棒資料，每個欄位都是等長的 NumPy 陣列"""
+    ts: np.ndarray      # int64，Unix 秒 (日線為當日 00:00 UTC)
+    open: np.ndarray    # float64
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def tail(self, n: int) -> 'Bars':
+        """取最後 n 根 K 棒"""
+        return Bars(*(col[-n:] for col in self))
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """價格與成交量欄位 (規則引擎的輸入格式)"""
+        return {field: getattr(self, field) for field in PRICE_FIELDS}
+
+
+def empty_bars() -> Bars:
+    return Bars(np.empty(0, dtype=np.int64), *(np.empty(0) for _ in range(5)))
+
+
+def bars_from_chart(result: Dict[str, Any]) -> Bars:
+    """
+    將 Yahoo chart API 的 result 直接解碼為 Bars。
+    None 會在轉型時變成 NaN，再以遮罩一次濾掉任何欄位缺值的 K 棒。
+    """
+    timestamps = result.get('timestamp') or []
+    quote = result['indicators']['quote'][0]
+    ts = np.asarray(timestamps, dtype=np.int64)
+    columns = []
+    for field in PRICE_FIELDS:
+        values = quote.get(field) or []
+        col = np.asarray(values, dtype=np.float64) if len(values) == len(ts) else np.full(len(ts), np.nan)
+        columns.append(col)
+
+    mask = np.ones(len(ts), dtype=bool)
+    for col in columns:
+        mask &= ~np.isnan(col)
+    return Bars(ts[mask], *(col[mask] for col in columns))
+
+
+def history_path(symbol: str) -> str:
+    return os.path.join(HISTORY_DIR, f"{symbol.replace('/', '_')}.npz")
+
+
+def normalize_daily(bars: Bars) -> Bars:
+    """
+    將日線時間戳對齊到當日 00:00 UTC。
+    台股與美股的交易時段換算成 UTC 都落在同一天，因此可直接當作交易日的鍵值。
+    """
+    return bars._replace(ts=(bars.ts // SECONDS_PER_DAY) * SECONDS_PER_DAY)
+
+
+def merge_bars(old: Bars, new: Bars) -> Bars:
+    """合併兩段 K 棒，時間戳相同時以新資料為準，結果依時間排序"""
+    if len(old.ts) == 0:
+        return new
+    if len(new.ts) == 0:
+        return old
+    merged = Bars(*(np.concatenate([a, b]) for a, b in zip(old, new)))
+    # 反轉後取 unique，保留的是「最後出現」(也就是新資料) 的那一筆
+    _, idx = np.unique(merged.ts[::-1], return_index=True)
+    keep = len(merged.ts) - 1 - idx
+    return Bars(*(col[keep] for col in merged))
+
+
+def load_history(symbol: str) -> Optional[Bars]:
+    """讀取快取的日線歷史，檔案不存在或損毀時回傳 None"""
+    path = history_path(symbol)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            return Bars(*(data[field] for field in Bars._fields))
+    except Exception as e:
+        logging.error(f"讀取歷史快取 {path} 失敗: {e}")
+        return None
+
+
+def save_history(symbol: str, bars: Bars):
+    """原子性地寫入日線歷史快取 (先寫暫存檔再取代)"""
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    path = history_path(symbol)
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **bars._asdict())
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.error(f"儲存歷史快取 {path} 失敗: {e}")
+
+
+# 週期代碼沿用 Yahoo chart API 的 interval 命名
+TIMEFRAME_LABELS = {'1d': '日線', '1wk': '週線', '1mo': '月線'}
+
+
+def _period_keys(ts: np.ndarray, timeframe: str) -> np.ndarray:
+    """每根日 K 所屬的週 (週一起算) 或月份編號"""
+    days = ts // SECONDS_PER_DAY
+    if timeframe == '1wk':
+        return (days + 3) // 7 # 1970-01-01 是週四，平移 3 天讓每週從週一開始
+    if timeframe == '1mo':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f"不支援的週期: {timeframe}")
+
+
+def resample(bars: Bars, timeframe: str) -> Bars:
+    """
+    將日 K 就地聚合為週 K 或月 K (不需要另外向上游下載)。
+    以 reduceat 一次算出每個區段的開高低收量；時間戳為該週期第一個交易日，
+    最後一根可能是尚未結束的週期。
+    """
+    if timeframe == '1d' or len(bars.ts) == 0:
+        return bars
+    keys = _period_keys(bars.ts, timeframe)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    return Bars(
+        bars.ts[starts],
+        bars.open[starts],
+        np.maximum.reduceat(bars.high, starts),
+        np.minimum.reduceat(bars.low, starts),
+        bars.close[ends],
+        np.add.reduceat(bars.volume, starts),
+    )
+
+
+def stack_right_aligned(series: List[np.ndarray]) -> np.ndarray:
+    """
+    將多支股票的序列疊成 (股票 x 天數) 矩陣，每列靠右對齊 (最後一欄為各自的最新一根)。
+    長度不足的部分以 NaN 補在左側。
+    """
+    width = max((len(s) for s in series), default=0)
+    matrix = np.full((len(series), width), np.nan)
+    for row, values in enumerate(series):
+        if len(values):
+            matrix[row, width - len(values):] = values
+    return matrix
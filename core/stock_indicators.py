@@ -0,0 +1,128 @@
+import math
+from collections import deque
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+# =========================================================
+# 技術指標計算 (向量化版本 + 增量版本)
+# =========================================================
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    簡單移動平均 (沿最後一個軸計算)，前 window-1 筆為 NaN。
+    支援 1D (單一股票) 與 2D (股票 x 天數) 陣列。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < window:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=-1)
+    out[..., window - 1:] = windows.mean(axis=-1)
+    return out
+
+
+def _ewm(values: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    等同 pandas ewm(alpha=alpha, adjust=False).mean()，沿最後一個軸遞迴計算。
+    迴圈只走時間軸，每一步對所有股票一起運算：500 支 x 10 年約 0.07 秒 (見 test/test_stock_backtest.py 的效能基準)。
+    """
+    out = np.empty_like(values)
+    if values.shape[-1] == 0:
+        return out
+    acc = values[..., 0].copy()
+    out[..., 0] = acc
+    for t in range(1, values.shape[-1]):
+        acc += alpha * (values[..., t] - acc)
+        out[..., t] = acc
+    return out
+
+
+def wilder_rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    計算 RSI 指標 (Wilder 平滑)，結果與原本 pandas 版本的 _calculate_rsi 一致。
+    """
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.diff(close, axis=-1, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+
+    avg_gain = _ewm(gain, 1 / period)
+    avg_loss = _ewm(loss, 1 / period)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+        return 100 - (100 / (1 + rs))
+
+
+class IncrementalIndicators:
+    """
+    逐根 K 棒更新的指標狀態。specs 為規則集需要的 (函式, 欄位, 週期)，
+    目前支援 'ma' (移動平均) 與 'rsi' (Wilder RSI)。depth 為保留的最近 K 棒數，
+    應為規則集的 lookback + 1 (prev / crosses_* 需要前幾根的值)。
+    RSI 每次 update 只做常數次運算；MA 重新加總視窗 (只有數十根)，長時間執行也不會累積浮點誤差。
+    """
+
+    __slots__ = ('_ma', '_rsi', '_rows', 'last_ts')
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, specs: Iterable[Tuple[str, str, int]], depth: int = 2):
+        # ma: key -> 視窗；rsi: key -> [前一筆值, 平均漲幅, 平均跌幅]
+        self._ma: Dict[Tuple[str, str, int], deque] = {}
+        self._rsi: Dict[Tuple[str, str, int], list] = {}
+        for key in specs:
+            func, _, period = key
+            if func == 'ma':
+                self._ma[key] = deque(maxlen=period)
+            elif func == 'rsi':
+                self._rsi[key] = [None, 0.0, 0.0]
+            else:
+                raise ValueError(f"不支援增量計算的指標: {func}")
+        self._rows = deque(maxlen=depth) # 最近幾根 K 棒的欄位與指標值
+        self.last_ts: Optional[int] = None
+
+    def update(self, ts: int, open_: float, high: float, low: float, close: float, volume: float):
+        """加入一根新 K 棒並更新所有指標"""
+        row = dict(zip(self.FIELDS, (open_, high, low, close, volume)))
+
+        for key, window in self._ma.items():
+            window.append(row[key[1]])
+            row[key] = math.fsum(window) / window.maxlen if len(window) == window.maxlen else math.nan
+
+        for key, state in self._rsi.items():
+            prev_value, avg_gain, avg_loss = state
+            value = row[key[1]]
+            if prev_value is not None:
+                alpha = 1 / key[2]
+                delta = value - prev_value
+                avg_gain += alpha * (max(delta, 0.0) - avg_gain)
+                avg_loss += alpha * (max(-delta, 0.0) - avg_loss)
+            state[:] = [value, avg_gain, avg_loss]
+            if avg_loss > 0:
+                row[key] = 100 - 100 / (1 + avg_gain / avg_loss)
+            elif avg_gain > 0:
+                row[key] = 100.0
+            else:
+                row[key] = math.nan
+
+        self._rows.append(row)
+        self.last_ts = ts
+
+    @property
+    def depth(self) -> int:
+        """保留的最近 K 棒數"""
+        return self._rows.maxlen
+
+    def specs(self) -> Set[Tuple[str, str, int]]:
+        """目前維護中的指標 (函式, 欄位, 週期)"""
+        return set(self._ma) | set(self._rsi)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """最近幾根 K 棒的欄位值 (依時間排序)，格式與日線評估相同"""
+        return {field: np.array([row[field] for row in self._rows]) for field in self.FIELDS}
+
+    def indicators(self) -> Dict[Tuple[str, str, int], np.ndarray]:
+        """最近幾根 K 棒的指標值，可直接作為規則引擎的指標快取"""
+        keys = list(self._ma) + list(self._rsi)
+        return {key: np.array([row[key] for row in self._rows]) for key in keys}
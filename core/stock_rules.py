@@ -0,0 +1,454 @@
+import ast
+import json
+import os
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from core.stock_indicators import sma, wilder_rsi
+
+# =========================================================
+# 宣告式訊號規則引擎
+# 規則寫在 data/stock_rules.json，載入時編譯成向量化的陣列運算，
+# 同一份資料只跑一次：多條規則共用的指標 (例如 MA20) 只會計算一次。
+# =========================================================
+
+RULES_FILE = './data/stock_rules.json'
+
+BASE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# 指標函式：(欄位, 週期) -> 陣列。key 為 (函式名, 欄位, 週期)，可由外部預先提供 (盤中增量模式)
+INDICATOR_FUNCS: Dict[str, Callable[[np.ndarray, int], np.ndarray]] = {
+    'ma': sma,
+    'rsi': wilder_rsi,
+}
+
+IndicatorKey = Tuple[str, str, int]
+
+DEFAULT_RULE_CONFIG: Dict[str, Any] = {
+    "params": {
+        "proximity": 0.01,
+        "rsi_period": 14,
+        "rsi_overbought": 70,
+        "rsi_oversold": 30,
+        "volume_multiplier": 2.5
+    },
+    "values": {
+        "ma20": "ma(close, 20)",
+        "rsi": "rsi(close, rsi_period)",
+        "vol_ma5": "ma(volume, 5)",
+        "vol_ratio": "volume / vol_ma5",
+        "gap_up": "ma20 - high",
+        "gap_down": "low - ma20"
+    },
+    "guard": "valid(ma20)",
+    "rules": [
+        {
+            "id": "ma20_touch", "type": "接觸", "title": "K棒接觸 MA20", "color": "gold", "direction": 0,
+            "when": "low <= ma20 <= high",
+            "detail": "K棒 (H:{high:.2f} L:{low:.2f}) 已碰觸 MA20 ({ma20:.2f})。"
+        },
+        {
+            "id": "ma20_near_up", "type": "接近", "title": "快要漲碰到 MA20", "color": "orange", "direction": 0,
+            "when": "high < ma20 and high >= ma20 * (1 - proximity)",
+            "detail": "K棒高點 ({high:.2f}) 接近 MA20 ({ma20:.2f}), 僅差 {gap_up:.2f}。"
+        },
+        {
+            "id": "ma20_near_down", "type": "接近", "title": "快要跌碰到 MA20", "color": "orange", "direction": 0,
+            "when": "low > ma20 and low <= ma20 * (1 + proximity)",
+            "detail": "K棒低點 ({low:.2f}) 接近 MA20 ({ma20:.2f}), 僅差 {gap_down:.2f}。"
+        },
+        {
+            "id": "ma20_cross_up", "type": "穿越", "title": "🟡 黃金交叉 (站上 MA20)", "color": "green", "direction": 1,
+            "when": "crosses_above(close, ma20)",
+            "detail": "收盤價 ({close:.2f}) 站上 MA20 ({ma20:.2f})。",
+            "timeframes": ["1d", "1wk", "1mo"]
+        },
+        {
+            "id": "ma20_cross_down", "type": "穿越", "title": "⚫ 死亡交叉 (跌破 MA20)", "color": "red", "direction": -1,
+            "when": "crosses_below(close, ma20)",
+            "detail": "收盤價 ({close:.2f}) 跌破 MA20 ({ma20:.2f})。",
+            "timeframes": ["1d", "1wk", "1mo"]
+        },
+        {
+            "id": "rsi_overbought", "type": "RSI", "title": "🔥 RSI 過熱 (超買)", "color": "dark_red", "direction": -1,
+            "when": "rsi > rsi_overbought",
+            "detail": "RSI 目前為 **{rsi:.1f}** (>{rsi_overbought:g})，注意回檔風險。",
+            "timeframes": ["1d", "1wk", "1mo"]
+        },
+        {
+            "id": "rsi_oversold", "type": "RSI", "title": "❄️ RSI 過冷 (超賣)", "color": "dark_blue", "direction": 1,
+            "when": "rsi < rsi_oversold",
+            "detail": "RSI 目前為 **{rsi:.1f}** (<{rsi_oversold:g})，可能醞釀反彈。",
+            "timeframes": ["1d", "1wk", "1mo"]
+        },
+        {
+            "id": "volume_spike", "type": "量能", "title": "🌋 成交量異常 (爆量)", "color": "purple", "direction": 0,
+            "when": "vol_ratio >= volume_multiplier",
+            "detail": "今日成交量 ({volume:,.0f}) 為 5日均量 的 **{vol_ratio:.1f} 倍**。"
+        }
+    ]
+}
+
+
+class RuleError(ValueError):
+    """規則檔格式或運算式錯誤"""
+
+
+# =========================================================
+# 運算式編譯 (只允許白名單內的語法節點)
+# =========================================================
+
+class _Context:
+    """單次評估的狀態：輸入欄位、參數、指標快取與別名快取"""
+    __slots__ = ('columns', 'params', 'cache', 'values')
+
+    def __init__(self, columns, params, cache):
+        self.columns = columns
+        self.params = params
+        self.cache = cache
+        self.values: Dict[str, Any] = {}
+
+
+def _shift(values, periods: int = 1):
+    """沿時間軸 (最後一軸) 取前 n 根的值"""
+    values = np.asarray(values)
+    if values.ndim == 0:
+        return values
+    fill = False if values.dtype == bool else np.nan
+    out = np.full(values.shape, fill, dtype=values.dtype if values.dtype == bool else np.float64)
+    if periods < values.shape[-1]:
+        out[..., periods:] = values[..., :-periods]
+    return out
+
+
+def _safe_div(a, b):
+    """除以 0 或 NaN 時回傳 NaN，避免產生 inf 造成誤判"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = np.asarray(b, dtype=np.float64)
+        return np.where((b != 0) & ~np.isnan(b), np.asarray(a, dtype=np.float64) / np.where(b == 0, 1, b), np.nan)
+
+
+_BIN_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: _safe_div,
+}
+
+_CMP_OPS = {
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+
+def _prev_periods(args: List[ast.AST]) -> int:
+    """prev(x, n) 的 n (省略時為 1)"""
+    return int(args[1].value) if len(args) == 2 and isinstance(args[1], ast.Constant) else 1
+
+
+class _Compiler:
+    def __init__(self, params: Dict[str, float], aliases: Dict[str, Callable]):
+        self.params = params
+        self.aliases = aliases
+        self.indicator_specs: Set[Tuple[str, str, Any]] = set()
+        self.alias_lookback: Dict[str, int] = {}
+        self.max_lookback = 0
+
+    def compile(self, expr: str, name: Optional[str] = None) -> Callable[[_Context], Any]:
+        """編譯運算式；name 為別名名稱時記下它的回溯根數，供引用它的運算式計算"""
+        try:
+            tree = ast.parse(expr, mode='eval')
+        except SyntaxError as e:
+            raise RuleError(f"運算式語法錯誤 `{expr}`: {e.msg}")
+        compiled = self._node(tree.body, expr)
+        lookback = self._lookback(tree.body)
+        self.max_lookback = max(self.max_lookback, lookback)
+        if name is not None:
+            self.alias_lookback[name] = lookback
+        return compiled
+
+    def _lookback(self, node: ast.AST) -> int:
+        """計算最新一根時需要往前看幾根 K 棒 (prev 與 crosses_* 會用到前面的值，可巢狀累加)"""
+        if isinstance(node, ast.Name):
+            return self.alias_lookback.get(node.id, 0)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            func = node.func.id
+            if func in INDICATOR_FUNCS:
+                return 0 # 指標由完整序列計算 (盤中由增量狀態提供)，不佔用回溯的 K 棒
+            inner = max((self._lookback(a) for a in node.args), default=0)
+            if func == 'prev':
+                return inner + _prev_periods(node.args)
+            if func in ('crosses_above', 'crosses_below'):
+                return inner + 1
+            return inner
+        return max((self._lookback(child) for child in ast.iter_child_nodes(node)), default=0)
+
+    def _period(self, node: ast.AST, expr: str) -> Any:
+        """指標週期只能是整數常數或參數名稱"""
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return int(node.value)
+        if isinstance(node, ast.Name) and node.id in self.params:
+            return node.id
+        raise RuleError(f"`{expr}`: 指標週期必須是數字或參數名稱")
+
+    def _node(self, node: ast.AST, expr: str) -> Callable[[_Context], Any]:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda ctx: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in BASE_FIELDS:
+                return lambda ctx: ctx.columns[name]
+            if name in self.aliases:
+                compiled = self.aliases[name]
+                def alias(ctx):
+                    if name not in ctx.values:
+                        ctx.values[name] = compiled(ctx)
+                    return ctx.values[name]
+                return alias
+            if name in self.params:
+                return lambda ctx: float(ctx.params[name])
+            raise RuleError(f"`{expr}`: 未知的名稱 `{name}`")
+
+        if isinstance(node, ast.BoolOp):
+            parts = [self._node(v, expr) for v in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            def boolop(ctx):
+                result = parts[0](ctx)
+                for part in parts[1:]:
+                    result = combine(result, part(ctx))
+                return result
+            return boolop
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._node(node.operand, expr)
+            if isinstance(node.op, ast.Not):
+                return lambda ctx: np.logical_not(operand(ctx))
+            if isinstance(node.op, ast.USub):
+                return lambda ctx: np.negative(operand(ctx))
+            raise RuleError(f"`{expr}`: 不支援的運算子")
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            op = _BIN_OPS[type(node.op)]
+            left, right = self._node(node.left, expr), self._node(node.right, expr)
+            return lambda ctx: op(left(ctx), right(ctx))
+
+        if isinstance(node, ast.Compare) and all(type(o) in _CMP_OPS for o in node.ops):
+            # 支援連續比較，例如 low <= ma20 <= high
+            operands = [self._node(n, expr) for n in [node.left] + node.comparators]
+            ops = [_CMP_OPS[type(o)] for o in node.ops]
+            def compare(ctx):
+                values = [f(ctx) for f in operands]
+                with np.errstate(invalid='ignore'):
+                    result = ops[0](values[0], values[1])
+                    for i in range(1, len(ops)):
+                        result = np.logical_and(result, ops[i](values[i], values[i + 1]))
+                return result
+            return compare
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            return self._call(node.func.id, node.args, expr)
+
+        raise RuleError(f"`{expr}`: 不支援的語法 ({type(node).__name__})")
+
+    def _call(self, func: str, args: List[ast.AST], expr: str) -> Callable[[_Context], Any]:
+        if func in INDICATOR_FUNCS:
+            if len(args) != 2 or not isinstance(args[0], ast.Name) or args[0].id not in BASE_FIELDS:
+                raise RuleError(f"`{expr}`: {func}() 的用法為 {func}(欄位, 週期)")
+            field, period = args[0].id, self._period(args[1], expr)
+            self.indicator_specs.add((func, field, period))
+            indicator = INDICATOR_FUNCS[func]
+            def call(ctx):
+                n = int(ctx.params[period]) if isinstance(period, str) else period
+                key = (func, field, n)
+                if key not in ctx.cache:
+                    ctx.cache[key] = indicator(ctx.columns[field], n)
+                return ctx.cache[key]
+            return call
+
+        compiled = [self._node(a, expr) for a in args]
+
+        if func == 'prev' and len(args) in (1, 2):
+            periods = _prev_periods(args)
+            return lambda ctx: _shift(compiled[0](ctx), periods)
+
+        if func == 'valid' and len(args) == 1:
+            return lambda ctx: ~np.isnan(np.asarray(compiled[0](ctx), dtype=np.float64))
+
+        if func in ('crosses_above', 'crosses_below') and len(args) == 2:
+            above = func == 'crosses_above'
+            def cross(ctx):
+                a, b = compiled[0](ctx), compiled[1](ctx)
+                with np.errstate(invalid='ignore'):
+                    if above:
+                        return (a > b) & (_shift(a) < _shift(b))
+                    return (a < b) & (_shift(a) > _shift(b))
+            return cross
+
+        raise RuleError(f"`{expr}`: 未知的函式 `{func}` 或參數數量錯誤")
+
+
+# =========================================================
+# 規則集
+# =========================================================
+
+class Rule(NamedTuple):
+    id: str
+    type: str
+    title: str
+    color: str
+    direction: int   # +1 看漲 / -1 看跌 / 0 無方向性 (回測時使用)
+    detail: str
+    when: Callable[[_Context], Any]
+    timeframes: Tuple[str, ...] = ('1d',) # 適用的 K 棒週期 (1d / 1wk / 1mo)，週線與月線由日線重新取樣
+
+
+class RuleResult:
+    """一次評估的結果：每條規則的布林陣列，以及可用於格式化訊息的數值"""
+
+    def __init__(self, ruleset: 'RuleSet', ctx: _Context, masks: Dict[str, np.ndarray]):
+        self.ruleset = ruleset
+        self.masks = masks
+        self._ctx = ctx
+
+    def value(self, name: str):
+        """取得欄位、別名或參數的值 (陣列或純量)"""
+        if name in self._ctx.columns:
+            return self._ctx.columns[name]
+        if name in self._ctx.values:
+            return self._ctx.values[name]
+        return self._ctx.params[name]
+
+    def fired(self, index: int = -1) -> List[Rule]:
+        """回傳在指定位置 (預設最後一根) 觸發的規則"""
+        return [rule for rule in self.ruleset.rules if bool(np.asarray(self.masks[rule.id])[..., index])]
+
+    def format_detail(self, rule: Rule, index: int = -1) -> str:
+        fields = {name: self._at(self._ctx.columns[name], index) for name in BASE_FIELDS if name in self._ctx.columns}
+        fields.update({name: self._at(v, index) for name, v in self._ctx.values.items()})
+        fields.update(self._ctx.params)
+        return rule.detail.format(**fields)
+
+    @staticmethod
+    def _at(values, index: int) -> float:
+        values = np.asarray(values)
+        return float(values) if values.ndim == 0 else float(values[..., index])
+
+
+class RuleSet:
+    """
+    已編譯的規則集。evaluate() 對整段 (或整個矩陣) 的資料一次算出所有規則。
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.params: Dict[str, float] = dict(config.get('params', {}))
+        aliases: Dict[str, Callable] = {}
+        compiler = _Compiler(self.params, aliases)
+
+        for name in self.params:
+            if name in BASE_FIELDS:
+                raise RuleError(f"參數名稱 `{name}` 與欄位名稱衝突")
+
+        # 別名依檔案中的順序編譯，只能引用先前定義的別名
+        for name, expr in config.get('values', {}).items():
+            if name in BASE_FIELDS or name in self.params:
+                raise RuleError(f"別名 `{name}` 與欄位或參數名稱衝突")
+            aliases[name] = compiler.compile(expr, name)
+        self.value_names = list(aliases)
+
+        guard = config.get('guard')
+        self._guard = compiler.compile(guard) if guard else None
+
+        self.rules: List[Rule] = []
+        for raw in config.get('rules', []):
+            try:
+                self.rules.append(Rule(
+                    id=raw['id'],
+                    type=raw.get('type', raw['id']),
+                    title=raw.get('title', raw['id']),
+                    color=raw.get('color', 'blue'),
+                    direction=int(raw.get('direction', 0)),
+                    detail=raw.get('detail', ''),
+                    when=compiler.compile(raw['when']),
+                    timeframes=tuple(raw.get('timeframes', ['1d'])),
+                ))
+            except KeyError as e:
+                raise RuleError(f"規則缺少必要欄位 {e}")
+
+        self._indicator_specs = compiler.indicator_specs
+        # 評估最新一根時需要的前幾根 K 棒數 (盤中增量狀態至少要保留 lookback + 1 根)
+        self.lookback = compiler.max_lookback
+        self._value_getters = [compiler.compile(name) for name in self.value_names]
+
+    def indicators(self, params: Optional[Dict[str, float]] = None) -> Set[IndicatorKey]:
+        """規則用到的所有指標 (函式, 欄位, 週期)，供盤中增量狀態預先維護"""
+        merged = {**self.params, **(params or {})}
+        return {
+            (func, field, int(merged[period]) if isinstance(period, str) else period)
+            for func, field, period in self._indicator_specs
+        }
+
+    def evaluate(
+        self,
+        columns: Dict[str, np.ndarray],
+        params: Optional[Dict[str, float]] = None,
+        cache: Optional[Dict[IndicatorKey, np.ndarray]] = None,
+    ) -> RuleResult:
+        """
+        評估所有規則。columns 為 open/high/low/close/volume 陣列 (1D 或 股票 x 天數 的 2D)。
+        cache 可重複傳入以共用指標 (參數掃描)，或預先填入盤中增量計算好的指標。
+        """
+        ctx = _Context(columns, {**self.params, **(params or {})}, cache if cache is not None else {})
+
+        # 先算出所有別名 (格式化訊息時需要)，共用的指標在此只計算一次
+        for getter in self._value_getters:
+            getter(ctx)
+
+        guard = self._guard(ctx) if self._guard else True
+        masks = {}
+        for rule in self.rules:
+            masks[rule.id] = np.logical_and(rule.when(ctx), guard)
+        return RuleResult(self, ctx, masks)
+
+
+# =========================================================
+# 規則檔載入 (依修改時間快取，編輯 JSON 後下次評估即生效)
+# =========================================================
+
+_loaded: Dict[str, Tuple[float, RuleSet]] = {}
+
+
+def load_rules(path: str = RULES_FILE) -> RuleSet:
+    """
+    讀取並編譯規則檔。檔案不存在時建立預設檔案；格式錯誤時沿用上一次成功載入的版本。
+    """
+    try:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(DEFAULT_RULE_CONFIG, f, indent=2, ensure_ascii=False)
+            logging.warning(f"{path} 不存在，已建立預設規則檔。")
+
+        mtime = os.path.getmtime(path)
+        cached = _loaded.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            ruleset = RuleSet(json.load(f))
+        _loaded[path] = (mtime, ruleset)
+        logging.info(f"已從 {path} 載入 {len(ruleset.rules)} 條股票訊號規則。")
+        return ruleset
+
+    except Exception as e:
+        logging.error(f"載入股票規則檔 {path} 失敗: {e}")
+        if path in _loaded:
+            return _loaded[path][1]
+        return RuleSet(DEFAULT_RULE_CONFIG)
@@ -0,0 +1,71 @@
+import os
+import time
+from typing import Dict, Optional
+
+# =========================================================
+# 播放中串流的 CPU 使用量 (讀取 /proc，僅支援 Linux；其他平台回傳 None)
+# 每個串流包含兩部分：FFmpeg 子行程，以及 discord.py 送出音訊封包的播放執行緒。
+# =========================================================
+
+try:
+    _CLK_TCK = os.sysconf('SC_CLK_TCK')
+except (AttributeError, ValueError, OSError):
+    _CLK_TCK = 100
+
+
+def _stat_cpu_seconds(path: str) -> Optional[float]:
+    """/proc/.../stat 的 utime + stime (秒)"""
+    try:
+        with open(path, 'r') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # 第 2 欄 (comm) 可能含空白，從最後一個 ')' 之後開始切
+    fields = data[data.rfind(')') + 2:].split()
+    try:
+        return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+    except (IndexError, ValueError):
+        return None
+
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    return _stat_cpu_seconds(f'/proc/{pid}/stat')
+
+
+def thread_cpu_seconds(native_id: int) -> Optional[float]:
+    return _stat_cpu_seconds(f'/proc/self/task/{native_id}/stat')
+
+
+class StreamCpu:
+    """
+    追蹤單一串流的 CPU 用量。sample() 回傳自上次取樣以來的使用率 (%)，
+    以及自開始播放以來的平均使用率。
+    """
+
+    def __init__(self, pid: Optional[int], thread_id: Optional[int]):
+        self.pid = pid
+        self.thread_id = thread_id
+        self.started = time.monotonic()
+        self._last_time = self.started
+        self._start_cpu = self._read()
+        self._last_cpu = dict(self._start_cpu)
+
+    def _read(self) -> Dict[str, Optional[float]]:
+        return {
+            'ffmpeg': process_cpu_seconds(self.pid) if self.pid else None,
+            'player': thread_cpu_seconds(self.thread_id) if self.thread_id else None,
+        }
+
+    def sample(self) -> Dict[str, Optional[float]]:
+        now = time.monotonic()
+        current = self._read()
+        interval = max(now - self._last_time, 1e-6)
+        elapsed = max(now - self.started, 1e-6)
+        result: Dict[str, Optional[float]] = {}
+        for part, value in current.items():
+            last, start = self._last_cpu.get(part), self._start_cpu.get(part)
+            result[part] = None if value is None or last is None else (value - last) / interval * 100
+            result[f'{part}_avg'] = None if value is None or start is None else (value - start) / elapsed * 100
+        self._last_time = now
+        self._last_cpu = current
+        return result
@@ -0,0 +1,169 @@
+import csv
+import re
+import logging
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+import requests
+
+from core.stock_history import Bars, load_history, save_history, merge_bars
+
+# =========================================================
+# 證交所每日收盤行情 (全部上市證券) 快照
+# 一次下載整個市場當日的 OHLCV，逐行解析後寫入本地日線快取，
+# 取代對每支 .TW 股票各打一次 Yahoo API。
+# =========================================================
+
+TWSE_SNAPSHOT_URL = 'https://www.twse.com.tw/exchangeReport/MI_INDEX'
+TWSE_SNAPSHOT_ENCODING = 'cp950'
+TWSE_SUFFIX = '.TW' # 只涵蓋上市股票；上櫃 (.TWO) 仍由 Yahoo 提供
+
+# 快照表頭 -> Bars 欄位
+_COLUMNS = {
+    '證券代號': 'code',
+    '證券名稱': 'name',
+    '開盤價': 'open',
+    '最高價': 'high',
+    '最低價': 'low',
+    '收盤價': 'close',
+    '成交股數': 'volume',
+}
+_ROC_DATE = re.compile(r'(\d{2,3})年(\d{1,2})月(\d{1,2})日')
+
+
+class SnapshotRow(NamedTuple):
+    code: str
+    name: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+class Snapshot(NamedTuple):
+    day: Optional[date]           # 快照的交易日 (由標題的民國日期解析)
+    rows: Dict[str, SnapshotRow]  # 證券代號 -> 當日行情
+
+    def bars(self, code: str) -> Optional[Bars]:
+        """取出單一證券的當日日 K (時間戳為當日 00:00 UTC，與日線快取一致)"""
+        row = self.rows.get(code)
+        if row is None or self.day is None:
+            return None
+        ts = int(datetime(self.day.year, self.day.month, self.day.day, tzinfo=timezone.utc).timestamp())
+        return Bars(
+            np.array([ts], dtype=np.int64),
+            *(np.array([getattr(row, field)]) for field in ('open', 'high', 'low', 'close', 'volume'))
+        )
+
+
+def _cell(value: str) -> str:
+    """去除 ="0050" 這類避免 Excel 吃掉前導零的包裝與空白"""
+    return value.strip().lstrip('=').strip('"').strip()
+
+
+def _number(value: str) -> float:
+    """'1,234.50' -> 1234.5；無成交的 '--' 等值回傳 NaN"""
+    try:
+        return float(_cell(value).replace(',', ''))
+    except ValueError:
+        return float('nan')
+
+
+def parse_snapshot(lines: Iterable[str]) -> Snapshot:
+    """
+    逐行解析 MI_INDEX 的 CSV (不需要先把整個檔案讀進記憶體)。
+    檔案包含多個區段 (指數、漲跌統計...)，只取表頭為「證券代號」的個股區段；
+    欄位依表頭名稱對應，無成交 (價格為 --) 的證券直接略過。
+    """
+    day = None
+    rows: Dict[str, SnapshotRow] = {}
+    index: Optional[Dict[str, int]] = None
+
+    for record in csv.reader(lines):
+        if not record:
+            if index is not None:
+                break # 個股區段結束
+            continue
+        first = _cell(record[0])
+
+        if index is None:
+            if day is None:
+                match = _ROC_DATE.search(first)
+                if match:
+                    year, month, mday = (int(g) for g in match.groups())
+                    day = date(year + 1911, month, mday)
+            if first == '證券代號':
+                header = [_cell(c) for c in record]
+                index = {_COLUMNS[name]: i for i, name in enumerate(header) if name in _COLUMNS}
+                if len(index) != len(_COLUMNS):
+                    logging.error(f"證交所快照表頭格式不符: {header}")
+                    break
+            continue
+
+        if len(record) <= max(index.values()) or not first:
+            break # 表格結束後的備註區段
+
+        values = {field: _number(record[i]) for field, i in index.items() if field not in ('code', 'name')}
+        if any(v != v for v in values.values()): # NaN：當日無成交
+            continue
+        code = _cell(record[index['code']])
+        rows[code] = SnapshotRow(code=code, name=_cell(record[index['name']]), **values)
+
+    return Snapshot(day, rows)
+
+
+def _decode_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    for chunk in chunks:
+        yield chunk.decode(TWSE_SNAPSHOT_ENCODING, errors='replace')
+
+
+def fetch_snapshot(day: date) -> Optional[Snapshot]:
+    """
+    下載指定交易日的全市場收盤行情 (在獨立線程中執行)。
+    非交易日證交所會回傳空內容，此時回傳 None。
+    """
+    params = {'response': 'csv', 'date': day.strftime('%Y%m%d'), 'type': 'ALLBUT0999'}
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36'}
+    try:
+        with requests.get(TWSE_SNAPSHOT_URL, params=params, headers=headers, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            snapshot = parse_snapshot(_decode_lines(response.iter_lines()))
+    except Exception as e:
+        logging.error(f"[錯誤] 下載證交所 {day} 收盤行情失敗: {e}")
+        return None
+
+    if not snapshot.rows or snapshot.day != day:
+        logging.warning(f"證交所 {day} 沒有收盤行情 (可能為休市日)。")
+        return None
+    logging.info(f"證交所 {day} 收盤行情：共 {len(snapshot.rows)} 檔證券。")
+    return snapshot
+
+
+def is_twse_symbol(symbol: str) -> bool:
+    return symbol.upper().endswith(TWSE_SUFFIX)
+
+
+def twse_code(symbol: str) -> str:
+    """2330.TW -> 2330"""
+    return symbol[:-len(TWSE_SUFFIX)]
+
+
+def ingest_snapshot(snapshot: Snapshot, symbols: Iterable[str]) -> Dict[str, Bars]:
+    """
+    將快照併入指定 .TW 股票的日線快取，回傳更新後的完整歷史。
+    尚未建立快取的股票 (需要先回補歷史) 與快照中沒有的代碼不會出現在結果中。
+    """
+    histories: Dict[str, Bars] = {}
+    for symbol in symbols:
+        if not is_twse_symbol(symbol):
+            continue
+        today = snapshot.bars(twse_code(symbol))
+        cached = load_history(symbol)
+        if today is None or cached is None or len(cached.ts) == 0:
+            continue
+        merged = merge_bars(cached, today)
+        save_history(symbol, merged)
+        histories[symbol] = merged
+    return histories
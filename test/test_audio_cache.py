@@ -0,0 +1,106 @@
+# test_audio_cache.py
+# 以暫存目錄測試本地音訊快取：播放到第 N 次才下載、超過容量時依「播放次數 x 時間衰減」淘汰，
+# 以及未下載的播放紀錄數量上限 (低分的先移除，已下載與正在播放的不移除)。
+# 執行方式：python -m pytest test/test_audio_cache.py 或 python test/test_audio_cache.py
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import core.audio_cache as audio_cache
+from core.audio_cache import AudioCache, AUDIO_CACHE_HALF_LIFE
+from core.media_cache import video_key
+
+
+def _url(n: int) -> str:
+    return f'https://youtu.be/v{n:010d}'
+
+
+def _with_file(cache: AudioCache, n: int, size: int, plays: int, age: float):
+    """建立一個已下載的紀錄 (檔案大小 size bytes、age 秒前最後播放)"""
+    name = f'{n}.opus'
+    with open(os.path.join(cache.directory, name), 'wb') as f:
+        f.write(b'\0' * size)
+    cache._load()[video_key(_url(n))] = {'plays': plays, 'last_played': time.time() - age, 'file': name, 'size': size}
+
+
+def test_record_play_triggers_download():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AudioCache(tmp, max_bytes=1000, min_plays=3)
+        assert [cache.record_play(_url(1)) for _ in range(3)] == [False, False, True]
+        assert cache.record_play('https://example.com/song.mp3') is False # 無法辨識的網址不記錄
+        # 不在事件迴圈中時索引直接寫入
+        with open(cache.index_path, 'r', encoding='utf8') as f:
+            assert json.load(f)[video_key(_url(1))]['plays'] == 3
+
+        _with_file(cache, 2, 10, plays=5, age=0)
+        assert cache.record_play(_url(2)) is False # 已下載
+        assert cache.lookup(_url(2)) == os.path.join(tmp, '2.opus')
+
+
+def test_lookup_missing_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AudioCache(tmp)
+        _with_file(cache, 1, 10, plays=5, age=0)
+        os.remove(os.path.join(tmp, '1.opus')) # 手動刪除
+        assert cache.lookup(_url(1)) is None
+        entry = cache._load()[video_key(_url(1))]
+        assert 'file' not in entry and entry['plays'] == 5 # 保留播放次數，之後可以再下載
+
+
+def test_evict_by_decayed_score():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AudioCache(tmp, max_bytes=250)
+        _with_file(cache, 1, 100, plays=10, age=0)                          # 分數 10
+        _with_file(cache, 2, 100, plays=50, age=7 * AUDIO_CACHE_HALF_LIFE)  # 很久沒播：50 / 128 < 1
+        _with_file(cache, 3, 100, plays=2, age=0)                           # 分數 2
+        _with_file(cache, 4, 100, plays=1, age=0)                           # 剛下載的這首 (不可淘汰)
+
+        cache._evict(keep=video_key(_url(4)))
+        assert cache.total_bytes == 200
+        assert not os.path.exists(os.path.join(tmp, '2.opus'))
+        assert not os.path.exists(os.path.join(tmp, '3.opus'))
+        assert os.path.exists(os.path.join(tmp, '1.opus')) and os.path.exists(os.path.join(tmp, '4.opus'))
+        assert cache._load()[video_key(_url(2))]['plays'] == 50 # 淘汰只刪除檔案
+        assert cache.stats()['tracks'] == 2
+
+        cache._evict() # 未超過上限時不動
+        assert cache.total_bytes == 200
+
+
+def test_prune_plays():
+    original = (audio_cache.AUDIO_INDEX_MAX_PLAYS, audio_cache.AUDIO_INDEX_PRUNE_SLACK)
+    audio_cache.AUDIO_INDEX_MAX_PLAYS, audio_cache.AUDIO_INDEX_PRUNE_SLACK = 4, 2
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = AudioCache(tmp, min_plays=100)
+            index = cache._load()
+            now = time.time()
+            for n in range(1, 6):
+                index[video_key(_url(n))] = {'plays': n, 'last_played': now}
+            index[video_key(_url(6))] = {'plays': 1, 'last_played': now - 10 * AUDIO_CACHE_HALF_LIFE} # 分數 < 0.05
+            _with_file(cache, 7, 10, plays=0, age=10 * AUDIO_CACHE_HALF_LIFE) # 已下載：不受上限影響
+
+            # 超過上限 (4)：移除低於最低分數的紀錄，其餘依分數由低到高移除到剩 4 筆 (剛播放的這首另外保留)
+            cache.record_play(_url(8))
+            remaining = {key for key, entry in index.items() if not entry.get('file')}
+            assert remaining == {video_key(_url(n)) for n in (2, 3, 4, 5, 8)}
+            assert video_key(_url(7)) in index
+            assert cache._prune_at == len(index) + 2
+
+            cache.record_play(_url(9)) # 還沒超過整理門檻，不重新排序
+            assert len(index) == 7
+    finally:
+        audio_cache.AUDIO_INDEX_MAX_PLAYS, audio_cache.AUDIO_INDEX_PRUNE_SLACK = original
+
+
+if __name__ == "__main__":
+    test_record_play_triggers_download()
+    test_lookup_missing_file()
+    test_evict_by_decayed_score()
+    test_prune_plays()
+    print("✅ 本地音訊快取測試通過")
@@ -0,0 +1,124 @@
+# test_exchange_calendar.py
+# 以暫存的行事曆檔測試交易所行事曆：休市日、提早收盤、夏令時間、跨長假的下一個交易日，
+# 舊檔案缺少的年度改用預設資料，以及颱風假等臨時休市。
+# 執行方式：python -m pytest test/test_exchange_calendar.py 或 python test/test_exchange_calendar.py
+
+import json
+import os
+import sys
+import tempfile
+from datetime import date, datetime, time, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import core.exchange_calendar as exchange_calendar
+from core.exchange_calendar import (
+    EXCHANGES, add_closure, exchange_for, is_open, is_trading_day, next_session, next_trading_day, session,
+)
+
+TWSE = EXCHANGES['TWSE']
+NYSE = EXCHANGES['NYSE']
+
+
+def _with_calendar(test, raw=None):
+    """在暫存目錄的行事曆檔上執行 test (raw 為 None 時由模組建立預設檔)"""
+    original = exchange_calendar.CALENDAR_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        exchange_calendar.CALENDAR_FILE = os.path.join(tmp, 'exchange_calendar.json')
+        exchange_calendar._data.mtime = None
+        if raw is not None:
+            with open(exchange_calendar.CALENDAR_FILE, 'w', encoding='utf-8') as f:
+                json.dump(raw, f)
+        try:
+            test()
+        finally:
+            exchange_calendar.CALENDAR_FILE = original
+            exchange_calendar._data.mtime = None
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_exchange_for():
+    assert exchange_for('2330.TW') is TWSE
+    assert exchange_for('6488.two') is TWSE
+    assert exchange_for('AAPL') is NYSE
+    assert exchange_for('BRK-B') is NYSE
+
+
+def test_holidays():
+    def test():
+        assert is_trading_day(TWSE, date(2026, 3, 2))
+        assert os.path.exists(exchange_calendar.CALENDAR_FILE) # 不存在時建立預設檔
+        assert not is_trading_day(TWSE, date(2026, 2, 16)) # 春節
+        assert not is_trading_day(TWSE, date(2026, 2, 28)) # 週六
+        assert not is_trading_day(NYSE, date(2026, 2, 16)) # Presidents' Day
+        assert is_trading_day(NYSE, date(2026, 2, 17))
+        assert session(TWSE, date(2026, 2, 16)) is None
+
+        # 春節連假 (2/12 ~ 2/20) 加週末，下一個交易日是 2/23
+        assert next_trading_day(TWSE, date(2026, 2, 11)) == date(2026, 2, 23)
+        assert next_trading_day(NYSE, date(2026, 7, 2)) == date(2026, 7, 6) # 7/3 補假
+
+    _with_calendar(test)
+
+
+def test_sessions_and_early_close():
+    def test():
+        opens, closes = session(TWSE, date(2026, 3, 2))
+        assert (opens.astimezone(timezone.utc), closes.astimezone(timezone.utc)) == (_utc(2026, 3, 2, 1, 0), _utc(2026, 3, 2, 5, 30))
+
+        # 美股夏令時間：3/8 之後開盤時間 (UTC) 提早一小時
+        assert session(NYSE, date(2026, 3, 6))[0].astimezone(timezone.utc) == _utc(2026, 3, 6, 14, 30)
+        assert session(NYSE, date(2026, 3, 9))[0].astimezone(timezone.utc) == _utc(2026, 3, 9, 13, 30)
+
+        # 感恩節隔天提早在 13:00 收盤
+        assert session(NYSE, date(2026, 11, 27))[1].timetz().replace(tzinfo=None) == time(13, 0)
+        assert session(NYSE, date(2026, 11, 30))[1].timetz().replace(tzinfo=None) == time(16, 0)
+        assert is_open(NYSE, _utc(2026, 11, 27, 17, 59))
+        assert not is_open(NYSE, _utc(2026, 11, 27, 18, 0))
+
+        # 週五收盤後的下一個時段是週一
+        assert next_session(TWSE, _utc(2026, 3, 6, 6, 0))[0].date() == date(2026, 3, 9)
+        # 交易時段內回傳目前的時段
+        assert next_session(TWSE, _utc(2026, 3, 6, 3, 0))[0].date() == date(2026, 3, 6)
+
+    _with_calendar(test)
+
+
+def test_missing_years_use_defaults():
+    # 舊版檔案只有 2025 年：2026 年改用預設資料，2025 年以檔案為準
+    raw = {'TWSE': {'holidays': ['2025-01-01'], 'early_closes': []}, 'NYSE': {'holidays': [], 'early_closes': []}}
+
+    def test():
+        assert not is_trading_day(TWSE, date(2025, 1, 1))
+        assert is_trading_day(TWSE, date(2025, 1, 23)) # 檔案中沒有列出 (以檔案為準)
+        assert not is_trading_day(TWSE, date(2026, 2, 16))
+        assert not is_trading_day(NYSE, date(2026, 11, 26))
+        assert session(NYSE, date(2026, 11, 27))[1].timetz().replace(tzinfo=None) == time(13, 0)
+
+    _with_calendar(test, raw)
+
+
+def test_add_closure():
+    def test():
+        typhoon = date(2026, 9, 2)
+        assert is_trading_day(TWSE, typhoon)
+        assert add_closure('TWSE', typhoon)
+        assert not is_trading_day(TWSE, typhoon)
+        assert not add_closure('TWSE', typhoon) # 重複追加
+        assert is_trading_day(NYSE, typhoon) # 只影響指定的交易所
+        with open(exchange_calendar.CALENDAR_FILE, 'r', encoding='utf-8') as f:
+            assert typhoon.isoformat() in json.load(f)['TWSE']['holidays']
+
+    _with_calendar(test)
+
+
+if __name__ == "__main__":
+    test_exchange_for()
+    test_holidays()
+    test_sessions_and_early_close()
+    test_missing_years_use_defaults()
+    test_add_closure()
+    print("✅ 交易所行事曆測試通過")
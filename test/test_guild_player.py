@@ -0,0 +1,170 @@
+# test_guild_player.py
+# 測試播放器取得串流網址：預先解析跟著佇列第一首 (同一首不重複、換歌時取消舊的)，
+# 預先解析被取消 (佇列變動) 時要重新解析，不可被當成 /skip 而略過這首；播放器本身被取消時則照常結束。
+# 播放清單 cursor 逐頁展開：歌曲插在 cursor 前面，清單到底或載入失敗時移除 cursor。
+# 執行方式：python -m pytest test/test_guild_player.py 或 python test/test_guild_player.py
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import core.guild_player as guild_player
+from core.guild_player import GuildPlayer
+from core.music_queue import PLAYLIST_PAGE_SIZE, PlaylistCursor, QueuedSong
+
+SONG = QueuedSong('Song', 'https://www.youtube.com/watch?v=aaaaaaaaaaa', 1)
+OTHER = QueuedSong('Other', 'https://www.youtube.com/watch?v=bbbbbbbbbbb', 1)
+
+
+def _run_with_player(test):
+    async def run():
+        calls = []
+
+        async def fake_resolve(url):
+            calls.append(url)
+            await asyncio.sleep(0)
+            return f'{url}#stream', time.time() + 3600
+
+        original = guild_player._resolve_stream
+        guild_player._resolve_stream = fake_resolve
+        player = GuildPlayer(SimpleNamespace(id=1, voice_client=None), None)
+        try:
+            await test(player, calls)
+        finally:
+            guild_player._resolve_stream = original
+            await player.shutdown()
+
+    asyncio.run(run())
+
+
+def test_prefetch_follows_queue_head():
+    async def test(player, calls):
+        player.queue.append(SONG)
+        player._prefetch_next()
+        first = player._prefetch['task']
+        player._prefetch_next() # 同一首還在解析：不重複送出
+        assert player._prefetch['task'] is first
+
+        player.queue.insert_at(0, [OTHER]) # 插隊：第一首換了
+        player._prefetch_next()
+        assert player._prefetch['webpage_url'] == OTHER.webpage_url
+        stream_url, _ = await player._prefetch['task']
+        assert stream_url == f'{OTHER.webpage_url}#stream'
+        assert first.cancelled()
+        assert calls[-1] == OTHER.webpage_url
+
+        # 已完成且仍有效的結果直接沿用；快到期時重新解析
+        done = player._prefetch['task']
+        player._prefetch_next()
+        assert player._prefetch['task'] is done
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(('old', time.time() + 10))
+        player._prefetch = {'webpage_url': OTHER.webpage_url, 'task': future}
+        player._prefetch_next()
+        assert player._prefetch['task'] is not future
+
+    _run_with_player(test)
+
+
+def test_cancelled_prefetch_is_resolved_again():
+    async def test(player, calls):
+        prefetch = asyncio.get_running_loop().create_future()
+        player._prefetch = {'webpage_url': SONG.webpage_url, 'task': prefetch}
+        prefetch.cancel()
+        assert await player._get_stream_url(SONG) == f'{SONG.webpage_url}#stream'
+        assert calls == [SONG.webpage_url]
+
+    _run_with_player(test)
+
+
+def test_finished_prefetch_is_used():
+    async def test(player, calls):
+        prefetch = asyncio.get_running_loop().create_future()
+        prefetch.set_result(('prefetched', time.time() + 3600))
+        player._prefetch = {'webpage_url': SONG.webpage_url, 'task': prefetch}
+        assert await player._get_stream_url(SONG) == 'prefetched'
+        assert calls == []
+
+    _run_with_player(test)
+
+
+def test_cancelling_the_caller_still_propagates():
+    async def test(player, calls):
+        prefetch = asyncio.get_running_loop().create_future()
+        player._prefetch = {'webpage_url': SONG.webpage_url, 'task': prefetch}
+        waiter = asyncio.ensure_future(player._get_stream_url(SONG))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        try:
+            await waiter
+            assert False, "呼叫端被取消時應拋出 CancelledError"
+        except asyncio.CancelledError:
+            pass
+        assert not prefetch.cancelled() # 預先解析不受影響
+        assert calls == []
+
+    _run_with_player(test)
+
+
+def test_playlist_cursor_expansion():
+    pages = {}
+
+    async def fake_fetch(url, start, count=PLAYLIST_PAGE_SIZE):
+        await asyncio.sleep(0)
+        if url not in pages:
+            raise RuntimeError("清單無法載入")
+        entries = pages[url][start - 1:start - 1 + count]
+        return 'Playlist', [{'title': f'#{n}', 'url': f'https://www.youtube.com/watch?v=p{n:010d}'} for n in entries]
+
+    async def test(player, calls):
+        pages['https://www.youtube.com/playlist?list=PLa'] = list(range(1, PLAYLIST_PAGE_SIZE + 11))
+        cursor = PlaylistCursor('https://www.youtube.com/playlist?list=PLa', 'A', 9, 1)
+        tail = QueuedSong('Tail', 'https://www.youtube.com/watch?v=tailtailtai', 9)
+        player.queue.extend([cursor, tail])
+
+        # 第一頁是完整的一頁：歌曲插在 cursor 前面，cursor 留著並指向下一頁
+        await player._schedule_expand()
+        assert len(player.queue) == PLAYLIST_PAGE_SIZE + 2
+        assert player.queue[0].title == '#1' and player.queue[0].requester_id == 9
+        assert player.queue[PLAYLIST_PAGE_SIZE] is cursor and cursor.next_index == PLAYLIST_PAGE_SIZE + 1
+        assert player._schedule_expand() is None # cursor 已不在前幾首內
+
+        # 不足一頁表示到底：移除 cursor
+        for _ in range(PLAYLIST_PAGE_SIZE):
+            player.queue.popleft()
+        await player._schedule_expand()
+        assert [item.title for item in player.queue] == [f'#{n}' for n in range(PLAYLIST_PAGE_SIZE + 1, PLAYLIST_PAGE_SIZE + 11)] + ['Tail']
+
+        # 載入失敗也移除 cursor，後面的歌照常播放
+        player.queue.clear()
+        player.queue.extend([PlaylistCursor('https://www.youtube.com/playlist?list=PLgone', 'B', 9, 1), tail])
+        await player._schedule_expand()
+        assert list(player.queue) == [tail]
+
+        # 載入期間 cursor 被移除 (例如 /queue clear)：不插入任何歌曲
+        player.queue.clear()
+        player.queue.append(PlaylistCursor('https://www.youtube.com/playlist?list=PLa', 'A', 9, 1))
+        task = player._schedule_expand()
+        player.queue.clear()
+        await task
+        assert len(player.queue) == 0
+
+    original = guild_player.fetch_playlist_page
+    guild_player.fetch_playlist_page = fake_fetch
+    try:
+        _run_with_player(test)
+    finally:
+        guild_player.fetch_playlist_page = original
+
+
+if __name__ == "__main__":
+    test_prefetch_follows_queue_head()
+    test_cancelled_prefetch_is_resolved_again()
+    test_finished_prefetch_is_used()
+    test_cancelling_the_caller_still_propagates()
+    test_playlist_cursor_expansion()
+    print("✅ 播放器預先解析與播放清單展開測試通過")
@@ -0,0 +1,46 @@
+# test_import_progress.py
+# 測試 /importmusic 的匯入進度：網址可能不依順序寫入 (多個 worker 同時解析)，
+# cursor 只推進到 "之前的訊息都已寫入" 的最後一則；解析失敗的那則擋住進度，下次匯入會重試。
+# 執行方式：python -m pytest test/test_import_progress.py 或 python test/test_import_progress.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cmds.musiclist import ImportProgress
+
+
+def _scan(progress, pending):
+    """pending：{訊息 ID: 新網址數}，依訊息 ID 由舊到新讀取"""
+    for message_id in sorted(pending):
+        progress.scanned(message_id)
+        for _ in range(pending[message_id]):
+            progress.add_pending(message_id)
+
+
+def test_cursor_waits_for_older_messages():
+    progress = ImportProgress()
+    _scan(progress, {1: 0, 2: 2, 3: 1, 4: 0, 5: 1, 6: 0})
+
+    assert progress.written([]) == '1' # 沒有網址的訊息直接算完成
+    assert progress.written([3]) == '1' # 訊息 2 還沒寫完，不可跳過
+    assert progress.written([2]) == '1'
+    assert progress.written([2]) == '4'
+    assert progress.written([5]) == '6'
+    assert progress.written([]) == '6'
+
+
+def test_failed_url_blocks_cursor():
+    progress = ImportProgress('100') # 從上次的進度接續
+    assert progress.written([]) == '100'
+    _scan(progress, {101: 1, 102: 1, 103: 0})
+    # 訊息 101 的網址解析失敗 (不會呼叫 written)，之後的訊息寫入也不推進進度
+    assert progress.written([102]) == '100'
+    assert progress.written([]) == '100'
+
+
+if __name__ == "__main__":
+    test_cursor_waits_for_older_messages()
+    test_failed_url_blocks_cursor()
+    print("✅ 匯入進度測試通過")
@@ -0,0 +1,82 @@
+# test_market_panel.py
+# 測試全市場選股 (/stock screen)：對股票 x 交易日矩陣一次評估規則，只看最新交易日，
+# 依成交金額排序，並可只看指定的規則。
+# 執行方式：python -m pytest test/test_market_panel.py 或 python test/test_market_panel.py
+
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.market_panel import MarketPanel, empty_panel, screen
+from core.stock_rules import RuleSet
+
+RULES = RuleSet({
+    'params': {},
+    'values': {},
+    'rules': [
+        {'id': 'up', 'title': '上漲', 'when': "close > prev(close)"},
+        {'id': 'heavy', 'title': '大量', 'when': "volume >= 1000"},
+    ],
+})
+
+NAN = math.nan
+
+
+def _panel(close, volume):
+    close = np.array(close, dtype=np.float64)
+    volume = np.array(volume, dtype=np.float64)
+    symbols = np.array([f'{1101 + i}.TW' for i in range(len(close))])
+    names = np.array([f'股票{i}' for i in range(len(close))])
+    ts = np.arange(close.shape[1], dtype=np.int64) * 86400
+    return MarketPanel(symbols, names, ts, close, close, close, close, volume)
+
+
+def test_screen_latest_day_sorted_by_turnover():
+    panel = _panel(
+        close=[
+            [10, 11, 12],   # 上漲、量小
+            [50, 52, 50],   # 下跌、量大
+            [20, 19, 21],   # 上漲且量大
+            [30, 31, NAN],  # 最新一日無成交
+            [40, 41, 40],   # 沒有觸發 (前一日上漲不算)
+        ],
+        volume=[
+            [10, 10, 100],
+            [10, 10, 5000],
+            [10, 10, 2000],
+            [5000, 5000, NAN],
+            [5000, 5000, 10],
+        ],
+    )
+    results = screen(panel, RULES)
+    # 成交金額：1102 = 250000、1103 = 42000、1101 = 1200
+    assert [r['symbol'] for r in results] == ['1102.TW', '1103.TW', '1101.TW']
+    by_symbol = {r['symbol']: r for r in results}
+    assert by_symbol['1103.TW']['rules'] == ['上漲', '大量']
+    assert by_symbol['1102.TW']['rules'] == ['大量']
+    assert by_symbol['1101.TW']['name'] == '股票0'
+    assert math.isclose(by_symbol['1103.TW']['change_pct'], (21 / 19 - 1) * 100)
+    assert by_symbol['1102.TW']['turnover'] == 250000
+
+
+def test_screen_rule_filter():
+    panel = _panel(close=[[10, 11], [10, 9]], volume=[[1, 1], [1, 2000]])
+    assert [r['symbol'] for r in screen(panel, RULES, ['up'])] == ['1101.TW']
+    assert [r['symbol'] for r in screen(panel, RULES, ['heavy'])] == ['1102.TW']
+    assert screen(panel, RULES, ['unknown']) == []
+
+
+def test_screen_needs_two_days():
+    assert screen(empty_panel(), RULES) == []
+    assert screen(_panel(close=[[10]], volume=[[5000]]), RULES) == []
+
+
+if __name__ == "__main__":
+    test_screen_latest_day_sorted_by_turnover()
+    test_screen_rule_filter()
+    test_screen_needs_two_days()
+    print("✅ 全市場選股測試通過")
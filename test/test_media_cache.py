@@ -0,0 +1,72 @@
+# test_media_cache.py
+# 測試媒體網址快取的 single-flight：同時的請求只解析一次、單一等待者取消不影響其他人，
+# 所有等待者都取消後新的請求要重新解析，不可加入正在取消的工作。
+# 執行方式：python -m pytest test/test_media_cache.py 或 python test/test_media_cache.py
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.media_cache import MediaCache
+
+
+class _Resolver:
+    """計算呼叫次數；release 之前一直等待"""
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.calls
+
+
+def test_collapses_concurrent_requests():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = MediaCache(os.path.join(tmp, 'media_metadata.json'))
+            resolver = _Resolver()
+            first = asyncio.ensure_future(cache._single_flight('k', resolver))
+            second = asyncio.ensure_future(cache._single_flight('k', resolver))
+            await asyncio.sleep(0)
+
+            first.cancel() # 還有其他等待者，底層解析繼續
+            await asyncio.sleep(0)
+            resolver.release.set()
+            assert await second == 1
+            assert resolver.calls == 1
+            assert cache.stats['collapsed'] == 1
+            assert not cache._inflight
+
+    asyncio.run(run())
+
+
+def test_rejoin_after_last_waiter_cancelled():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = MediaCache(os.path.join(tmp, 'media_metadata.json'))
+            resolver = _Resolver()
+            waiter = asyncio.ensure_future(cache._single_flight('k', resolver))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.sleep(0) # 等待者取消，底層工作尚未結束
+
+            # 此時加入的請求要重新解析，而不是收到 CancelledError
+            resolver.release.set()
+            assert await cache._single_flight('k', resolver) == 2
+            assert resolver.calls == 2
+            assert waiter.cancelled()
+            await asyncio.sleep(0)
+            assert not cache._inflight and not cache._waiters
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_collapses_concurrent_requests()
+    test_rejoin_after_last_waiter_cancelled()
+    print("✅ 媒體網址快取測試通過")
@@ -0,0 +1,141 @@
+# test_media_extractor.py
+# 以假的工作行程 (不啟動 yt-dlp) 測試解析服務的分派協程：請求在等待結果時被取消，服務仍要正常運作。
+# 執行方式：python -m pytest test/test_media_extractor.py 或 python test/test_media_extractor.py
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import core.media_extractor as media_extractor
+from core.media_extractor import ExtractionService
+
+
+class _FakeConn:
+    """模擬工作行程的管線：每個請求要 delay 秒才有結果，結果是 {'title': url}"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.sent = deque()
+        self.ready_at = None
+        self.polling = threading.Event()
+
+    def send(self, job):
+        self.sent.append(job)
+        self.ready_at = time.monotonic() + self.delay
+
+    def poll(self, timeout):
+        self.polling.set()
+        wait = self.ready_at - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return False
+        time.sleep(max(0, wait))
+        return True
+
+    def recv(self):
+        profile, url, options = self.sent.popleft()
+        return True, {'title': url}
+
+
+class _FakeWorker:
+    def __init__(self, worker_id: int, delay: float):
+        self.id = worker_id
+        self.conn = _FakeConn(delay)
+        self.jobs = 0
+        self.started_at = time.time()
+
+    def alive(self):
+        return True
+
+    def kill(self):
+        pass
+
+
+class _FakeService(ExtractionService):
+    def __init__(self, delay: float):
+        super().__init__(workers=1, timeout=5)
+        self.delay = delay
+        self.spawned = []
+
+    def _spawn(self, slot):
+        worker = _FakeWorker(len(self.spawned) + 1, self.delay)
+        self.spawned.append(worker)
+        self._pool[slot] = worker
+        return worker
+
+
+def test_cancel_while_polling():
+    async def scenario():
+        service = _FakeService(delay=0.3)
+        try:
+            first = asyncio.create_task(service.extract('https://a', 'title'))
+            # 等分派協程開始在執行緒中 poll，再取消呼叫端
+            while not service.spawned or not service.spawned[0].conn.polling.is_set():
+                await asyncio.sleep(0.01)
+            first.cancel()
+            try:
+                await first
+            except asyncio.CancelledError:
+                pass
+
+            # 結果送達時呼叫端已取消：分派協程不能因 InvalidStateError 結束，下一個請求照常完成
+            assert await asyncio.wait_for(service.extract('https://b', 'title'), 5) == {'title': 'https://b'}
+            assert all(not task.done() for task in service._tasks)
+            assert service.stats['cancelled'] == 1
+            assert len(service.spawned) == 1 # 工作行程已空閒，不需要重新啟動
+        finally:
+            await service.close()
+
+    original_interval = media_extractor.WORKER_POLL_INTERVAL
+    media_extractor.WORKER_POLL_INTERVAL = 1 # 讓結果在同一次 poll 中送達
+    try:
+        asyncio.run(scenario())
+    finally:
+        media_extractor.WORKER_POLL_INTERVAL = original_interval
+
+
+def test_restart_only_finished_dispatchers():
+    async def scenario():
+        service = _FakeService(delay=0.01)
+        service.workers = 2
+        try:
+            service._ensure_started()
+            running, finished = service._tasks
+            finished.cancel()
+            await asyncio.sleep(0)
+            service._ensure_started()
+            assert service._tasks[0] is running # 仍在執行的分派協程不可重建
+            assert service._tasks[1] is not finished and not service._tasks[1].done()
+        finally:
+            await service.close()
+
+    asyncio.run(scenario())
+
+
+def test_restart_after_close():
+    async def scenario():
+        service = _FakeService(delay=0.01)
+        try:
+            assert await asyncio.wait_for(service.extract('https://a', 'title'), 5) == {'title': 'https://a'}
+            await service.close()
+            assert not service._tasks and not service._pool
+
+            # Cog 卸載時關閉服務；重新載入後的請求要重新啟動分派協程與工作行程
+            assert await asyncio.wait_for(service.extract('https://b', 'title'), 5) == {'title': 'https://b'}
+            assert len(service.spawned) == 2
+        finally:
+            await service.close()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_cancel_while_polling()
+    test_restart_only_finished_dispatchers()
+    test_restart_after_close()
+    print("✅ 解析服務測試通過")
@@ -0,0 +1,90 @@
+# test_media_urls.py
+# 測試媒體網址正規化：同一首歌的各種網址寫法要得到相同的鍵，不同的歌 / 清單不可被合併。
+# 音樂清單的唯一索引依賴這些鍵，回歸會造成重複紀錄或誤判重複。
+# 執行方式：python -m pytest test/test_media_urls.py 或 python test/test_media_urls.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.media_urls import canonical_url, canonical_media_id, youtube_id, soundcloud_path, spotify_id
+
+VIDEO = 'dQw4w9WgXcQ'
+
+
+def test_youtube_variants():
+    variants = [
+        f'https://www.youtube.com/watch?v={VIDEO}',
+        f'https://youtube.com/watch?v={VIDEO}&t=30s',
+        f'https://m.youtube.com/watch?feature=share&v={VIDEO}',
+        f'https://youtu.be/{VIDEO}',
+        f'https://youtu.be/{VIDEO}?si=AbCdEf123&t=42',
+        f'https://music.youtube.com/watch?v={VIDEO}&list=RDAMVM{VIDEO}',
+        f'https://www.youtube.com/shorts/{VIDEO}',
+        f'https://www.youtube.com/embed/{VIDEO}?start=10',
+        f'https://www.youtube.com/live/{VIDEO}',
+        f'https://www.youtube-nocookie.com/embed/{VIDEO}',
+    ]
+    for url in variants:
+        assert youtube_id(url) == VIDEO, url
+        assert canonical_url(url) == f'youtube:{VIDEO}', url
+
+
+def test_youtube_non_videos():
+    # 頻道、搜尋頁與錯誤長度的 ID 不是影片
+    assert youtube_id('https://www.youtube.com/@someone') is None
+    assert youtube_id('https://www.youtube.com/results?search_query=lemon') is None
+    assert youtube_id('https://youtu.be/short') is None
+    assert youtube_id('https://example.com/watch?v=' + VIDEO) is None
+
+
+def test_playlists_stay_distinct():
+    first = canonical_url('https://www.youtube.com/playlist?list=PLaaaaaaaaaaaaaaaa')
+    second = canonical_url('https://www.youtube.com/playlist?list=PLbbbbbbbbbbbbbbbb')
+    assert first != second
+    assert canonical_media_id('https://www.youtube.com/playlist?list=PLaaaaaaaaaaaaaaaa') is None
+    # 追蹤參數不影響清單本身
+    assert canonical_url('https://www.youtube.com/playlist?list=PLaaaaaaaaaaaaaaaa&si=xyz') == first
+
+
+def test_soundcloud():
+    key = 'soundcloud:artist-name/track-name'
+    assert canonical_url('https://soundcloud.com/artist-name/track-name') == key
+    assert canonical_url('https://SoundCloud.com/Artist-Name/Track-Name/') == key
+    assert canonical_url('https://m.soundcloud.com/artist-name/track-name?in=artist-name/sets/x&utm_source=clipboard') == key
+    assert canonical_url('https://soundcloud.com/artist-name/sets/my-set?si=1') == 'soundcloud:artist-name/sets/my-set'
+    # 使用者頁面與分頁不是單一曲目
+    assert soundcloud_path('https://soundcloud.com/artist-name') is None
+    assert soundcloud_path('https://soundcloud.com/artist-name/likes') is None
+    assert soundcloud_path('https://soundcloud.com/discover/sets/x') is None
+
+
+def test_spotify():
+    track = '4uLU6hMCjMI75M1A2tKUQC'
+    key = f'spotify:track:{track}'
+    assert canonical_url(f'https://open.spotify.com/track/{track}') == key
+    assert canonical_url(f'https://open.spotify.com/intl-ja/track/{track}?si=abcdef') == key
+    assert canonical_url(f'spotify:track:{track}') == key
+    assert spotify_id(f'https://open.spotify.com/album/{track}') == f'album:{track}'
+    assert canonical_url(f'https://open.spotify.com/album/{track}') != key
+    assert spotify_id('https://open.spotify.com/track/not-an-id') is None
+
+
+def test_generic_urls():
+    base = 'example.com/music/song?id=5&lang=zh'
+    assert canonical_url('https://www.Example.com/music/song/?lang=zh&id=5#comments') == base
+    assert canonical_url('https://example.com/music/song?id=5&utm_source=x&utm_medium=y&fbclid=z&lang=zh') == base
+    # 影響內容的參數不可被移除
+    assert canonical_url('https://example.com/music/song?id=6&lang=zh') != base
+    assert canonical_url('https://example.com:8080/a') == 'example.com:8080/a'
+
+
+if __name__ == "__main__":
+    test_youtube_variants()
+    test_youtube_non_videos()
+    test_playlists_stay_distinct()
+    test_soundcloud()
+    test_spotify()
+    test_generic_urls()
+    print("✅ 媒體網址正規化測試通過")
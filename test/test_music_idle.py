@@ -0,0 +1,132 @@
+# test_music_idle.py
+# 以假的 Bot / 語音連線測試閒置自動離開：判斷閒置原因、原因改變時重新計時、
+# 超過時限才離開頻道並移除播放器狀態，伺服器已不存在時直接清掉狀態。
+# 執行方式：python -m pytest test/test_music_idle.py 或 python test/test_music_idle.py
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cmds.music_play import IDLE_REASONS, MusicPlay
+
+GUILD_ID = 42
+
+
+class _FakeVoiceClient:
+    def __init__(self, guild, members, paused=False):
+        self.guild = guild
+        self.channel = SimpleNamespace(members=members)
+        self.paused = paused
+        self.disconnected = False
+
+    def is_paused(self):
+        return self.paused
+
+    def is_playing(self):
+        return not self.paused
+
+    def stop(self):
+        pass
+
+    async def disconnect(self, force=False):
+        self.disconnected = True
+        self.guild.voice_client = None
+
+
+def _setup(members, paused=False):
+    guild = SimpleNamespace(id=GUILD_ID, voice_client=None)
+    vc = _FakeVoiceClient(guild, members, paused)
+    guild.voice_client = vc
+    guilds = {GUILD_ID: guild}
+
+    async def wait_until_ready():
+        pass
+
+    bot = SimpleNamespace(
+        get_guild=guilds.get,
+        wait_until_ready=wait_until_ready,
+        voice_clients=[vc],
+    )
+    return MusicPlay(bot), guild, vc, guilds
+
+
+async def _tick(cog):
+    await cog.idle_reaper.coro(cog)
+
+
+def test_idle_reason():
+    human, bot_member = SimpleNamespace(bot=False), SimpleNamespace(bot=True)
+    cog, guild, vc, _ = _setup([bot_member])
+    assert cog._idle_reason(guild) == 'empty_channel' # 只剩 Bot 自己
+
+    vc.channel.members = [bot_member, human]
+    vc.paused = True
+    assert cog._idle_reason(guild) == 'paused'
+
+    vc.paused = False
+    assert cog._idle_reason(guild) == 'empty_queue' # 沒有播放器 (例如 Cog 重新載入後殘留的連線)
+
+
+def test_leaves_after_timeout():
+    async def run():
+        cog, guild, vc, _ = _setup([SimpleNamespace(bot=True)])
+        await _tick(cog)
+        reason, since = cog.idle_since[GUILD_ID]
+        assert reason == 'empty_channel' and not vc.disconnected
+
+        await _tick(cog) # 時限未到
+        assert cog.idle_since[GUILD_ID] == (reason, since) and not vc.disconnected
+
+        # 原因改變 (有人加入但暫停中) 時重新計時
+        vc.channel.members.append(SimpleNamespace(bot=False))
+        vc.paused = True
+        await _tick(cog)
+        assert cog.idle_since[GUILD_ID][0] == 'paused'
+
+        # 超過時限：離開頻道並移除狀態
+        cog.idle_since[GUILD_ID] = ('paused', time.monotonic() - IDLE_REASONS['paused'][1] - 1)
+        await _tick(cog)
+        assert vc.disconnected
+        assert GUILD_ID not in cog.idle_since
+
+        # 不再閒置時清除計時
+        vc2 = _FakeVoiceClient(guild, [SimpleNamespace(bot=False)])
+        guild.voice_client = vc2
+        cog.bot.voice_clients[:] = [vc2]
+        cog.idle_since[GUILD_ID] = ('empty_channel', time.monotonic())
+        cog.players[GUILD_ID] = SimpleNamespace(status=None, queue=[1]) # 播放中的播放器
+        assert cog._idle_reason(guild) is None
+        await _tick(cog)
+        assert GUILD_ID not in cog.idle_since
+
+    asyncio.run(run())
+
+
+def test_forgets_removed_guild():
+    async def run():
+        cog, guild, vc, guilds = _setup([SimpleNamespace(bot=False)])
+        shut_down = []
+
+        async def shutdown():
+            shut_down.append(True)
+
+        cog.players[GUILD_ID] = SimpleNamespace(shutdown=shutdown)
+        cog.idle_since[GUILD_ID] = ('empty_queue', time.monotonic())
+        guilds.clear() # Bot 被移出伺服器
+        cog.bot.voice_clients.clear()
+        await _tick(cog)
+        assert shut_down == [True]
+        assert GUILD_ID not in cog.players and GUILD_ID not in cog.idle_since
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_idle_reason()
+    test_leaves_after_timeout()
+    test_forgets_removed_guild()
+    print("✅ 閒置自動離開測試通過")
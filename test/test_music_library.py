@@ -0,0 +1,144 @@
+# test_music_library.py
+# 以暫存目錄測試音樂清單資料庫：舊版 JSON 的一次性匯入、v1 -> v2 的網址重新正規化、
+# 標題搜尋 (FTS5 trigram 與短關鍵字的 LIKE) 以及刪除時的編號。
+# 執行方式：python -m pytest test/test_music_library.py 或 python test/test_music_library.py
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.music_library import MusicLibrary
+
+VIDEO_A = 'https://www.youtube.com/watch?v=aaaaaaaaaaa'
+VIDEO_B = 'https://www.youtube.com/watch?v=bbbbbbbbbbb'
+VIDEO_C = 'https://www.youtube.com/watch?v=ccccccccccc'
+
+
+def _open(tmp: str, legacy_entries=None) -> MusicLibrary:
+    legacy_path = os.path.join(tmp, 'music_list.json')
+    if legacy_entries is not None:
+        with open(legacy_path, 'w', encoding='utf8') as f:
+            json.dump(legacy_entries, f, ensure_ascii=False)
+    library = MusicLibrary(os.path.join(tmp, 'music_library.db'), legacy_path)
+    library.open()
+    return library
+
+
+def test_migrate_legacy():
+    legacy = [
+        {'title': '周杰倫 - 晴天', 'url': VIDEO_A, 'posted_by': 'amy', 'timestamp': '2024-01-03T00:00:00'},
+        {'title': 'Lemon', 'url': VIDEO_B, 'posted_by': 'bob', 'timestamp': '2024-01-01T00:00:00'},
+        # 與第一筆是同一部影片 (不同網址寫法)：保留先出現的那筆
+        {'title': '晴天 (重複)', 'url': 'https://youtu.be/aaaaaaaaaaa?t=30', 'posted_by': 'cat', 'timestamp': '2024-01-04T00:00:00'},
+        {'title': '沒有網址'},
+        {'title': '舊紀錄', 'url': VIDEO_C},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        library = _open(tmp, legacy)
+        try:
+            assert library.count() == 3
+            assert library.find('https://youtu.be/aaaaaaaaaaa')['posted_by'] == 'amy'
+            # 依分享時間由新到舊；沒有時間的紀錄排在最後
+            assert [entry['title'] for entry in library.page(0, 10)] == ['周杰倫 - 晴天', 'Lemon', '舊紀錄']
+            assert 'timestamp' not in library.page(0, 10)[2] # 空白欄位省略
+            assert not os.path.exists(os.path.join(tmp, 'music_list.json'))
+            assert os.path.exists(os.path.join(tmp, 'music_list.json.migrated'))
+        finally:
+            library.close()
+
+        # 舊檔案又出現時不重複匯入
+        library = _open(tmp, [{'title': '新的', 'url': 'https://youtu.be/ddddddddddd'}])
+        try:
+            assert library.count() == 3
+        finally:
+            library.close()
+
+
+def test_search():
+    with tempfile.TemporaryDirectory() as tmp:
+        library = _open(tmp)
+        try:
+            library.add_many([
+                (VIDEO_A, '周杰倫 - 晴天', 'amy', '2024-01-03'),
+                (VIDEO_B, '米津玄師 Lemon', 'bob', '2024-01-02'),
+                (VIDEO_C, '周興哲 - 你好不好', 'cat', '2024-01-01'),
+            ])
+            total, rows = library.search('周杰倫', 0, 10) # trigram 索引
+            assert total == 1 and rows[0]['title'] == '周杰倫 - 晴天'
+            total, rows = library.search('lemon', 0, 10) # 不分大小寫
+            assert total == 1 and rows[0]['url'] == VIDEO_B
+            total, rows = library.search('周', 0, 10) # 不到 3 個字元改用 LIKE
+            assert total == 2 and [row['title'] for row in rows] == ['周杰倫 - 晴天', '周興哲 - 你好不好']
+            total, rows = library.search('%', 0, 10) # LIKE 的萬用字元要跳脫
+            assert total == 0
+            assert library.search('周', 1, 10)[1][0]['title'] == '周興哲 - 你好不好' # 分頁
+        finally:
+            library.close()
+
+
+def test_add_and_remove_at():
+    with tempfile.TemporaryDirectory() as tmp:
+        library = _open(tmp)
+        try:
+            assert library.add(VIDEO_A, 'A', 'amy', '2024-01-01')
+            assert library.add(VIDEO_B, 'B', 'bob', '2024-01-02')
+            assert library.add(VIDEO_C, 'C', 'cat', '2024-01-03')
+            assert not library.add('https://music.youtube.com/watch?v=bbbbbbbbbbb', 'B2', 'dan', '2024-01-04')
+            assert library.contains('https://youtu.be/bbbbbbbbbbb')
+
+            # 編號與 /musiclist 相同 (最新的是第 1 首)
+            assert library.remove_at(2)['title'] == 'B'
+            assert not library.contains(VIDEO_B)
+            assert [entry['title'] for entry in library.page(0, 10)] == ['C', 'A']
+            assert library.remove_at(3) is None
+            assert library.remove_at(0) is None
+            # 刪除後可以再加入
+            assert library.add(VIDEO_B, 'B', 'bob', '2024-01-02')
+            total, rows = library.search('B', 0, 10)
+            assert total == 1 # 刪除時 FTS 索引也同步
+        finally:
+            library.close()
+
+
+def test_rekey_v1_database():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'music_library.db')
+        library = _open(tmp)
+        library.close()
+
+        # 模擬 v1 的資料庫：canonical_url 是舊規則算出來的鍵 (同一首歌的不同網址被視為不同)
+        conn = sqlite3.connect(db_path)
+        rows = [
+            ('v1:a', VIDEO_A, 'A', '2024-01-01'),
+            ('v1:b', 'https://soundcloud.com/artist/track', 'S', '2024-01-02'),
+            ('v1:a2', 'https://music.youtube.com/watch?v=aaaaaaaaaaa', 'A (重複)', '2024-01-03'),
+            ('v1:b2', 'https://SoundCloud.com/Artist/Track?utm_source=x', 'S (重複)', '2024-01-04'),
+        ]
+        conn.executemany("INSERT INTO songs(canonical_url, url, title, posted_at) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("UPDATE meta SET value = '1' WHERE key = 'schema_version'")
+        conn.commit()
+        conn.close()
+
+        library = _open(tmp)
+        try:
+            # 變成重複的歌曲保留最早加入的一筆
+            assert library.count() == 2
+            assert [entry['title'] for entry in library.page(0, 10)] == ['S', 'A']
+            assert library.contains('https://youtu.be/aaaaaaaaaaa')
+            assert library.contains('https://soundcloud.com/artist/track')
+            assert library.get_meta('schema_version') == '2'
+            assert not library.add('https://m.soundcloud.com/artist/track', 'S', 'x', '2024-01-05')
+        finally:
+            library.close()
+
+
+if __name__ == "__main__":
+    test_migrate_legacy()
+    test_search()
+    test_add_and_remove_at()
+    test_rekey_v1_database()
+    print("✅ 音樂清單資料庫測試通過")
@@ -0,0 +1,59 @@
+# test_music_play_startup.py
+# 依 bot.py 的方式載入音樂 Cog：先在 asyncio.run 的臨時事件迴圈中 load_extension，
+# 之後才在 bot.run 的事件迴圈中登入。背景工作必須在後者 (on_ready) 才開始，否則會隨臨時迴圈一起結束。
+# 執行方式：python -m pytest test/test_music_play_startup.py 或 python test/test_music_play_startup.py
+
+import asyncio
+import os
+import sys
+import tempfile
+
+import discord
+from discord.ext import commands
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.queue_snapshot import QueueSnapshotStore
+
+
+def test_background_work_starts_on_ready():
+    bot = commands.Bot(command_prefix='#', intents=discord.Intents.none())
+    # 與 bot.py 相同：asyncio.run(load_extensions(bot))
+    asyncio.run(bot.load_extension('cmds.music_play'))
+    cog = bot.get_cog('MusicPlay')
+    assert cog._restore_task is None # 登入前不可開始恢復 (wait_until_ready 會失敗)
+    assert not cog.idle_reaper.is_running()
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            cog.snapshots = QueueSnapshotStore(os.path.join(tmp, 'music_queues.json'))
+            # 模擬 bot.run 的事件迴圈中登入完成 (login 會呼叫 _async_setup_hook 綁定事件迴圈)
+            await bot._async_setup_hook()
+            bot._ready.set()
+            bot.dispatch('ready')
+            for _ in range(100):
+                if cog._restored:
+                    break
+                await asyncio.sleep(0.01)
+            assert cog._restored
+            assert cog.snapshot_queues.is_running()
+            assert cog.idle_reaper.is_running()
+
+            first_task = cog._restore_task
+            bot.dispatch('ready') # 重新連線時的 on_ready 不會重複恢復，也不會重複啟動閒置檢查
+            await asyncio.sleep(0)
+            assert cog._restore_task is first_task
+            assert cog.idle_reaper.is_running()
+
+            await bot.remove_cog('MusicPlay')
+            await asyncio.sleep(0) # 讓被取消的迴圈結束
+            assert not cog.snapshot_queues.is_running()
+            assert not cog.idle_reaper.is_running()
+            assert os.path.exists(os.path.join(tmp, 'music_queues.json')) # 卸載時保存快照
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_background_work_starts_on_ready()
+    print("✅ 音樂 Cog 啟動測試通過")
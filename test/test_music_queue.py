@@ -0,0 +1,135 @@
+# test_music_queue.py
+# 測試播放佇列：依位置移除 / 移動 / 插入與去重後，順序與網址計數索引都要正確；
+# 精簡紀錄可以還原、只在佇列前幾首內的播放清單 cursor 才需要展開。
+# 執行方式：python -m pytest test/test_music_queue.py 或 python test/test_music_queue.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.music_queue import (
+    MusicQueue, PlaylistCursor, QueuedSong, PLAYLIST_LOW_WATER,
+    is_playlist_url, item_from_record, item_to_record, next_cursor,
+)
+
+
+def _song(n: int) -> QueuedSong:
+    return QueuedSong(f'Song {n}', f'https://www.youtube.com/watch?v=song{n:07d}', 100 + n)
+
+
+def _titles(queue):
+    return [item.title for item in queue]
+
+
+def _check_index(queue):
+    """網址計數索引要與佇列內容一致"""
+    expected = {}
+    for item in queue:
+        if isinstance(item, QueuedSong):
+            expected[item.webpage_url] = expected.get(item.webpage_url, 0) + 1
+    assert dict(queue._urls) == expected
+    assert queue.song_count == sum(expected.values())
+
+
+def test_remove_at_and_move():
+    songs = [_song(n) for n in range(6)]
+    queue = MusicQueue(songs)
+
+    assert queue.remove_at(0) is songs[0]
+    assert queue.remove_at(4) is songs[5] # 最後一首
+    assert queue.remove_at(1) is songs[2] # 中間 (rotate 後要轉回原本的順序)
+    assert _titles(queue) == ['Song 1', 'Song 3', 'Song 4']
+    assert not queue.contains_url(songs[2].webpage_url)
+    _check_index(queue)
+
+    assert queue.move(0, 2) is songs[1]
+    assert _titles(queue) == ['Song 3', 'Song 4', 'Song 1']
+    assert queue.move(2, 0) is songs[1]
+    assert _titles(queue) == ['Song 1', 'Song 3', 'Song 4']
+    _check_index(queue)
+
+    for bad in (-1, 3):
+        try:
+            queue.remove_at(bad)
+            assert False, bad
+        except IndexError:
+            pass
+    try:
+        queue.move(0, 3)
+        assert False
+    except IndexError:
+        pass
+    assert _titles(queue) == ['Song 1', 'Song 3', 'Song 4'] # 失敗時不可改動佇列
+
+
+def test_insert_at_and_page():
+    queue = MusicQueue([_song(1), _song(4)])
+    queue.insert_at(1, [_song(2), _song(3)])
+    queue.insert_at(99, [_song(5)]) # 超出範圍時加在尾端
+    queue.insert_at(-5, [_song(0)])
+    assert _titles(queue) == [f'Song {n}' for n in range(6)]
+    assert _titles(queue.page(2, 3)) == ['Song 2', 'Song 3', 'Song 4']
+    assert queue.page(10, 3) == []
+    _check_index(queue)
+
+
+def test_dedupe_keeps_first_and_cursors():
+    cursor = PlaylistCursor('https://www.youtube.com/playlist?list=PLx', '清單', 7, 51)
+    a, b = _song(1), _song(2)
+    queue = MusicQueue([a, b, QueuedSong('A again', a.webpage_url, 9), cursor, QueuedSong('B again', b.webpage_url, 9), _song(3)])
+    assert queue.dedupe() == 2
+    assert _titles(queue) == ['Song 1', 'Song 2', '清單', 'Song 3']
+    assert queue[0] is a
+    _check_index(queue)
+
+    # 索引重建後移除歌曲，網址不可殘留
+    queue.remove_at(0)
+    assert not queue.contains_url(a.webpage_url)
+    _check_index(queue)
+    assert queue.dedupe() == 0
+
+
+def test_records_round_trip():
+    song = _song(1)
+    cursor = PlaylistCursor('https://www.youtube.com/playlist?list=PLx', '清單', 7, 51)
+    assert item_to_record(song) == ['s', 'Song 1', song.webpage_url, 101]
+    assert item_to_record(cursor) == ['p', '清單', cursor.url, 7, 51]
+
+    restored = item_from_record(item_to_record(cursor))
+    assert isinstance(restored, PlaylistCursor)
+    assert (restored.url, restored.title, restored.requester_id, restored.next_index) == (cursor.url, '清單', 7, 51)
+    restored = item_from_record(item_to_record(song))
+    assert isinstance(restored, QueuedSong) and restored.webpage_url == song.webpage_url
+
+    for broken in (['x', 'a', 'b', 1], ['s', 'a'], ['p', 'a', 'b', 'not-int', 1], []):
+        assert item_from_record(broken) is None
+
+
+def test_next_cursor_low_water():
+    cursor = PlaylistCursor('https://www.youtube.com/playlist?list=PLx', '清單', 7, 51)
+    queue = MusicQueue([_song(n) for n in range(PLAYLIST_LOW_WATER)] + [cursor])
+    assert next_cursor(queue) is None # 還在低水位之外，先不展開
+    queue.popleft()
+    assert next_cursor(queue) is cursor
+    # cursor 不算歌曲，也不進入網址索引
+    assert queue.song_count == PLAYLIST_LOW_WATER - 1
+
+
+def test_is_playlist_url():
+    assert is_playlist_url('https://www.youtube.com/playlist?list=PLabc')
+    assert is_playlist_url('https://youtu.be/abcdefghijk?list=PLabc')
+    assert is_playlist_url('https://music.youtube.com/watch?v=abcdefghijk&list=RDabc')
+    assert not is_playlist_url('https://www.youtube.com/watch?v=abcdefghijk')
+    assert not is_playlist_url('https://example.com/?list=PLabc')
+    assert not is_playlist_url('周杰倫 晴天')
+
+
+if __name__ == "__main__":
+    test_remove_at_and_move()
+    test_insert_at_and_page()
+    test_dedupe_keeps_first_and_cursors()
+    test_records_round_trip()
+    test_next_cursor_low_water()
+    test_is_playlist_url()
+    print("✅ 播放佇列測試通過")
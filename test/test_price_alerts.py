@@ -0,0 +1,94 @@
+# test_price_alerts.py
+# 測試價格到價提醒索引：穿越門檻時觸發一次、門檻等於現價的提醒、
+# 新增提醒前後的最後價格，以及重新載入後從存檔的最後價格繼續判斷。
+# 執行方式：python -m pytest test/test_price_alerts.py 或 python test/test_price_alerts.py
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.price_alerts import ABOVE, BELOW, PriceAlertIndex
+
+
+def _fired_ids(index, symbol, price):
+    return sorted(alert['id'] for alert in index.evaluate(symbol, price))
+
+
+def test_crossing():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PriceAlertIndex(os.path.join(tmp, 'price_alerts.json'))
+        index.evaluate('2330.TW', 100)
+        up = index.add(1, '2330.TW', 105)['id']
+        down = index.add(2, '2330.TW', 95)['id']
+        far = index.add(3, '2330.TW', 120)['id']
+
+        assert _fired_ids(index, '2330.TW', 103) == []
+        assert _fired_ids(index, '2330.TW', 106) == [up] # 向上突破
+        assert _fired_ids(index, '2330.TW', 106) == []   # 只觸發一次
+        assert _fired_ids(index, '2330.TW', 94) == [down] # 一次跌破 (中間沒有報價) 也要觸發
+        assert _fired_ids(index, '2330.TW', 130) == [far]
+        assert len(index) == 0
+        # 其他股票的報價不影響
+        index.add(4, 'AAPL', 200, current_price=190)
+        assert _fired_ids(index, '2330.TW', 250) == []
+
+
+def test_threshold_equal_to_current_price():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PriceAlertIndex(os.path.join(tmp, 'price_alerts.json'))
+        index.evaluate('AAPL', 100)
+        alert = index.add(1, 'AAPL', 100, current_price=100)
+        assert alert['direction'] == ABOVE
+        # 價格停在門檻上即達成條件
+        assert _fired_ids(index, 'AAPL', 100) == [alert['id']]
+
+        alert = index.add(1, 'AAPL', 100, current_price=100)
+        assert _fired_ids(index, 'AAPL', 99) == [] # 往下走不是向上突破
+        assert _fired_ids(index, 'AAPL', 101) == [alert['id']]
+
+        assert index.add(1, 'AAPL', 90, current_price=101)['direction'] == BELOW
+
+
+def test_add_after_price_moved():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PriceAlertIndex(os.path.join(tmp, 'price_alerts.json'))
+        index.evaluate('TSLA', 100)
+        pending = index.add(1, 'TSLA', 102)['id']
+
+        # 上一次輪詢之後價格已到 104；/stock alert 先以現價評估既有提醒，再新增
+        assert _fired_ids(index, 'TSLA', 104) == [pending]
+        alert = index.add(2, 'TSLA', 103, current_price=104)
+        assert alert['direction'] == BELOW
+        assert _fired_ids(index, 'TSLA', 103.5) == []
+        assert _fired_ids(index, 'TSLA', 102.9) == [alert['id']]
+
+        # add() 不會覆寫最後價格，未評估的穿越不會因新增提醒而遺失
+        pending = index.add(3, 'TSLA', 110)['id']
+        index.add(4, 'TSLA', 120, current_price=115)
+        assert _fired_ids(index, 'TSLA', 112) == [pending]
+
+
+def test_last_prices_persist():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'price_alerts.json')
+        index = PriceAlertIndex(path)
+        alert = index.add(1, 'NVDA', 110, current_price=100)
+        assert index.evaluate_many({'NVDA': 100}) == {}
+        assert index.evaluate_many({'NVDA': 105}) == {} # 沒有觸發也要保存最後價格
+
+        # 重新載入後沿用 105 (而不是新增提醒時的 100)：102 的提醒是向下跌破
+        index = PriceAlertIndex(path)
+        assert index.add(2, 'NVDA', 102)['direction'] == BELOW
+        fired = PriceAlertIndex(path).evaluate_many({'NVDA': 111})
+        assert [(a['id'], price) for a, price in fired[1]] == [(alert['id'], 111)]
+        assert len(PriceAlertIndex(path)) == 1 # 只剩向下跌破 102 的提醒
+
+
+if __name__ == "__main__":
+    test_crossing()
+    test_threshold_equal_to_current_price()
+    test_add_after_price_moved()
+    test_last_prices_persist()
+    print("✅ 價格提醒索引測試通過")
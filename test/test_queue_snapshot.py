@@ -0,0 +1,98 @@
+# test_queue_snapshot.py
+# 測試播放佇列快照：播放器 -> 快照 -> 磁碟 -> 恢復後的佇列項目與接續位置，
+# 內容沒變時不重寫檔案、過期的快照不恢復。
+# 執行方式：python -m pytest test/test_queue_snapshot.py 或 python test/test_queue_snapshot.py
+
+import json
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.music_queue import MusicQueue, PlaylistCursor, QueuedSong
+from core.queue_snapshot import (
+    QueueSnapshotStore, QUEUE_SNAPSHOT_MAX_AGE, RESUME_MIN_POSITION,
+    restore_items, resume_position, snapshot_player,
+)
+
+NOW = QueuedSong('Now', 'https://www.youtube.com/watch?v=nownownowno', 7)
+NEXT = QueuedSong('Next', 'https://www.youtube.com/watch?v=nextnextnex', 8)
+CURSOR = PlaylistCursor('https://www.youtube.com/playlist?list=PLx', '清單', 7, 51)
+
+
+def _player(now_playing, queue, position, voice=True):
+    vc = SimpleNamespace(channel=SimpleNamespace(id=200)) if voice else None
+    return SimpleNamespace(
+        guild=SimpleNamespace(voice_client=vc),
+        channel=SimpleNamespace(id=100),
+        now_playing=now_playing,
+        queue=MusicQueue(queue),
+        position=lambda: position,
+    )
+
+
+def test_snapshot_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = QueueSnapshotStore(os.path.join(tmp, 'queues.json'))
+        snapshot = snapshot_player(_player(NOW, [NEXT, CURSOR], 83.46))
+        assert (snapshot['text_channel'], snapshot['voice_channel'], snapshot['position']) == (100, 200, 83.5)
+        assert store.save({1: snapshot}) is True
+
+        loaded = store.load()
+        assert list(loaded) == [1] # JSON 的字串 key 轉回 int
+        items = restore_items(loaded[1])
+        assert [item.title for item in items] == ['Now', 'Next', '清單']
+        assert items[0].webpage_url == NOW.webpage_url and items[0].requester_id == 7
+        assert isinstance(items[2], PlaylistCursor) and items[2].next_index == 51
+        assert resume_position(loaded[1], items[0]) == 83.5
+
+
+def test_nothing_to_snapshot():
+    assert snapshot_player(_player(NOW, [NEXT], 10, voice=False)) is None # 沒有語音連線
+    assert snapshot_player(_player(None, [], None)) is None
+    snapshot = snapshot_player(_player(None, [NEXT], None)) # 只有佇列 (例如暫停在兩首之間)
+    assert snapshot['now_playing'] is None and snapshot['position'] is None
+
+
+def test_resume_position():
+    assert resume_position({'now_playing': ['s'], 'position': 83.5}, NOW) == 83.5
+    assert resume_position({'now_playing': ['s'], 'position': RESUME_MIN_POSITION - 1}, NOW) is None # 剛開始播：從頭播
+    assert resume_position({'now_playing': None, 'position': 83.5}, NEXT) is None # 第一首不是正在播放的那首
+    assert resume_position({'now_playing': ['p'], 'position': 83.5}, CURSOR) is None
+    assert resume_position({'now_playing': ['s'], 'position': None}, NOW) is None
+
+
+def test_skip_unchanged_and_expired():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'queues.json')
+        store = QueueSnapshotStore(path)
+        snapshot = snapshot_player(_player(NOW, [NEXT], 30))
+        assert store.save({1: snapshot}) is True
+        # 只有 saved_at 不同：不重寫
+        assert store.save({1: {**snapshot, 'saved_at': time.time() + 5}}) is False
+        assert store.save({1: {**snapshot, 'position': 60}}) is True
+
+        stale = {**snapshot, 'saved_at': time.time() - QUEUE_SNAPSHOT_MAX_AGE - 1}
+        store.save({1: snapshot, 2: stale})
+        assert list(store.load()) == [1]
+
+        with open(path, 'w', encoding='utf8') as f:
+            f.write('{broken')
+        assert store.load() == {}
+        os.remove(path)
+        assert store.load() == {}
+
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump({}, f)
+        assert store.load() == {}
+
+
+if __name__ == "__main__":
+    test_snapshot_round_trip()
+    test_nothing_to_snapshot()
+    test_resume_position()
+    test_skip_unchanged_and_expired()
+    print("✅ 播放佇列快照測試通過")
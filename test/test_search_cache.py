@@ -0,0 +1,85 @@
+# test_search_cache.py
+# 以暫存檔案測試 /play 關鍵字搜尋快取：關鍵字正規化、有效期過後視為未命中並移除、
+# 超過數量上限時淘汰最久沒用的、依網址移除，以及寫入磁碟後重新讀取。
+# 執行方式：python -m pytest test/test_search_cache.py 或 python test/test_search_cache.py
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.search_cache import SearchCache, is_keyword_query, normalize_query
+
+
+def _url(n: int) -> str:
+    return f'https://www.youtube.com/watch?v=s{n:010d}'
+
+
+def test_normalize_query():
+    assert normalize_query('  Lemon　　米津玄師 ') == 'lemon 米津玄師' # 全形空白
+    assert normalize_query('ＬＥＭＯＮ') == 'lemon'
+    assert is_keyword_query('周杰倫 晴天')
+    assert not is_keyword_query(' https://youtu.be/abc')
+
+
+def test_ttl_expiry():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SearchCache(os.path.join(tmp, 'search.json'), ttl=60)
+        cache.put('Lemon 米津玄師', 'Lemon', _url(1))
+        assert cache.get('lemon  米津玄師')['url'] == _url(1)
+        assert cache.stats == {'hits': 1, 'misses': 0}
+
+        cache._load()['lemon 米津玄師']['cached_at'] = time.time() - 61 # 過期
+        assert cache.suggest('lemon') == []
+        assert cache.get('Lemon 米津玄師') is None
+        assert 'lemon 米津玄師' not in cache._load() # 過期的結果直接移除
+        assert cache.stats == {'hits': 1, 'misses': 1}
+
+        # 重新搜尋後保留原本的命中次數
+        cache.put('Lemon 米津玄師', 'Lemon', _url(1))
+        cache.put('lemon 米津玄師', 'Lemon (Live)', _url(2))
+        assert cache.get('lemon 米津玄師')['url'] == _url(2)
+
+
+def test_lru_capacity():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SearchCache(os.path.join(tmp, 'search.json'), capacity=3)
+        for n in range(1, 4):
+            cache.put(f'song {n}', f'Song {n}', _url(n))
+        assert cache.get('song 1') is not None # 命中後移到最近使用
+        cache.put('song 4', 'Song 4', _url(4))
+        assert list(cache._load()) == ['song 3', 'song 1', 'song 4'] # 淘汰最久沒用的 song 2
+        assert cache.get('song 2') is None
+
+        # 空白輸入列出最近使用的搜尋；有輸入時開頭相符優先
+        assert [e['query'] for e in cache.suggest('')] == ['song 4', 'song 1', 'song 3']
+        cache.put('my song', 'Other', _url(5))
+        assert [e['query'] for e in cache.suggest('song', limit=2)] == ['song 1', 'song 4']
+
+
+def test_invalidate_and_persist():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'search.json')
+        cache = SearchCache(path)
+        cache.put('a', 'A', _url(1))
+        cache.put('b', 'B', _url(1))
+        cache.put('c', 'C', _url(2))
+        assert cache.invalidate_url(_url(1)) == 2
+        assert cache.invalidate('c') is True
+        assert cache.invalidate('c') is False
+
+        cache.put('d', 'D', _url(3), duration=200)
+        # 不在事件迴圈中時直接寫入；重新讀取後內容與順序相同
+        reloaded = SearchCache(path)
+        assert list(reloaded._load()) == ['d']
+        assert reloaded.get('D')['duration'] == 200
+
+
+if __name__ == "__main__":
+    test_normalize_query()
+    test_ttl_expiry()
+    test_lru_capacity()
+    test_invalidate_and_persist()
+    print("✅ 搜尋快取測試通過")
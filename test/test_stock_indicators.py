@@ -0,0 +1,78 @@
+# test_stock_indicators.py
+# 測試盤中增量指標：逐根更新的 MA / RSI 要與向量化版本一致 (長時間執行不可累積誤差)，
+# 保留的 K 棒數要足夠規則中 prev(x, n) / crosses_* 往前看的根數。
+# 執行方式：python -m pytest test/test_stock_indicators.py 或 python test/test_stock_indicators.py
+
+import copy
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.stock_indicators import IncrementalIndicators, sma, wilder_rsi
+from core.stock_rules import DEFAULT_RULE_CONFIG, RuleSet
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def _bars(count, seed=7, level=1e5):
+    """固定種子的價格序列；價位高、波動小時 running sum 的浮點誤差最明顯"""
+    rng = np.random.RandomState(seed)
+    close = level * np.exp(np.cumsum(rng.normal(0, 0.002, count)))
+    return {
+        'open': close * (1 + rng.normal(0, 0.001, count)),
+        'high': close * 1.002,
+        'low': close * 0.998,
+        'close': close,
+        'volume': rng.randint(1_000, 2_000, count).astype(np.float64),
+    }
+
+
+def _feed(state, bars):
+    for i in range(len(bars['close'])):
+        state.update(i, *(float(bars[f][i]) for f in FIELDS))
+
+
+def test_matches_vectorized():
+    bars = _bars(50_000)
+    state = IncrementalIndicators([('ma', 'close', 20), ('ma', 'volume', 5), ('rsi', 'close', 14)], depth=3)
+    _feed(state, bars)
+
+    indicators = state.indicators()
+    expected_ma = sma(bars['close'], 20)[-3:]
+    # 逐筆加減的 running sum 在 5 萬根後誤差約 6e-15 (相對價格)，重新加總視窗則維持在 1 ulp 左右
+    assert np.allclose(indicators[('ma', 'close', 20)], expected_ma, rtol=0, atol=2e-15 * bars['close'][-1])
+    assert np.allclose(indicators[('ma', 'volume', 5)], sma(bars['volume'], 5)[-3:])
+    assert np.allclose(indicators[('rsi', 'close', 14)], wilder_rsi(bars['close'], 14)[-3:])
+    assert np.array_equal(state.columns()['close'], bars['close'][-3:])
+
+
+def test_depth_follows_rule_lookback():
+    assert RuleSet(DEFAULT_RULE_CONFIG).lookback == 1 # crosses_above 需要前一根
+
+    config = copy.deepcopy(DEFAULT_RULE_CONFIG)
+    config['values']['old_ma'] = "prev(ma(close, 5), 2)"
+    config['rules'] = [
+        {'id': 'rising', 'when': "close > prev(close, 3)"},
+        {'id': 'ma_up', 'when': "crosses_above(ma(close, 5), old_ma)"},
+    ]
+    ruleset = RuleSet(config)
+    assert ruleset.lookback == 3 # prev(close, 3) 與 crosses_above(..., prev(..., 2)) 都要往前看 3 根
+
+    bars = _bars(200, seed=11, level=100)
+    full = ruleset.evaluate(bars)
+    state = IncrementalIndicators(ruleset.indicators(), depth=ruleset.lookback + 1)
+    for i in range(len(bars['close'])):
+        state.update(i, *(float(bars[f][i]) for f in FIELDS))
+        if i < 10:
+            continue # 指標尚未暖機
+        result = ruleset.evaluate(state.columns(), cache=state.indicators())
+        assert {r.id for r in result.fired()} == {r.id for r in full.fired(i)}, i
+
+
+if __name__ == "__main__":
+    test_matches_vectorized()
+    test_depth_follows_rule_lookback()
+    print("✅ 盤中增量指標測試通過")
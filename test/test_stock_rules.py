@@ -0,0 +1,199 @@
+# test_stock_rules.py
+# 測試股票訊號規則引擎：data/stock_rules.json 可由使用者編輯，編譯器只能接受白名單內的語法；
+# 預設規則在固定的 K 棒上要與原本寫死在 stock_monitor 的判斷得到相同的訊號。
+# 執行方式：python -m pytest test/test_stock_rules.py 或 python test/test_stock_rules.py
+
+import copy
+import json
+import math
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import core.stock_rules as stock_rules
+from core.stock_rules import DEFAULT_RULE_CONFIG, RuleError, RuleSet, load_rules
+
+
+def _config_with_rule(when: str):
+    config = copy.deepcopy(DEFAULT_RULE_CONFIG)
+    config['rules'] = [{'id': 'custom', 'when': when}]
+    return config
+
+
+def _rejected(when: str) -> bool:
+    try:
+        RuleSet(_config_with_rule(when))
+    except RuleError:
+        return True
+    return False
+
+
+def test_rejects_unsafe_expressions():
+    unsafe = [
+        # 屬性存取
+        "close.__class__",
+        "close.__class__.__bases__",
+        "ma20.real > 0",
+        # 任意函式呼叫
+        "__import__('os').system('echo hi')",
+        "open('/etc/passwd')",
+        "eval('1')",
+        "getattr(close, 'shape')",
+        "(lambda: 1)()",
+        "ma.__call__(close, 20)",
+        # 下標 / 切片
+        "close[0] > 1",
+        "close[-1:]",
+        "().__class__",
+        # 其他不在白名單內的語法
+        "[x for x in close]",
+        "'abc'",
+        "close ** 2 > 0",
+        "close if ma20 else volume",
+        "ma(close, period=20) > 0",     # 不接受關鍵字參數
+        "ma(close + 1, 20) > 0",        # 指標的第一個參數只能是欄位
+        "ma(close, rsi) > 0",           # 指標週期只能是數字或參數
+        "unknown_name > 0",
+        "os > 0",
+    ]
+    for when in unsafe:
+        assert _rejected(when), when
+
+
+def test_rejects_unsafe_values_and_guard():
+    config = copy.deepcopy(DEFAULT_RULE_CONFIG)
+    config['values']['evil'] = "close.__class__"
+    try:
+        RuleSet(config)
+        assert False, "values 中的屬性存取應被拒絕"
+    except RuleError:
+        pass
+
+    config = copy.deepcopy(DEFAULT_RULE_CONFIG)
+    config['guard'] = "__import__('os')"
+    try:
+        RuleSet(config)
+        assert False, "guard 中的函式呼叫應被拒絕"
+    except RuleError:
+        pass
+
+
+def test_load_rules_keeps_previous_on_unsafe_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stock_rules.json')
+        try:
+            good = load_rules(path) # 不存在時建立預設檔
+            assert [rule.id for rule in good.rules] == [rule['id'] for rule in DEFAULT_RULE_CONFIG['rules']]
+
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(_config_with_rule("close.__class__"), f)
+            os.utime(path, (os.path.getmtime(path) + 10, os.path.getmtime(path) + 10))
+            assert load_rules(path) is good # 編譯失敗時沿用上一次成功載入的版本
+        finally:
+            stock_rules._loaded.pop(path, None)
+
+
+# --- 與原本寫死的判斷比較 ---
+
+def _legacy_rsi(close, period):
+    """原本的 _calculate_rsi (pandas ewm(alpha=1/period, adjust=False))，改寫成純 Python"""
+    out = []
+    avg_gain = avg_loss = 0.0
+    for i, price in enumerate(close):
+        delta = 0.0 if i == 0 else price - close[i - 1]
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        if i == 0:
+            avg_gain, avg_loss = gain, loss
+        else:
+            avg_gain += (gain - avg_gain) / period
+            avg_loss += (loss - avg_loss) / period
+        if avg_loss == 0:
+            out.append(100.0 if avg_gain > 0 else math.nan)
+        else:
+            out.append(100 - 100 / (1 + avg_gain / avg_loss))
+    return out
+
+
+def _mean(values):
+    return sum(values) / len(values)
+
+
+def _legacy_signals(bars, end):
+    """
+    原本 _analyze_signals 的判斷 (以前 end+1 根 K 棒計算最後一根)，回傳觸發的規則 id。
+    參數與 DEFAULT_RULE_CONFIG 相同：1% / RSI 14 / 70 / 30 / 2.5 倍。
+    """
+    high, low, close, volume = (bars[k][:end + 1] for k in ('high', 'low', 'close', 'volume'))
+    if len(close) < 20:
+        return set()
+    ma20 = _mean(close[-20:])
+    prev_ma20 = _mean(close[-21:-1]) if len(close) >= 21 else math.nan
+    rsi = _legacy_rsi(close, 14)[-1]
+    ma5_vol = _mean(volume[-5:])
+    fired = set()
+
+    if low[-1] <= ma20 <= high[-1]:
+        fired.add('ma20_touch')
+    else:
+        if high[-1] < ma20 and high[-1] >= ma20 * (1.0 - 0.01):
+            fired.add('ma20_near_up')
+        if low[-1] > ma20 and low[-1] <= ma20 * (1.0 + 0.01):
+            fired.add('ma20_near_down')
+
+    if not math.isnan(prev_ma20):
+        if close[-1] > ma20 and close[-2] < prev_ma20:
+            fired.add('ma20_cross_up')
+        elif close[-1] < ma20 and close[-2] > prev_ma20:
+            fired.add('ma20_cross_down')
+
+    if not math.isnan(rsi):
+        if rsi > 70:
+            fired.add('rsi_overbought')
+        elif rsi < 30:
+            fired.add('rsi_oversold')
+
+    if ma5_vol > 0 and volume[-1] / ma5_vol >= 2.5:
+        fired.add('volume_spike')
+    return fired
+
+
+def _fixed_bars(days=400, seed=20251017):
+    """固定種子的隨機漫步 (含趨勢段與偶發爆量)，涵蓋每一種訊號"""
+    rng = np.random.RandomState(seed)
+    drift = np.where((np.arange(days) // 60) % 2 == 0, 0.004, -0.004)
+    close = 100 * np.exp(np.cumsum(drift + rng.normal(0, 0.015, days)))
+    open_ = np.concatenate([[close[0]], close[:-1]]) * (1 + rng.normal(0, 0.003, days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.006, days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.006, days)))
+    volume = rng.randint(1_000, 2_000, days).astype(np.float64)
+    volume[rng.rand(days) < 0.05] *= 4
+    return {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+
+
+def test_default_rules_match_legacy_checks():
+    bars = _fixed_bars()
+    ruleset = RuleSet(DEFAULT_RULE_CONFIG)
+    result = ruleset.evaluate(bars)
+    legacy_bars = {k: v.tolist() for k, v in bars.items()}
+
+    seen = set()
+    for end in range(len(bars['close'])):
+        expected = _legacy_signals(legacy_bars, end)
+        actual = {rule.id for rule in result.fired(end)}
+        assert actual == expected, (end, actual, expected)
+        seen |= actual
+
+    # 固定資料必須讓每一條預設規則至少觸發一次，比較才有意義
+    assert seen == {rule['id'] for rule in DEFAULT_RULE_CONFIG['rules']}, seen
+
+
+if __name__ == "__main__":
+    test_rejects_unsafe_expressions()
+    test_rejects_unsafe_values_and_guard()
+    test_load_rules_keeps_previous_on_unsafe_file()
+    test_default_rules_match_legacy_checks()
+    print("✅ 股票規則引擎測試通過")
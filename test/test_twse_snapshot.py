@@ -0,0 +1,63 @@
+# test_twse_snapshot.py
+# 以錄製的證交所收盤行情檔 (test/fixtures) 測試快照解析與寫入日線快取，不需要連網。
+# 執行方式：python -m pytest test/test_twse_snapshot.py 或 python test/test_twse_snapshot.py
+
+import os
+import sys
+import tempfile
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import core.stock_history as stock_history
+from core.stock_history import Bars, load_history, save_history
+from core.twse_snapshot import parse_snapshot, ingest_snapshot, _decode_lines
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'twse_mi_index_20251017.csv')
+
+
+def _load_fixture():
+    # 與線上相同：以位元組逐行讀取後再解碼
+    with open(FIXTURE, 'rb') as f:
+        return parse_snapshot(_decode_lines(f))
+
+
+def test_parse_snapshot():
+    snapshot = _load_fixture()
+    assert snapshot.day == date(2025, 10, 17)
+    # 指數區段不應被當成個股；無成交 (1213) 的證券應被略過
+    assert sorted(snapshot.rows) == ['0050', '00632R', '1101', '2317', '2330', '2454']
+
+    tsmc = snapshot.rows['2330']
+    assert tsmc.name == '台積電'
+    assert (tsmc.open, tsmc.high, tsmc.low, tsmc.close) == (1440.0, 1455.0, 1435.0, 1450.0)
+    assert tsmc.volume == 28456123
+
+
+def test_ingest_snapshot():
+    snapshot = _load_fixture()
+    original_dir = stock_history.HISTORY_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        stock_history.HISTORY_DIR = tmp
+        try:
+            # 2330.TW 已有兩天快取 (其中 10/17 為盤中抓到的未收盤資料)，2317.TW 尚未建立快取
+            ts = np.array([1760572800, 1760659200], dtype=np.int64) # 2025-10-16 / 2025-10-17 00:00 UTC
+            save_history('2330.TW', Bars(ts, *(np.array([1400.0, 1445.0]) for _ in range(4)), np.array([1e7, 5e6])))
+
+            histories = ingest_snapshot(snapshot, ['2330.TW', '2317.TW', 'AAPL'])
+            assert list(histories) == ['2330.TW']
+
+            merged = load_history('2330.TW')
+            assert merged.ts.tolist() == ts.tolist()
+            assert merged.close.tolist() == [1400.0, 1450.0] # 快照的收盤價覆蓋盤中資料
+            assert merged.volume[-1] == 28456123
+        finally:
+            stock_history.HISTORY_DIR = original_dir
+
+
+if __name__ == "__main__":
+    test_parse_snapshot()
+    test_ingest_snapshot()
+    print("✅ 證交所快照測試通過")